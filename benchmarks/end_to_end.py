@@ -0,0 +1,165 @@
+"""Benchmark the lockfile generator end to end against a local mirror.
+
+Runs the lockfile generator binary (including the snapshot update) for configs
+of increasing size without an index cache, with an empty and with a warm one.
+Reports wall time, peak memory, bytes transferred and the time per phase; the
+`--json` output also has the bytes downloaded per phase. Phases that run in
+worker processes (load_index) report the time summed over all workers.
+
+By default a synthetic snapshot is generated. A mirror recorded from
+snapshot.debian.org can be used instead with `--mirror-dir` and
+`--packages-file`.
+
+Usage:
+
+    bazel run //benchmarks:end_to_end -- [--sizes 10,100,1000] [--jobs 4]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.fixtures import BOOKWORM_SNAPSHOT
+from benchmarks.mirror import LocalMirror, build_mirror
+from debian_packages.private.lockfile_generator.config import Arch
+from debian_packages.private.lockfile_generator.deb import get_debian_arch
+
+PHASES = ["update_snapshots", "load_index", "build_graph", "resolve", "write_lockfile"]
+
+
+def run_generator(
+    mirror: LocalMirror,
+    workdir: Path,
+    packages_file: Path,
+    cache_dir: Optional[Path],
+    jobs: int,
+) -> dict:
+    snapshots_file = workdir / "snapshots.yaml"
+    # an outdated snapshot, so the latest one is looked up from the mirror
+    snapshots_file.write_text("main: 20000101T000000Z\nsecurity: 20000101T000000Z\n")
+    timings_file = workdir / "timings.json"
+
+    command = [
+        sys.executable,
+        "-m",
+        "debian_packages.private.lockfile_generator",
+        "--snapshots-file",
+        str(snapshots_file),
+        "--packages-file",
+        str(packages_file),
+        "--lock-file",
+        str(workdir / "packages.lock"),
+        "--mirror",
+        mirror.url,
+        "--update-snapshots-file",
+        "--jobs",
+        str(jobs),
+        "--timings",
+        str(timings_file),
+    ]
+    if cache_dir is None:
+        command.append("--no-cache")
+    else:
+        command += ["--cache-dir", str(cache_dir)]
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    bytes_served = mirror.bytes_served
+    start = time.perf_counter()
+    subprocess.run(command, env=env, check=True)
+    elapsed = time.perf_counter() - start
+
+    report = json.loads(timings_file.read_text())
+    # index files may be loaded by worker processes
+    peak_rss = max(
+        [report["peak_rss"] or 0]
+        + [i.get("peak_rss", 0) for i in report["package_indexes"].values()]
+    )
+    return {
+        "seconds": elapsed,
+        "peak_rss": peak_rss,
+        "bytes_served": mirror.bytes_served - bytes_served,
+        "phases": report["phases"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--archs", default="amd64,arm64")
+    parser.add_argument("--libraries", type=int, default=20000)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mirror-dir", type=Path)
+    parser.add_argument("--packages-file", type=Path)
+    parser.add_argument("--json", type=Path, help="Also write the results here.")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    archs = args.archs.split(",")
+    if args.mirror_dir and not args.packages_file:
+        parser.error("--mirror-dir requires --packages-file")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        mirror_dir = args.mirror_dir
+        if mirror_dir is None:
+            mirror_dir = tmp / "mirror"
+            print(f"Generating a synthetic snapshot {BOOKWORM_SNAPSHOT} ...")
+            debian_archs = [get_debian_arch(Arch(arch)) for arch in archs]
+            build_mirror(mirror_dir, debian_archs, args.libraries, max(sizes))
+
+        configs = []
+        if args.packages_file:
+            configs.append(("recorded", args.packages_file))
+        else:
+            for size in sizes:
+                packages_file = tmp / f"packages-{size}.yaml"
+                packages = ", ".join(f"app{i}" for i in range(size))
+                packages_file.write_text(
+                    f"- distros: [debian12]\n"
+                    f"  archs: [{', '.join(archs)}]\n"
+                    f"  packages: [{packages}]\n"
+                )
+                configs.append((str(size), packages_file))
+
+        header = ["packages", "cache", "time", "peak MiB", "MiB served"] + PHASES
+        widths = [max(10, len(h)) for h in header]
+        print(" ".join(f"{h:>{w}}" for h, w in zip(header, widths)))
+        with LocalMirror(mirror_dir) as mirror:
+            for name, packages_file in configs:
+                cache_dir = tmp / f"cache-{name}"
+                for cache in ("none", "cold", "warm"):
+                    workdir = tmp / f"run-{name}-{cache}"
+                    workdir.mkdir()
+                    result = run_generator(
+                        mirror,
+                        workdir,
+                        packages_file,
+                        None if cache == "none" else cache_dir,
+                        args.jobs,
+                    )
+                    result.update(packages=name, cache=cache)
+                    results.append(result)
+                    row = [
+                        name,
+                        cache,
+                        f"{result['seconds']:.3f}s",
+                        f"{result['peak_rss'] / (1024 * 1024):.1f}",
+                        f"{result['bytes_served'] / (1024 * 1024):.2f}",
+                    ] + [
+                        f"{result['phases'].get(p, {}).get('seconds', 0.0):.3f}s"
+                        for p in PHASES
+                    ]
+                    print(" ".join(f"{c:>{w}}" for c, w in zip(row, widths)))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
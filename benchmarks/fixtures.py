@@ -0,0 +1,63 @@
+"""Shared fixtures for the lockfile-generator benchmarks."""
+
+import random
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from debian_packages.private.lockfile_generator.cache import default_cache_dir
+
+BOOKWORM_SNAPSHOT = "20240101T000000Z"
+
+BOOKWORM_POOL_ROOT_URL = (
+    f"https://snapshot.debian.org/archive/debian/{BOOKWORM_SNAPSHOT}/"
+)
+
+BOOKWORM_INDEX_URL = (
+    BOOKWORM_POOL_ROOT_URL + "dists/bookworm/main/binary-amd64/Packages.xz"
+)
+
+
+def get_bookworm_index(index_file: Optional[Path] = None) -> bytes:
+    """Return the content of a real bookworm Packages.xz.
+
+    Without `index_file` a pinned index is downloaded once and kept in the
+    lockfile-generator cache directory.
+    """
+    if index_file is None:
+        index_file = default_cache_dir() / "benchmarks" / "bookworm-Packages.xz"
+        if not index_file.exists():
+            print(f"Downloading {BOOKWORM_INDEX_URL} ...")
+            response = requests.get(BOOKWORM_INDEX_URL)
+            response.raise_for_status()
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            index_file.write_bytes(response.content)
+    return index_file.read_bytes()
+
+
+def synthetic_packages(
+    num_libraries: int, num_applications: int, seed: int = 0
+) -> list[tuple[str, str, Optional[str]]]:
+    """Return (name, depends, provides) of a synthetic package index.
+
+    Libraries depend on up to three libraries from a lower layer of the
+    hierarchy, applications on five random libraries. This keeps closures at a
+    realistic size of around 50 packages. Some dependencies are alternatives,
+    some of them on virtual packages.
+    """
+    rng = random.Random(seed)
+    packages = []
+    for i in range(num_libraries):
+        window = range(i // 8, i // 4)
+        dependencies = [
+            f"lib{d}" for d in rng.sample(window, min(len(window), rng.randint(0, 3)))
+        ]
+        if dependencies and i % 7 == 0:
+            dependencies[0] += f" | lib{i // 4}-virtual"
+        provides = f"lib{i}-virtual" if i % 4 == 0 else None
+        packages.append((f"lib{i}", ", ".join(dependencies), provides))
+    for i in range(num_applications):
+        dependencies = [f"lib{d}" for d in rng.sample(range(num_libraries), 5)]
+        packages.append((f"app{i}", ", ".join(dependencies), None))
+    return packages
@@ -0,0 +1,157 @@
+"""Benchmark generate_lockfile with synthetic configs of increasing size.
+
+The package indexes are synthetic and served from a pre-populated cache, so
+no network access is needed. Each config is generated once with resolutions
+shared between archs and once resolving every arch on its own, as reference.
+
+Usage:
+
+    bazel run //benchmarks:generate_lockfile -- [--sizes 500,1000,2000,4000]
+        [--arch-all]
+"""
+
+import argparse
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import BOOKWORM_SNAPSHOT, synthetic_packages
+from debian_packages.private.lockfile_generator.cache import IndexCache
+from debian_packages.private.lockfile_generator.config import (
+    Arch,
+    Distro,
+    Lockfile,
+    PackagesConfig,
+    SnapshotsConfig,
+)
+from debian_packages.private.lockfile_generator.deb import (
+    Package,
+    PackageIndexGroup,
+)
+from debian_packages.private.lockfile_generator.lockfile import generate_lockfile
+
+MIRROR = "https://snapshot.debian.org"
+
+ARCHS = [Arch.AMD64, Arch.ARM64, Arch.ARM, Arch.PPC64LE, Arch.S390X]
+
+
+def synthetic_index(
+    pool_root_url: str, arch: str, num_libraries: int, num_applications: int
+) -> list[Package]:
+    packages = []
+    for name, depends, provides in synthetic_packages(num_libraries, num_applications):
+        url = f"{pool_root_url}pool/main/{name[0]}/{name}/{name}_1.0-1_{arch}.deb"
+        sha256 = hashlib.sha256(url.encode()).hexdigest()
+        packages.append(
+            Package(
+                name=name,
+                version="1.0-1",
+                url=url,
+                sha256=sha256,
+                relations=depends or None,
+            )
+        )
+        if provides:
+            packages.append(
+                Package(name=provides, version=None, url=url, sha256=sha256)
+            )
+    return packages
+
+
+def populate_cache(
+    cache: IndexCache,
+    snapshots: SnapshotsConfig,
+    num_libraries: int,
+    num_applications: int,
+    arch_all: bool = False,
+) -> None:
+    """Cache synthetic package indexes for all ARCHS.
+
+    With `arch_all`, all packages are Architecture: all, so that their files
+    and resolutions are the same for all archs.
+    """
+    releases: dict[str, str] = {}
+    for arch in ARCHS:
+        pig = PackageIndexGroup(
+            snapshots=snapshots, arch=arch, distro=Distro.DEBIAN12, mirror=MIRROR
+        )
+        for index in pig.indexes:
+            sha256 = hashlib.sha256(index.index_file_url.encode()).hexdigest()
+            entry = f" {sha256} 0 {index.index_file_path}\n"
+            releases[index.release_file_url] = (
+                releases.get(index.release_file_url, "SHA256:\n") + entry
+            )
+            packages = []
+            if index is pig.main:
+                packages = synthetic_index(
+                    index.pool_root_url,
+                    "all" if arch_all else pig.debian_arch,
+                    num_libraries,
+                    num_applications,
+                )
+            cache.put_packages(sha256, index.pool_root_url, packages)
+    for url, release in releases.items():
+        cache.put_release(url, release.encode())
+
+
+def measure(
+    snapshots: SnapshotsConfig,
+    packages_config: list[PackagesConfig],
+    cache: IndexCache,
+    share_resolutions: bool,
+) -> tuple[float, Lockfile]:
+    start = time.perf_counter()
+    lockfile = generate_lockfile(
+        snapshots_config=snapshots,
+        packages_config=packages_config,
+        mirror=MIRROR,
+        cache=cache,
+        share_resolutions=share_resolutions,
+    )
+    return time.perf_counter() - start, lockfile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="500,1000,2000,4000")
+    parser.add_argument("--libraries", type=int, default=20000)
+    parser.add_argument(
+        "--arch-all",
+        action="store_true",
+        help="Make all packages Architecture: all, to resolve them once.",
+    )
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    snapshots = SnapshotsConfig(main=BOOKWORM_SNAPSHOT, security=BOOKWORM_SNAPSHOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = IndexCache(Path(tmp))
+        populate_cache(cache, snapshots, args.libraries, max(sizes), args.arch_all)
+
+        print(
+            f"{'packages':>10} {'archs':>6} {'files':>8} {'time':>9} "
+            f"{'per arch':>9}"
+        )
+        for size in sizes:
+            packages_config = [
+                PackagesConfig(
+                    archs=ARCHS,
+                    distros=[Distro.DEBIAN12],
+                    packages=[f"app{i}" for i in range(size)],
+                )
+            ]
+            elapsed, lockfile = measure(snapshots, packages_config, cache, True)
+            # resolving every arch on its own is the reference
+            per_arch, expected = measure(snapshots, packages_config, cache, False)
+            if lockfile != expected:
+                raise SystemExit("shared resolutions differ from per-arch ones")
+            files = sum(len(f) for a in lockfile.files.values() for f in a.values())
+            print(
+                f"{size:>10} {len(ARCHS):>6} {files:>8} {elapsed:>8.3f}s "
+                f"{per_arch:>8.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
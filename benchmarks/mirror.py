@@ -0,0 +1,140 @@
+"""A local stand-in for snapshot.debian.org.
+
+Serves a directory tree laid out like the snapshot mirror: release files and
+package indexes below `archive/<archive>/<snapshot>/dists/`, and a listing of
+the available snapshots at `archive/<archive>/`. The tree is either recorded
+from the real mirror or generated by `build_mirror`.
+"""
+
+import functools
+import hashlib
+import lzma
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.fixtures import BOOKWORM_SNAPSHOT, synthetic_packages
+
+
+def _stanza(
+    name: str,
+    arch: str,
+    depends: str,
+    provides: Optional[str],
+    version: str = "1.0-1",
+) -> str:
+    filename = f"pool/main/{name[0]}/{name}/{name}_{version}_{arch}.deb"
+    lines = [
+        f"Package: {name}",
+        f"Version: {version}",
+        f"Architecture: {arch}",
+        "Maintainer: Benchmarks <benchmarks@example.com>",
+        f"Description: synthetic package {name}",
+        " Only exists to benchmark the lockfile generator.",
+    ]
+    if depends:
+        lines.append(f"Depends: {depends}")
+    if provides:
+        lines.append(f"Provides: {provides}")
+    lines += [
+        f"Filename: {filename}",
+        "Size: 1024",
+        f"SHA256: {hashlib.sha256(filename.encode()).hexdigest()}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _write_dist(dist: Path, arch: str, index: str) -> None:
+    """Write an index file and add it to the release file of dist."""
+    index_file_path = f"main/binary-{arch}/Packages.xz"
+    data = lzma.compress(index.encode())
+    (dist / index_file_path).parent.mkdir(parents=True, exist_ok=True)
+    (dist / index_file_path).write_bytes(data)
+
+    release = dist / "Release"
+    if not release.exists():
+        release.write_text(f"Origin: Debian\nCodename: {dist.name}\nSHA256:\n")
+    with release.open("a") as f:
+        f.write(f" {hashlib.sha256(data).hexdigest()} {len(data)} {index_file_path}\n")
+
+
+def build_mirror(
+    root: Path,
+    archs: list[str],
+    num_libraries: int,
+    num_applications: int,
+    snapshot: str = BOOKWORM_SNAPSHOT,
+) -> None:
+    """Generate a synthetic bookworm snapshot for the given (debian) archs.
+
+    Like in the real archive, every fifth package is built for all archs, and
+    the updates and security indexes hold newer versions of a few packages.
+    """
+    packages = synthetic_packages(num_libraries, num_applications)
+    archives = {
+        "debian": ["bookworm", "bookworm-updates"],
+        "debian-security": ["bookworm-security"],
+    }
+    versions = {
+        "bookworm": (1, "1.0-1"),
+        "bookworm-updates": (50, "1.0-1+deb12u1"),
+        "bookworm-security": (100, "1.0-1+deb12u2"),
+    }
+    for archive, dists in archives.items():
+        (root / "archive" / archive).mkdir(parents=True, exist_ok=True)
+        (root / "archive" / archive / "index.html").write_text(
+            f'<a href="{snapshot}/">{snapshot}</a>\n'
+        )
+        for dist in dists:
+            every, version = versions[dist]
+            for arch in archs:
+                index = "\n".join(
+                    _stanza(
+                        name, "all" if i % 5 == 0 else arch, depends, provides, version
+                    )
+                    for i, (name, depends, provides) in enumerate(packages)
+                    if i % every == 0
+                )
+                path = root / "archive" / archive / snapshot / "dists" / dist
+                _write_dist(path, arch, index)
+
+
+class LocalMirror:
+    """Serves a mirror directory on a free local port, counting bytes served."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        mirror = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def copyfile(self, source, outputfile):
+                data = source.read()
+                outputfile.write(data)
+                with mirror._lock:
+                    mirror.bytes_served += len(data)
+
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), functools.partial(Handler, directory=str(root))
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "LocalMirror":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
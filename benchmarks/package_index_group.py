@@ -0,0 +1,87 @@
+"""Benchmark building and resolving a PackageIndexGroup.
+
+Usage:
+
+    bazel run //benchmarks:package_index_group -- [--index-file Packages.xz]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.fixtures import (
+    BOOKWORM_POOL_ROOT_URL,
+    BOOKWORM_SNAPSHOT,
+    get_bookworm_index,
+)
+from debian_packages.private.lockfile_generator.config import (
+    Arch,
+    Distro,
+    SnapshotsConfig,
+)
+from debian_packages.private.lockfile_generator.deb import (
+    PackageIndexGroup,
+    PackageNotFound,
+    parse_package_index,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-file", type=Path)
+    parser.add_argument("--packages", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    packages = parse_package_index(
+        BOOKWORM_POOL_ROOT_URL, get_bookworm_index(args.index_file)
+    )
+    package_names = sorted({p.name for p in packages if p.relations is not None})
+    random.seed(args.seed)
+    package_names = random.sample(package_names, args.packages)
+
+    pig = PackageIndexGroup(
+        snapshots=SnapshotsConfig(main=BOOKWORM_SNAPSHOT, security=BOOKWORM_SNAPSHOT),
+        arch=Arch.AMD64,
+        distro=Distro.DEBIAN12,
+        mirror="https://snapshot.debian.org",
+    )
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    pig.add_packages(pig.main, packages)
+    pig.add_packages(pig.updates, [])
+    pig.add_packages(pig.security, [])
+    pig.load()
+    graph_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolvable = []
+    for package_name in package_names:
+        try:
+            pig.resolve_package(package_name, [], [])
+            resolvable.append(package_name)
+        except PackageNotFound:
+            pass
+    resolve_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolved = pig.resolve_packages(resolvable, [], [])
+    batch_resolve_time = time.perf_counter() - start
+    dependencies = sum(len(d) for _, d in resolved)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"nodes:                    {len(pig.graph)}")
+    print(f"edges (expanded):         {pig.graph.num_edges}")
+    print(f"resolved packages:        {len(resolvable)} ({dependencies} dependencies)")
+    print(f"graph construction:       {graph_time:.3f}s")
+    print(f"resolution (one by one):  {resolve_time:.3f}s")
+    print(f"resolution (batch):       {batch_resolve_time:.3f}s")
+    print(f"peak traced memory:       {peak / (1024 * 1024):.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark parse_package_index against the deb822 based parser it replaced.
+
+Usage:
+
+    bazel run //benchmarks:parse_package_index -- [--index-file Packages.xz]
+"""
+
+import argparse
+import io
+import lzma
+import time
+from pathlib import Path
+from typing import Callable
+
+from debian import deb822
+
+from benchmarks.fixtures import BOOKWORM_POOL_ROOT_URL, get_bookworm_index
+from debian_packages.private.lockfile_generator.deb import parse_package_index
+
+
+def parse_package_index_deb822(pool_root_url: str, data: bytes) -> list[tuple]:
+    """The parser used before the streaming parser, as a reference."""
+    packages = []
+    with lzma.open(io.BytesIO(data)) as f:
+        for p in deb822.Packages.iter_paragraphs(f, use_apt_pkg=False):
+            url = pool_root_url + p["Filename"]
+            relations = p.relations["depends"] + p.relations["pre-depends"]
+            dependencies = []
+            for r in relations:
+                if len(r) == 1:
+                    dependencies.append(r[0]["name"])
+                else:
+                    dependencies.append(tuple(d["name"] for d in r))
+            packages.append(
+                (
+                    p["Package"],
+                    p["Version"],
+                    url,
+                    p["SHA256"],
+                    tuple(dict.fromkeys(dependencies)),
+                )
+            )
+            for v in p.relations["provides"]:
+                version = v[0]["version"]
+                packages.append(
+                    (
+                        v[0]["name"],
+                        version[1] if version else None,
+                        url,
+                        p["SHA256"],
+                        (),
+                    )
+                )
+    return packages
+
+
+def parse_package_index_eager(pool_root_url: str, data: bytes) -> list[tuple]:
+    """The streaming parser, with every dependency relation parsed."""
+    return [
+        (p.name, p.version, p.url, p.sha256, p.dependencies)
+        for p in parse_package_index(pool_root_url, data)
+    ]
+
+
+def measure(fn: Callable, data: bytes, rounds: int) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn(BOOKWORM_POOL_ROOT_URL, data)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-file", type=Path)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    data = get_bookworm_index(args.index_file)
+
+    deb822_time, expected = measure(parse_package_index_deb822, data, args.rounds)
+    lazy_time, packages = measure(parse_package_index, data, args.rounds)
+    eager_time, actual = measure(parse_package_index_eager, data, args.rounds)
+
+    if actual != expected:
+        raise SystemExit("parse_package_index does not match the deb822 parser")
+
+    print(f"records:                        {len(packages)}")
+    print(f"deb822:                         {deb822_time:.3f}s")
+    print(f"streaming (lazy relations):     {lazy_time:.3f}s")
+    print(f"streaming (all relations):      {eager_time:.3f}s")
+    print(f"speedup (lazy relations):       {deb822_time / lazy_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
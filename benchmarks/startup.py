@@ -0,0 +1,119 @@
+"""Benchmark the startup of the lockfile generator and writing lockfiles.
+
+Startup is measured in fresh interpreters, writing compares Lockfile.to_json_file
+against json.dump of Lockfile.to_dict.
+
+Usage:
+
+    bazel run //benchmarks:startup -- [--size 2000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.fixtures import BOOKWORM_SNAPSHOT
+from benchmarks.generate_lockfile import ARCHS, MIRROR, populate_cache
+from debian_packages.private.lockfile_generator.cache import IndexCache
+from debian_packages.private.lockfile_generator.config import (
+    Distro,
+    Lockfile,
+    PackagesConfig,
+    SnapshotsConfig,
+)
+from debian_packages.private.lockfile_generator.lockfile import generate_lockfile
+
+MODULE = "debian_packages.private.lockfile_generator"
+
+COMMANDS = {
+    "python": ["-c", "pass"],
+    "--help": ["-m", MODULE, "--help"],
+    "why --help": ["-m", MODULE, "why", "--help"],
+    "import lockfile": ["-c", f"import {MODULE}.lockfile"],
+}
+
+
+def measure_startup(args: list[str], rounds: int) -> float:
+    # the subprocesses find the modules where this one does
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], env=env, check=True, capture_output=True
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def write_to_dict(lockfile: Lockfile, path: Path) -> None:
+    """The way lockfiles were written before, as a reference."""
+    path.write_text(json.dumps(lockfile.to_dict(), indent=2, sort_keys=True))
+
+
+def write_direct(lockfile: Lockfile, path: Path) -> None:
+    lockfile.to_json_file(path, indent=2, sort_keys=True)
+
+
+def measure_write(
+    fn: Callable[[Lockfile, Path], None], lockfile: Lockfile, path: Path, rounds: int
+) -> tuple[float, bytes]:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(lockfile, path)
+        best = min(best, time.perf_counter() - start)
+    return best, path.read_bytes()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--libraries", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, command in COMMANDS.items():
+        elapsed = measure_startup(command, args.rounds)
+        print(f"{name + ':':<32}{elapsed * 1000:.0f}ms")
+
+    snapshots = SnapshotsConfig(main=BOOKWORM_SNAPSHOT, security=BOOKWORM_SNAPSHOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = IndexCache(Path(tmp) / "cache")
+        populate_cache(cache, snapshots, args.libraries, args.size)
+        lockfile = generate_lockfile(
+            snapshots_config=snapshots,
+            packages_config=[
+                PackagesConfig(
+                    archs=ARCHS,
+                    distros=[Distro.DEBIAN12],
+                    packages=[f"app{i}" for i in range(args.size)],
+                )
+            ],
+            mirror=MIRROR,
+            cache=cache,
+        )
+
+        path = Path(tmp) / "packages.lock"
+        to_dict_time, expected = measure_write(
+            write_to_dict, lockfile, path, args.rounds
+        )
+        direct_time, actual = measure_write(write_direct, lockfile, path, args.rounds)
+
+    if actual != expected:
+        raise SystemExit("Lockfile.to_json_file does not match json.dump")
+
+    print(f"{'lockfile size:':<32}{len(actual) / (1024 * 1024):.1f} MiB")
+    print(f"{'json.dump of to_dict:':<32}{to_dict_time:.3f}s")
+    print(f"{'to_json_file:':<32}{direct_time:.3f}s")
+    print(f"{'speedup:':<32}{to_dict_time / direct_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
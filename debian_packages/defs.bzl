@@ -6,8 +6,9 @@ load("@rules_debian_packages//debian_packages:defs.bzl", ...)
 ```
 """
 
-load("//debian_packages/private:lockfile.bzl", _debian_packages_lockfile = "debian_packages_lockfile")
+load("//debian_packages/private:lockfile.bzl", _debian_packages_lockfile = "debian_packages_lockfile", _debian_packages_lockfiles = "debian_packages_lockfiles")
 load("//debian_packages/private:repository.bzl", _debian_packages_repository = "debian_packages_repository")
 
 debian_packages_lockfile = _debian_packages_lockfile
+debian_packages_lockfiles = _debian_packages_lockfiles
 debian_packages_repository = _debian_packages_repository
@@ -0,0 +1,98 @@
+"""Module extensions for use with bzlmod.
+
+Typical usage in `MODULE.bazel`:
+
+```starlark
+debian_packages = use_extension("@rules_debian_packages//debian_packages:extensions.bzl", "debian_packages")
+debian_packages.install(
+    name = "my_debian_packages",
+    default_arch = "amd64",
+    default_distro = "debian12",
+    lock_file = "//path/to:debian_packages.lock",
+)
+use_repo(debian_packages, "my_debian_packages")
+```
+
+The targets of `@my_debian_packages` are the same as with
+`debian_packages_repository`. Calling `install_deps` is not needed.
+"""
+
+load("//debian_packages/private:debfile.bzl", "debfile_repository")
+load("//debian_packages/private:repository.bzl", "debian_packages_repository", "get_lock_file_files", "read_lock_file")
+load("//debian_packages/private:utils.bzl", "debfile_repository_name")
+
+_install = tag_class(
+    attrs = {
+        "name": attr.string(
+            doc = "The name of the package repository.",
+            mandatory = True,
+        ),
+        "lock_file": attr.label(
+            doc = "The lockfile to generate the repository from.",
+            mandatory = True,
+        ),
+        "default_distro": attr.string(
+            doc = "The debian-distro to assume as default.",
+            mandatory = True,
+        ),
+        "default_arch": attr.string(
+            doc = "The architecture to assume as default.",
+            mandatory = True,
+        ),
+        "distros": attr.string_list(
+            doc = "The debian-distros to provide packages for. Defaults to all in the lockfile.",
+        ),
+        "archs": attr.string_list(
+            doc = "The architectures to provide packages for. Defaults to all in the lockfile.",
+        ),
+        "layer_compression": attr.string(
+            doc = "The compression of package layers, `gzip` or `zstd`.",
+            default = "gzip",
+            values = ["gzip", "zstd"],
+        ),
+    },
+    doc = "Creates a package repository from a lockfile.",
+)
+
+def _debian_packages_impl(module_ctx):
+    names = {}
+    for mod in module_ctx.modules:
+        for install in mod.tags.install:
+            if install.name in names:
+                fail("debian_packages.install: duplicate name '{}'".format(install.name))
+            names[install.name] = True
+
+            # Bazel only fetches these repositories once a target of the package
+            # repository refers to them.
+            lock_file_content = read_lock_file(
+                module_ctx,
+                install.lock_file,
+                distros = install.distros,
+                archs = install.archs,
+            )
+            for name, distro, arch, url, sha256, downloaded_file_path in get_lock_file_files(lock_file_content):
+                debfile_repository(
+                    name = debfile_repository_name(install.name, name, distro, arch),
+                    urls = [url],
+                    sha256 = sha256,
+                    downloaded_file_path = downloaded_file_path,
+                    layer_compression = install.layer_compression,
+                )
+
+            debian_packages_repository(
+                name = install.name,
+                repository_name = install.name,
+                lock_file = install.lock_file,
+                distros = install.distros,
+                archs = install.archs,
+                layer_compression = install.layer_compression,
+                default_distro = install.default_distro,
+                default_arch = install.default_arch,
+            )
+
+debian_packages = module_extension(
+    implementation = _debian_packages_impl,
+    tag_classes = {
+        "install": _install,
+    },
+)
@@ -0,0 +1,100 @@
+"""Repository rules to download a single debian package (.deb file)."""
+
+_DEBFILE_BUILD_FILE_CONTENT = """\
+package(default_visibility = ["//visibility:public"])
+
+exports_files(["{downloaded_file_path}"])
+
+filegroup(
+    name = "file",
+    srcs = ["{downloaded_file_path}"],
+)
+"""
+
+_LAYER_BUILD_FILE_CONTENT = """\
+load("@rules_debian_packages//debian_packages/private:utils.bzl", "debfile_layer_rule")
+
+debfile_layer_rule(
+    name = "layer",
+    deb = "//file",
+    compression = "{layer_compression}",
+)
+"""
+
+_ALIAS_BUILD_FILE_CONTENT = """\
+alias(
+    name = "layer",
+    actual = "@{debfile_repository}//:layer",
+    visibility = ["//visibility:public"],
+)
+"""
+
+def _debfile_repository_impl(rctx):
+    rctx.download(
+        url = rctx.attr.urls,
+        output = "file/" + rctx.attr.downloaded_file_path,
+        sha256 = rctx.attr.sha256,
+    )
+    rctx.file(
+        "file/BUILD.bazel",
+        _DEBFILE_BUILD_FILE_CONTENT.format(
+            downloaded_file_path = rctx.attr.downloaded_file_path,
+        ),
+    )
+    rctx.file(
+        "BUILD.bazel",
+        _LAYER_BUILD_FILE_CONTENT.format(
+            layer_compression = rctx.attr.layer_compression,
+        ),
+    )
+
+debfile_repository = repository_rule(
+    implementation = _debfile_repository_impl,
+    attrs = {
+        "urls": attr.string_list(
+            doc = "The URLs of the .deb file.",
+            mandatory = True,
+        ),
+        "sha256": attr.string(
+            doc = "The expected SHA-256 of the .deb file.",
+            mandatory = True,
+        ),
+        "downloaded_file_path": attr.string(
+            doc = "The name of the .deb file below `file/`.",
+            mandatory = True,
+        ),
+        "layer_compression": attr.string(
+            doc = "The compression of `//:layer`.",
+            default = "gzip",
+            values = ["gzip", "zstd"],
+        ),
+    },
+    doc = """Downloads a .deb file once.
+
+The file is available as `//file` and its `data.tar.*` member, normalized and
+recompressed, as `//:layer`. The member is only extracted when `//:layer` is
+built.
+""",
+)
+
+def _debfile_layer_alias_repository_impl(rctx):
+    rctx.file(
+        "BUILD.bazel",
+        _ALIAS_BUILD_FILE_CONTENT.format(
+            debfile_repository = rctx.attr.debfile_repository,
+        ),
+    )
+
+debfile_layer_alias_repository = repository_rule(
+    implementation = _debfile_layer_alias_repository_impl,
+    attrs = {
+        "debfile_repository": attr.string(
+            doc = "The name of the debfile_repository to alias.",
+            mandatory = True,
+        ),
+    },
+    doc = """Provides the `//:layer` of a debfile_repository under another name.
+
+This keeps the labels of layers stable without downloading the .deb file again.
+""",
+)
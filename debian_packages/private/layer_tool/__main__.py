@@ -0,0 +1,77 @@
+import argparse
+import os
+from pathlib import Path
+
+from debian_packages.private.layer_tool.layer import (
+    COMPRESSIONS,
+    DEFAULT_BLOCK_SIZE,
+    merge_layers,
+    write_layer,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert the data archive of a .deb file into a layer."
+    )
+    parser.add_argument("inputs", type=Path, nargs="+")
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        default=False,
+        help="Merge the layers given as inputs instead.",
+    )
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="gzip")
+    parser.add_argument("--level", type=int)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of threads compressing the layer. Bazel already runs "
+        "one action per layer in parallel.",
+    )
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument(
+        "--mtime",
+        type=int,
+        default=int(os.environ.get("SOURCE_DATE_EPOCH", 0)),
+        help="The mtime of all entries, defaults to $SOURCE_DATE_EPOCH or 0.",
+    )
+    parser.add_argument(
+        "--digest", type=Path, help="Write the sha256 of the layer to this file."
+    )
+    parser.add_argument(
+        "--diff-id",
+        type=Path,
+        help="Write the sha256 of the uncompressed layer to this file.",
+    )
+    args = parser.parse_args()
+    if not args.merge and len(args.inputs) != 1:
+        parser.error("exactly one .deb file is required without --merge")
+    return args
+
+
+def main():
+    args = parse_args()
+    kwargs = dict(
+        compression=args.compression,
+        level=args.level,
+        jobs=max(args.jobs, 1),
+        mtime=args.mtime,
+        block_size=args.block_size,
+    )
+    with args.output.open("wb") as output:
+        if args.merge:
+            inputs = [str(path) for path in args.inputs]
+            digest, diff_id = merge_layers(inputs, output, **kwargs)
+        else:
+            digest, diff_id = write_layer(str(args.inputs[0]), output, **kwargs)
+    if args.digest:
+        args.digest.write_text(digest)
+    if args.diff_id:
+        args.diff_id.write_text(diff_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import abc
+import bz2
+import gzip
+import hashlib
+import lzma
+import posixpath
+import shutil
+import struct
+import subprocess
+import tarfile
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Iterator, Optional
+
+AR_MAGIC = b"!<arch>\n"
+AR_HEADER_SIZE = 60
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESSIONS = ["gzip", "zstd"]
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+# Every block is compressed independently, so the output does not depend on
+# the number of jobs.
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+_COPY_SIZE = 256 * 1024
+
+
+class LayerError(Exception):
+    def __init__(self, path: str, message: str):
+        self.path = path
+        super().__init__(f"{path}: {message}")
+
+
+class _MemberReader:
+    """Reads the `size` bytes of an ar member from `fileobj`."""
+
+    def __init__(self, fileobj: BinaryIO, size: int):
+        self._fileobj = fileobj
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fileobj.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def __enter__(self) -> "_MemberReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # the .deb file it reads from is closed by its owner
+        pass
+
+
+def _iter_ar_members(path: str, fileobj: BinaryIO) -> Iterator[tuple[str, int]]:
+    """Yield the name and size of every member of an ar archive.
+
+    The member's content has to be read or skipped before the next one.
+    """
+    if fileobj.read(len(AR_MAGIC)) != AR_MAGIC:
+        raise LayerError(path, "not an ar archive")
+    offset = len(AR_MAGIC)
+    while True:
+        header = fileobj.read(AR_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) != AR_HEADER_SIZE or header[58:60] != b"`\n":
+            raise LayerError(path, f"invalid ar header at byte {offset}")
+        name = header[:16].decode().rstrip(" ").rstrip("/")
+        size = int(header[48:58].decode())
+        start = offset + AR_HEADER_SIZE
+        yield name, size
+        # members are 2-byte aligned
+        offset = start + size + size % 2
+        fileobj.seek(offset)
+
+
+def _check_zstd() -> None:
+    if shutil.which("zstd") is None:
+        raise LayerError("zstd", "the zstd binary is required but was not found")
+
+
+class _ZstdReader:
+    """Decompresses `fileobj` while it is read, using the zstd binary.
+
+    Closing it waits for zstd and raises if it failed, e.g. on a corrupt input
+    whose output just ends early.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        _check_zstd()
+        self._fileobj = fileobj
+        self._process = subprocess.Popen(
+            ["zstd", "-d", "-q", "-c"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def _feed(self) -> None:
+        try:
+            while chunk := self._fileobj.read(_COPY_SIZE):
+                self._process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            self._process.stdin.close()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._process.stdout.read(size)
+
+    def close(self) -> None:
+        # tarfile stops at the end-of-archive blocks, the padding after them
+        # is left unread
+        while self._process.stdout.read(_COPY_SIZE):
+            pass
+        self._process.stdout.close()
+        self._feeder.join()
+        if self._process.wait() != 0:
+            raise LayerError("zstd", f"exited with {self._process.returncode}")
+
+    def __enter__(self) -> "_ZstdReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        self._process.kill()
+        self._process.stdout.close()
+        self._feeder.join()
+        self._process.wait()
+
+
+def _open_data_archive(name: str, member: _MemberReader) -> BinaryIO:
+    """Decompress the data archive member `name` while it is read."""
+    if name == "data.tar":
+        return member
+    if name == "data.tar.xz":
+        return lzma.LZMAFile(member)
+    if name == "data.tar.gz":
+        return gzip.GzipFile(fileobj=member)
+    if name == "data.tar.bz2":
+        return bz2.BZ2File(member)
+    if name == "data.tar.zst":
+        return _ZstdReader(member)
+    raise ValueError(name)
+
+
+class _LayerWriter(abc.ABC):
+    """A file object compressing the tar written to it into `output`.
+
+    Also computes the sha256 of the compressed layer (its digest) and of the
+    uncompressed tar (its diff_id).
+    """
+
+    def __init__(self, output: BinaryIO):
+        self.output = output
+        self.digest = hashlib.sha256()
+        self.diff_id = hashlib.sha256()
+
+    def _write_output(self, data: bytes) -> None:
+        self.output.write(data)
+        self.digest.update(data)
+
+    def write(self, data: bytes) -> int:
+        self.diff_id.update(data)
+        self._compress(data)
+        return len(data)
+
+    @abc.abstractmethod
+    def _compress(self, data: bytes) -> None:
+        """Compress data, writing the result with `_write_output`."""
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """Write all remaining compressed data."""
+
+
+def _gzip_member(data: bytes, level: int) -> bytes:
+    """Compress data into a complete gzip member with a fixed header."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    xfl = 2 if level == 9 else 4 if level == 1 else 0
+    # no mtime and an unknown OS, so the header is the same everywhere
+    header = struct.pack("<BBBBIBB", 0x1F, 0x8B, 8, 0, 0, xfl, 255)
+    trailer = struct.pack("<II", zlib.crc32(data), len(data) & 0xFFFFFFFF)
+    return header + body + trailer
+
+
+class _GzipWriter(_LayerWriter):
+    """Compresses blocks in parallel into a multi-member gzip file.
+
+    Concatenated gzip members are a valid gzip file, which decompresses to the
+    concatenated blocks.
+    """
+
+    def __init__(self, output: BinaryIO, level: int, jobs: int, block_size: int):
+        super().__init__(output)
+        self.level = level
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._pool = ThreadPoolExecutor(max_workers=jobs)
+        self._pending: deque[Future] = deque()
+        self._max_pending = 2 * jobs
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._pool.submit(_gzip_member, block, self.level))
+        while len(self._pending) > self._max_pending:
+            self._write_output(self._pending.popleft().result())
+
+    def _compress(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[: self.block_size]))
+            del self._buffer[: self.block_size]
+
+    def close(self) -> None:
+        if self._buffer or not self._pending:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._write_output(self._pending.popleft().result())
+        self._pool.shutdown()
+
+
+class _ZstdWriter(_LayerWriter):
+    """Compresses using the multi-threaded mode of the zstd binary.
+
+    In this mode the output does not depend on the number of threads.
+    """
+
+    def __init__(self, output: BinaryIO, level: int, jobs: int):
+        super().__init__(output)
+        _check_zstd()
+        self._process = subprocess.Popen(
+            ["zstd", "-q", "-c", f"-{level}", f"-T{jobs}", "--no-progress"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while chunk := self._process.stdout.read(_COPY_SIZE):
+            self._write_output(chunk)
+
+    def _compress(self, data: bytes) -> None:
+        self._process.stdin.write(data)
+
+    def close(self) -> None:
+        self._process.stdin.close()
+        self._reader.join()
+        if self._process.wait() != 0:
+            raise LayerError("zstd", f"exited with {self._process.returncode}")
+
+
+def _normalize(info: tarfile.TarInfo, mtime: int) -> tarfile.TarInfo:
+    info.mtime = mtime
+    info.uid = 0
+    info.gid = 0
+    info.uname = "root"
+    info.gname = "root"
+    info.pax_headers = {}
+    return info
+
+
+def _create_writer(
+    output: BinaryIO,
+    compression: str,
+    level: Optional[int],
+    jobs: int,
+    block_size: int,
+) -> _LayerWriter:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"unsupported compression '{compression}'")
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == "gzip":
+        return _GzipWriter(output, level, jobs, block_size)
+    return _ZstdWriter(output, level, jobs)
+
+
+def _copy_entries(
+    source: tarfile.TarFile,
+    target: tarfile.TarFile,
+    mtime: int,
+    seen: Optional[set[str]] = None,
+) -> None:
+    """Copy the normalized entries of source, skipping paths already `seen`."""
+    for info in source:
+        if seen is not None:
+            path = posixpath.normpath(info.name)
+            if path in seen:
+                continue
+            seen.add(path)
+        fileobj = source.extractfile(info) if info.isreg() else None
+        target.addfile(_normalize(info, mtime), fileobj)
+
+
+def write_layer(
+    deb_path: str,
+    output: BinaryIO,
+    compression: str = "gzip",
+    level: Optional[int] = None,
+    jobs: int = 1,
+    mtime: int = 0,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> tuple[str, str]:
+    """Write the data archive of a .deb file as a normalized, compressed tar.
+
+    The data archive is streamed from the .deb file, decompressed and
+    recompressed without being held in memory or written to disk. All entries
+    get the same mtime and are owned by root, so the output only depends on
+    the content of the package.
+
+    Returns the digest and diff_id of the layer.
+    """
+    writer = _create_writer(output, compression, level, jobs, block_size)
+
+    with open(deb_path, "rb") as deb:
+        for name, size in _iter_ar_members(deb_path, deb):
+            if name.startswith("data.tar"):
+                break
+        else:
+            raise LayerError(deb_path, "no data archive")
+
+        try:
+            data = _open_data_archive(name, _MemberReader(deb, size))
+        except ValueError:
+            raise LayerError(deb_path, f"unsupported data archive '{name}'")
+
+        with data, tarfile.open(fileobj=data, mode="r|") as source, tarfile.open(
+            fileobj=writer, mode="w|", format=tarfile.GNU_FORMAT
+        ) as target:
+            _copy_entries(source, target, mtime)
+        writer.close()
+
+    return (
+        f"sha256:{writer.digest.hexdigest()}",
+        f"sha256:{writer.diff_id.hexdigest()}",
+    )
+
+
+def _open_layer(fileobj: BinaryIO) -> BinaryIO:
+    """Decompress a (gzip or zstd compressed) layer while it is read."""
+    magic = fileobj.read(4)
+    fileobj.seek(0)
+    if magic[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=fileobj)
+    if magic == ZSTD_MAGIC:
+        return _ZstdReader(fileobj)
+    return fileobj
+
+
+def merge_layers(
+    layer_paths: list[str],
+    output: BinaryIO,
+    compression: str = "gzip",
+    level: Optional[int] = None,
+    jobs: int = 1,
+    mtime: int = 0,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> tuple[str, str]:
+    """Merge layers into a single normalized, compressed tar.
+
+    Every path is only added once, from the first layer containing it, so
+    directories shared by the layers are not repeated. The layers are streamed
+    one after another, like in `write_layer`.
+
+    Returns the digest and diff_id of the merged layer.
+    """
+    writer = _create_writer(output, compression, level, jobs, block_size)
+    seen: set[str] = set()
+
+    with tarfile.open(fileobj=writer, mode="w|", format=tarfile.GNU_FORMAT) as target:
+        for layer_path in layer_paths:
+            with open(layer_path, "rb") as layer, _open_layer(
+                layer
+            ) as data, tarfile.open(fileobj=data, mode="r|") as source:
+                _copy_entries(source, target, mtime, seen)
+    writer.close()
+
+    return (
+        f"sha256:{writer.digest.hexdigest()}",
+        f"sha256:{writer.diff_id.hexdigest()}",
+    )
@@ -8,6 +8,9 @@ def debian_packages_lockfile(
         packages_file = "packages.yaml",
         lock_file = "packages.lock",
         mirror = "https://snapshot.debian.org",
+        incremental = False,
+        shard = False,
+        provenance = False,
         verbose = False,
         debug = False):
     """Macro that produces targets to interact with a lockfile.
@@ -18,6 +21,15 @@ def debian_packages_lockfile(
     Produces a target `[name].update`, which updates the snapshots and generates
     the lockfile.
 
+    Produces a target `[name].prefetch`, which downloads all packages of the
+    lockfile concurrently into Bazel's repository cache, given as
+    `--repository-cache`. Later fetches of the packages find them there.
+
+    Produces a target `[name].query`, which answers questions about the package
+    indexes written by `[name].generate -- --database [file]`, e.g.
+    `[name].query -- why [package] --database [file]`. Queries are `why`,
+    `depends`, `rdepends` and `search`.
+
 
     Typical usage in `BUILD.bazel`:
 
@@ -28,6 +40,11 @@ def debian_packages_lockfile(
     # bazel run //path/to:debian_packages.generate
     # Update snapshots with:
     # bazel run //path/to:debian_packages.update
+    # Prefetch all packages with:
+    # bazel run //path/to:debian_packages.prefetch -- --repository-cache "$(bazel info repository_cache)"
+    # Find out why a package is included with:
+    # bazel run //path/to:debian_packages.generate -- --database /tmp/packages.db
+    # bazel run //path/to:debian_packages.query -- why libssl3 --database /tmp/packages.db
     debian_packages_lockfile(
         name = "debian_packages",
         lock_file = "debian_packages.lock",
@@ -43,6 +60,16 @@ def debian_packages_lockfile(
       packages_file: The file to read the desired packages from.
       lock_file: The file to write locked packages to.
       mirror: The debian-snapshot host to use.
+      incremental: Only resolve packages that changed since the existing
+        lockfile was generated, and copy all others from it. After a snapshot
+        update this includes the packages of distros and archs whose index
+        files did not change.
+      shard: Write the packages of each distro and arch to a lockfile of its
+        own next to `[lock_file]`, which then only lists these shards.
+        Package repositories only read the shards they need.
+      provenance: Record the dependency chain from every requested package to
+        each of its dependencies in the lockfile, to audit why a package is
+        included.
       verbose: Enable verbose logging.
       debug: Enable debug logging.
     """
@@ -63,6 +90,118 @@ def debian_packages_lockfile(
         "--mirror {}".format(mirror),
     ]
 
+    if incremental:
+        args.append("--incremental")
+
+    if shard:
+        args.append("--shard")
+
+    if provenance:
+        args.append("--provenance")
+
+    prefetch_args = [
+        "$(location {})".format(lockfile_generator),
+        "prefetch",
+        "--lock-file $(rootpath {})".format(lock_file),
+    ]
+
+    if verbose:
+        args.append("--verbose")
+        prefetch_args.append("--verbose")
+
+    if debug:
+        args.append("--debug")
+        prefetch_args.append("--debug")
+
+    write_file(
+        name = name + "_runner",
+        out = name + ".runner.sh",
+        content = ["$@"],
+    )
+
+    native.sh_binary(
+        name = name + ".generate",
+        srcs = [name + ".runner.sh"],
+        data = data,
+        args = args,
+    )
+
+    native.sh_binary(
+        name = name + ".update",
+        srcs = [name + ".runner.sh"],
+        data = data,
+        args = args + ["--update-snapshots-file"],
+    )
+
+    native.sh_binary(
+        name = name + ".prefetch",
+        srcs = [name + ".runner.sh"],
+        data = [
+            lockfile_generator,
+            lock_file,
+        ],
+        args = prefetch_args,
+    )
+
+    native.sh_binary(
+        name = name + ".query",
+        srcs = [name + ".runner.sh"],
+        data = [lockfile_generator],
+        args = ["$(location {})".format(lockfile_generator)],
+    )
+
+def debian_packages_lockfiles(
+        name,
+        manifest_file = "lockfiles.yaml",
+        incremental = False,
+        verbose = False,
+        debug = False):
+    """Macro that produces targets to interact with several lockfiles at once.
+
+    Produces a target `[name].generate`, which generates all lockfiles listed in
+    `[manifest_file]` in a single run, and a target `[name].update`, which also
+    updates their snapshots. Package indexes shared by several lockfiles (same
+    mirror, snapshots, distro and arch) are only downloaded and parsed once.
+
+    The manifest is a list of lockfiles, with paths relative to it:
+
+    ```yaml
+    - snapshots_file: debian-snapshots.yaml
+      packages_file: debian-packages.yaml
+      lock_file: debian-packages.lock
+    - snapshots_file: ubuntu-snapshots.yaml
+      packages_file: ubuntu-packages.yaml
+      lock_file: ubuntu-packages.lock
+      mirror: https://snapshot.ubuntu.com
+    ```
+
+    Every lockfile can also set `shard` and `provenance`, see
+    `debian_packages_lockfile`.
+
+    Args:
+      name: The name of the lockfiles-target.
+      manifest_file: The file listing the lockfiles to generate.
+      incremental: Only resolve packages that changed since the existing
+        lockfiles were generated, see `debian_packages_lockfile`.
+      verbose: Enable verbose logging.
+      debug: Enable debug logging.
+    """
+    lockfile_generator = Label("//debian_packages/private/lockfile_generator:binary")
+
+    data = [
+        lockfile_generator,
+        manifest_file,
+    ]
+
+    args = [
+        "$(location {})".format(lockfile_generator),
+        "batch",
+        "--manifest-file $(rootpath {})".format(manifest_file),
+    ]
+
+    if incremental:
+        args.append("--incremental")
+
     if verbose:
         args.append("--verbose")
 
@@ -1,76 +1,481 @@
 import argparse
+import cProfile
 import logging
+import os
+import sys
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-from debian_packages.private.lockfile_generator.config import (
-    PackagesConfig,
-    SnapshotsConfig,
+# Only light modules are imported up front, so that e.g. `--help` and queries
+# start quickly. The commands import the modules they need.
+from debian_packages.private.lockfile_generator import timings
+from debian_packages.private.lockfile_generator.cache import (
+    DEFAULT_MAX_SIZE,
+    IndexCache,
+    default_cache_dir,
 )
-from debian_packages.private.lockfile_generator.lockfile import generate_lockfile
-from debian_packages.private.lockfile_generator.snapshots import get_latest_snapshots
-from debian_packages.private.lockfile_generator.deb import (
-    get_debian_distro,
-    get_debian_arch,
+from debian_packages.private.lockfile_generator.download import (
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    Downloader,
 )
 
+if TYPE_CHECKING:
+    from debian_packages.private.lockfile_generator.config import (
+        Lockfile,
+        PackagesConfig,
+        SnapshotsConfig,
+    )
+
 logging.basicConfig(level=logging.WARNING)
 
 logger = logging.getLogger("lockfile_generator")
 
+QUERIES = ["why", "depends", "rdepends", "search"]
+
+
+def _add_download_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
 
-def parse_args() -> argparse.Namespace:
+
+def _add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--timings",
+        type=Path,
+        help="Write a JSON report of the time spent per phase to this file.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="Write the phases as Chrome trace events (chrome://tracing) to this file.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help="Write cProfile statistics of the main process to this file.",
+    )
+    parser.add_argument("--verbose", action="store_true", default=False)
+    parser.add_argument("--debug", action="store_true", default=False)
+
+
+def _add_generate_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--update-snapshots-file", action="store_true", default=False)
+    parser.add_argument("--incremental", action="store_true", default=False)
+    parser.add_argument("--cache-dir", type=Path, default=default_cache_dir())
+    parser.add_argument(
+        "--cache-max-size-mb", type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024)
+    )
+    parser.add_argument("--no-cache", action="store_true", default=False)
+    parser.add_argument("--dry-run", action="store_true", default=False)
+    _add_download_arguments(parser)
+    _add_common_arguments(parser)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--snapshots-file", type=Path, required=True)
     parser.add_argument("--packages-file", type=Path, required=True)
     parser.add_argument("--lock-file", type=Path, required=True)
-    parser.add_argument("--update-snapshots-file", action="store_true", default=False)
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        default=False,
+        help="Write one lockfile per distro and arch, listed in --lock-file.",
+    )
+    parser.add_argument(
+        "--provenance",
+        action="store_true",
+        default=False,
+        help="Record the dependency chain of every dependency in the lockfile.",
+    )
     parser.add_argument("--mirror", type=str, default="https://snapshot.debian.org")
-    parser.add_argument("--dry-run", action="store_true", default=False)
-    parser.add_argument("--verbose", action="store_true", default=False)
-    parser.add_argument("--debug", action="store_true", default=False)
-    return parser.parse_args()
+    parser.add_argument(
+        "--database",
+        type=Path,
+        help="Write the loaded package indexes to this SQLite database, to query "
+        f"with the {', '.join(QUERIES)} commands.",
+    )
+    _add_generate_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def parse_batch_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="batch",
+        description="Generate several lockfiles, sharing their package indexes.",
+    )
+    parser.add_argument(
+        "--manifest-file",
+        type=Path,
+        required=True,
+        help="A YAML list of the snapshots_file, packages_file and lock_file "
+        "(and optionally mirror, shard and provenance) of every lockfile.",
+    )
+    _add_generate_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def parse_prefetch_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="prefetch",
+        description="Download the files of a lockfile into Bazel's repository cache.",
+    )
+    parser.add_argument("--lock-file", type=Path, required=True)
+    parser.add_argument(
+        "--repository-cache",
+        type=Path,
+        required=True,
+        help="Bazel's repository cache, see `bazel info repository_cache`.",
+    )
+    parser.add_argument(
+        "--distro",
+        dest="distros",
+        action="append",
+        help="Only prefetch the files of this distro, may be repeated.",
+    )
+    parser.add_argument(
+        "--arch",
+        dest="archs",
+        action="append",
+        help="Only prefetch the files of this arch, may be repeated.",
+    )
+    _add_download_arguments(parser)
+    _add_common_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def parse_query_args(command: str, argv: list[str]) -> argparse.Namespace:
+    descriptions = {
+        "why": "Show the shortest dependency path to a package from every "
+        "requested package reaching it.",
+        "depends": "List the dependencies of a package.",
+        "rdepends": "List the packages depending on a package.",
+        "search": "List the packages whose name matches a glob pattern or "
+        "contains a string.",
+    }
+    parser = argparse.ArgumentParser(prog=command, description=descriptions[command])
+    parser.add_argument("package" if command != "search" else "pattern")
+    parser.add_argument(
+        "--database",
+        type=Path,
+        required=True,
+        help="The database written by generating with --database.",
+    )
+    parser.add_argument("--distro", help="Required for several distros.")
+    parser.add_argument("--arch", help="Required for several archs.")
+    if command == "why":
+        parser.add_argument(
+            "--from",
+            dest="roots",
+            action="append",
+            help="Only show the path from this package, may be repeated.",
+        )
+    if command in ("depends", "rdepends"):
+        parser.add_argument(
+            "--closure",
+            action="store_true",
+            default=False,
+            help="Also list indirect dependencies, following all alternatives.",
+        )
+    _add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = command
+    if not args.database.exists():
+        parser.error(f"no database at {args.database}")
+    return args
 
 
 def main():
-    args = parse_args()
+    subcommand = sys.argv[1] if len(sys.argv) > 1 else None
+    if subcommand == "batch":
+        command = batch
+        args = parse_batch_args(sys.argv[2:])
+    elif subcommand == "prefetch":
+        command = prefetch
+        args = parse_prefetch_args(sys.argv[2:])
+    elif subcommand in QUERIES:
+        command = query
+        args = parse_query_args(subcommand, sys.argv[2:])
+    else:
+        command = generate
+        args = parse_args(sys.argv[1:])
     if args.verbose:
         logger.setLevel(logging.INFO)
 
     if args.debug:
         logger.setLevel(logging.DEBUG)
 
+    recorder = None
+    if args.timings or args.trace:
+        recorder = timings.enable()
+
+    profile = None
+    if args.profile:
+        profile = cProfile.Profile()
+        profile.enable()
+
+    try:
+        command(args)
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(args.profile)
+            logger.info(f"Wrote profile: {args.profile}")
+        if args.timings:
+            recorder.write_report(args.timings)
+            logger.info(f"Wrote timings: {args.timings}")
+        if args.trace:
+            recorder.write_trace(args.trace)
+            logger.info(f"Wrote trace: {args.trace}")
+
+
+def _create_downloader(args: argparse.Namespace) -> Downloader:
+    return Downloader(
+        timeout=args.timeout,
+        retries=args.retries,
+        pool_size=max(args.jobs, 10),
+    )
+
+
+def _create_cache(args: argparse.Namespace) -> Optional[IndexCache]:
+    if args.no_cache:
+        return None
+    logger.info(f"Using cache: {args.cache_dir}")
+    return IndexCache(
+        path=args.cache_dir,
+        max_size=args.cache_max_size_mb * 1024 * 1024,
+    )
+
+
+def _update_snapshots(
+    snapshots: "SnapshotsConfig",
+    packages: "PackagesConfig",
+    mirror: str,
+    downloader: Downloader,
+    latest: dict[tuple[str, str, str], "SnapshotsConfig"],
+) -> "SnapshotsConfig":
+    """Return the latest snapshots, which are only retrieved once per `latest`."""
+    from debian_packages.private.lockfile_generator.deb import (
+        get_debian_arch,
+        get_debian_distro,
+    )
+    from debian_packages.private.lockfile_generator.snapshots import (
+        get_latest_snapshots,
+    )
+
+    release_name = get_debian_distro(packages[0].get_distros()[0])
+    arch_name = get_debian_arch(packages[0].get_archs()[0])
+    key = (mirror, release_name, arch_name)
+    if key not in latest:
+        logger.debug("Retrieving latest snapshots ...")
+        with timings.span("update_snapshots"):
+            latest[key] = get_latest_snapshots(
+                mirror=mirror,
+                release=release_name,
+                arch=arch_name,
+                downloader=downloader,
+            )
+    if snapshots == latest[key]:
+        logger.info("Already at latest snapshots.")
+        return snapshots
+    logger.info(f"Using new snapshots: {latest[key]}")
+    return latest[key]
+
+
+def _write_lockfile(
+    args: argparse.Namespace,
+    lockfile: "Lockfile",
+    snapshots_file: Path,
+    lock_file: Path,
+    shard: bool,
+) -> None:
+    if args.dry_run:
+        logger.info("Dry run. not writing files!")
+        logger.debug(lockfile.to_json())
+    else:
+        with timings.span("write_lockfile"):
+            lockfile.snapshots.to_yaml_file(snapshots_file)
+            lockfile.to_json_file(lock_file, shard=shard, indent=2, sort_keys=True)
+
+
+def generate(args: argparse.Namespace) -> None:
+    from debian_packages.private.lockfile_generator.config import (
+        Lockfile,
+        PackagesConfig,
+        SnapshotsConfig,
+    )
+    from debian_packages.private.lockfile_generator.database import PackageDatabase
+    from debian_packages.private.lockfile_generator.lockfile import generate_lockfile
+
     snapshots = SnapshotsConfig.from_yaml_file(args.snapshots_file)
 
     logger.info(f"Using mirror: {args.mirror}")
 
+    downloader = _create_downloader(args)
+    cache = _create_cache(args)
+
     packages = PackagesConfig.from_yaml_file(args.packages_file)
-    release_name = get_debian_distro(packages[0].get_distros()[0])
-    arch_name = get_debian_arch(packages[0].get_archs()[0])
 
     if args.update_snapshots_file:
-        logger.debug("Retrieving latest snapshots ...")
-        latest_snapshots = get_latest_snapshots(
-            mirror=args.mirror, release=release_name, arch=arch_name
+        snapshots = _update_snapshots(
+            snapshots, packages, args.mirror, downloader, latest={}
         )
-        if snapshots == latest_snapshots:
-            logger.info("Already at latest snapshots.")
-        else:
-            snapshots = latest_snapshots
-            logger.info(f"Using new snapshots: {snapshots}")
+
+    previous = None
+    if args.incremental and args.lock_file.exists():
+        logger.info(f"Regenerating incrementally from: {args.lock_file}")
+        previous = Lockfile.from_json_file(args.lock_file)
+
+    database = None
+    if args.database:
+        logger.info(f"Writing package indexes to: {args.database}")
+        database = PackageDatabase(args.database)
 
     logger.debug("Generating lockfile ...")
-    lockfile = generate_lockfile(
-        snapshots_config=snapshots,
-        packages_config=packages,
-        mirror=args.mirror,
+    with timings.span("generate_lockfile"):
+        lockfile = generate_lockfile(
+            snapshots_config=snapshots,
+            packages_config=packages,
+            mirror=args.mirror,
+            jobs=args.jobs,
+            cache=cache,
+            previous=previous,
+            incremental=args.incremental,
+            downloader=downloader,
+            database=database,
+            provenance=args.provenance,
+        )
+    if database is not None:
+        database.close()
+
+    _write_lockfile(args, lockfile, args.snapshots_file, args.lock_file, args.shard)
+
+
+def batch(args: argparse.Namespace) -> None:
+    from debian_packages.private.lockfile_generator.config import (
+        Lockfile,
+        LockfileConfig,
+        PackagesConfig,
+        SnapshotsConfig,
+    )
+    from debian_packages.private.lockfile_generator.deb import PackageIndexGroup
+    from debian_packages.private.lockfile_generator.lockfile import (
+        PackageIndexGroupKey,
+        generate_lockfile,
+        load_shared_package_index_groups,
     )
 
-    if args.dry_run:
-        logger.info("Dry run. not writing files!")
-        logger.debug(lockfile.to_json())
-    else:
-        snapshots.to_yaml_file(args.snapshots_file)
-        lockfile.to_json_file(args.lock_file, indent=2, sort_keys=True)
+    # the manifest may be a symlink into the workspace, e.g. from runfiles
+    root = args.manifest_file.resolve().parent
+    configs = LockfileConfig.from_yaml_file(args.manifest_file)
+    logger.info(f"Generating {len(configs)} lockfiles from: {args.manifest_file}")
+
+    downloader = _create_downloader(args)
+    cache = _create_cache(args)
+
+    latest: dict[tuple[str, str, str], SnapshotsConfig] = {}
+    inputs = []
+    for config in configs:
+        snapshots = SnapshotsConfig.from_yaml_file(root / config.snapshots_file)
+        packages = PackagesConfig.from_yaml_file(root / config.packages_file)
+        if args.update_snapshots_file:
+            snapshots = _update_snapshots(
+                snapshots, packages, config.mirror, downloader, latest
+            )
+        inputs.append((snapshots, packages))
+
+    groups: dict[PackageIndexGroupKey, PackageIndexGroup] = {}
+    if not args.incremental:
+        # incrementally, only the groups with changed packages are loaded
+        with timings.span("load_shared_package_index_groups"):
+            load_shared_package_index_groups(
+                [
+                    (snapshots, packages, config.mirror)
+                    for config, (snapshots, packages) in zip(configs, inputs)
+                ],
+                groups,
+                jobs=args.jobs,
+                cache=cache,
+                downloader=downloader,
+            )
+
+    for config, (snapshots, packages) in zip(configs, inputs):
+        lock_file = root / config.lock_file
+        previous = None
+        if args.incremental and lock_file.exists():
+            logger.info(f"Regenerating incrementally from: {lock_file}")
+            previous = Lockfile.from_json_file(lock_file)
+
+        logger.debug(f"Generating lockfile {lock_file} ...")
+        with timings.span("generate_lockfile", lock_file=str(config.lock_file)):
+            lockfile = generate_lockfile(
+                snapshots_config=snapshots,
+                packages_config=packages,
+                mirror=config.mirror,
+                jobs=args.jobs,
+                cache=cache,
+                previous=previous,
+                incremental=args.incremental,
+                downloader=downloader,
+                provenance=config.provenance,
+                groups=groups,
+            )
+        _write_lockfile(
+            args, lockfile, root / config.snapshots_file, lock_file, config.shard
+        )
+
+
+def prefetch(args: argparse.Namespace) -> None:
+    from debian_packages.private.lockfile_generator.config import Lockfile
+    from debian_packages.private.lockfile_generator.prefetch import (
+        get_lockfile_files,
+        prefetch_files,
+    )
+
+    lockfile = Lockfile.from_json_file(args.lock_file)
+    files = get_lockfile_files(lockfile, distros=args.distros, archs=args.archs)
+    logger.info(f"Prefetching {len(files)} files into: {args.repository_cache}")
+
+    downloader = _create_downloader(args)
+    summary = prefetch_files(
+        files, args.repository_cache, jobs=args.jobs, downloader=downloader
+    )
+    print(f"Prefetched {summary}")
+    if summary.failed:
+        sys.exit(1)
+
+
+def query(args: argparse.Namespace) -> None:
+    from debian_packages.private.lockfile_generator.database import (
+        DatabaseError,
+        PackageDatabase,
+    )
+    from debian_packages.private.lockfile_generator.deb import PackageNotFound
+
+    database = PackageDatabase(args.database)
+    try:
+        packages = database.query(args.distro, args.arch)
+        if args.command == "why":
+            paths = packages.why(args.package, roots=args.roots)
+            if not paths:
+                sys.exit(f"{args.package} is not a dependency of any package")
+            for path in paths:
+                print(" -> ".join(path))
+            return
+        if args.command == "search":
+            rows = packages.search(args.pattern)
+        elif args.command == "depends":
+            rows = packages.depends(args.package, closure=args.closure)
+        else:
+            rows = packages.rdepends(args.package, closure=args.closure)
+        for name, version in rows:
+            print(name if version is None else f"{name} {version}")
+    except (DatabaseError, PackageNotFound) as e:
+        sys.exit(f"error: {e}")
+    finally:
+        database.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from debian_packages.private.lockfile_generator.deb import Package
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 2048 * 1024 * 1024
+
+# Bump whenever the pickled representation of parsed packages changes.
+_PACKAGES_FORMAT_VERSION = 3
+
+
+def default_cache_dir() -> Path:
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache_home:
+        return Path(xdg_cache_home) / "rules_debian_packages"
+    return Path.home() / ".cache" / "rules_debian_packages"
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class IndexChecksumMismatch(Exception):
+    def __init__(self, url: str, expected: str, actual: str):
+        self.url = url
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            f"Checksum mismatch for '{url}' (expected {expected}, got {actual})"
+        )
+
+
+class IndexCache:
+    """Content-addressed cache of snapshot index files.
+
+    Snapshot urls never change, so release files are cached by url. Index files
+    are cached by the sha256 listed in their release file, both as the raw
+    download and as parsed packages. The latest version of every index file is
+    kept track of, to update it to newer snapshots using pdiffs.
+    """
+
+    def __init__(self, path: Path, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._releases: dict[str, bytes] = {}
+
+    def _release_path(self, url: str) -> Path:
+        return self.path / "releases" / _sha256(url.encode())
+
+    def _index_path(self, sha256: str) -> Path:
+        return self.path / "indexes" / sha256
+
+    def _latest_path(self, unversioned_url: str) -> Path:
+        return self.path / "latest" / _sha256(unversioned_url.encode())
+
+    def _packages_path(self, sha256: str, pool_root_url: str) -> Path:
+        key = f"{_PACKAGES_FORMAT_VERSION}:{sha256}:{pool_root_url}"
+        return self.path / "packages" / _sha256(key.encode())
+
+    def _read(self, path: Path) -> Optional[bytes]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # keep track of usage for eviction
+        os.utime(path)
+        return data
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get_release(self, url: str) -> Optional[bytes]:
+        if url not in self._releases:
+            data = self._read(self._release_path(url))
+            if data is None:
+                return None
+            self._releases[url] = data
+        return self._releases[url]
+
+    def put_release(self, url: str, data: bytes) -> None:
+        self._releases[url] = data
+        self._write(self._release_path(url), data)
+
+    def get_index(self, sha256: str) -> Optional[bytes]:
+        path = self._index_path(sha256)
+        data = self._read(path)
+        if data is not None and _sha256(data) != sha256:
+            logger.warning(f"Discarding corrupt cache entry: {path}")
+            path.unlink(missing_ok=True)
+            return None
+        return data
+
+    def put_index(
+        self, url: str, sha256: str, chunks: Iterable[bytes]
+    ) -> Iterator[bytes]:
+        """Pass through the chunks of an index file while writing them to the cache.
+
+        The entry is only added once all chunks have been consumed and their
+        checksum matches.
+        """
+        path = self._index_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    yield chunk
+            actual = digest.hexdigest()
+            if actual != sha256:
+                raise IndexChecksumMismatch(url=url, expected=sha256, actual=actual)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def add_index(self, data: bytes) -> str:
+        """Add an index file that is not listed in a release file, e.g. one
+        updated using pdiffs. Returns its sha256."""
+        sha256 = _sha256(data)
+        self._write(self._index_path(sha256), data)
+        return sha256
+
+    def get_latest_index(self, unversioned_url: str) -> Optional[str]:
+        """The sha256 of the latest cached version of an index file."""
+        data = self._read(self._latest_path(unversioned_url))
+        return data.decode() if data is not None else None
+
+    def put_latest_index(self, unversioned_url: str, sha256: str) -> None:
+        self._write(self._latest_path(unversioned_url), sha256.encode())
+
+    def get_packages(
+        self, sha256: str, pool_root_url: str
+    ) -> Optional[list["Package"]]:
+        # deb is only needed once package indexes are loaded
+        from debian_packages.private.lockfile_generator.deb import Package
+
+        path = self._packages_path(sha256, pool_root_url)
+        data = self._read(path)
+        if data is None:
+            return None
+        # entries record the index file they were parsed from, so that a
+        # corrupt or mixed up entry is parsed again instead of being trusted
+        try:
+            source_sha256, packages = pickle.loads(data)
+            if source_sha256 == sha256:
+                return [Package(*p) for p in packages]
+        except Exception:
+            pass
+        logger.warning(f"Discarding corrupt cache entry: {path}")
+        path.unlink(missing_ok=True)
+        return None
+
+    def put_packages(
+        self, sha256: str, pool_root_url: str, packages: list["Package"]
+    ) -> None:
+        data = pickle.dumps(
+            (
+                sha256,
+                [(p.name, p.version, p.url, p.sha256, p.relations) for p in packages],
+            ),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        self._write(self._packages_path(sha256, pool_root_url), data)
+
+    def evict(self) -> None:
+        entries = []
+        for path in self.path.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(e[1] for e in entries)
+        # least recently used entries go first
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            logger.debug(f"Evicting cache entry: {path}")
+            path.unlink(missing_ok=True)
+            size -= entry_size
@@ -1,5 +1,10 @@
-from dataclasses import dataclass, field
+import functools
+import hashlib
+import json
+from dataclasses import dataclass, field, fields
 from enum import Enum
+from pathlib import Path
+from typing import Optional, Union
 
 from dataclass_wizard import JSONSerializable, JSONFileWizard, YAMLWizard
 
@@ -59,6 +64,18 @@ class SnapshotsConfig(YAMLWizard):
     security: str
 
 
+@dataclass
+class LockfileConfig(YAMLWizard):
+    """A lockfile to generate in a batch, paths are relative to the manifest."""
+
+    snapshots_file: str
+    packages_file: str
+    lock_file: str
+    mirror: str = "https://snapshot.debian.org"
+    shard: bool = False
+    provenance: bool = False
+
+
 @dataclass
 class Package:
     name: str
@@ -73,8 +90,232 @@ class Debfile:
     sha256: str
 
 
+# Marks the optional fields of a lockfile, which are left out while empty so
+# that lockfiles not using them keep their schema.
+_OMIT_IF_EMPTY = {"omit_if_empty": True}
+
+
 @dataclass
 class Lockfile(JSONSerializable, JSONFileWizard):
     snapshots: SnapshotsConfig
     packages: dict[Distro, dict[Arch, list[Package]]]
     files: dict[Distro, dict[Arch, list[Debfile]]]
+    # digest of the resolution inputs of each requested package, used to only
+    # re-resolve changed packages when regenerating incrementally
+    inputs: dict[Distro, dict[Arch, dict[str, str]]] = field(
+        default_factory=dict, metadata=_OMIT_IF_EMPTY
+    )
+    # sha256 of the main, updates and security index file of each distro and
+    # arch, used to keep resolutions across snapshots not changing them
+    indexes: dict[Distro, dict[Arch, list[Optional[str]]]] = field(
+        default_factory=dict, metadata=_OMIT_IF_EMPTY
+    )
+    # dependency chain from each requested package to each of its dependencies,
+    # only recorded on request
+    provenance: dict[Distro, dict[Arch, dict[str, dict[str, list[str]]]]] = field(
+        default_factory=dict, metadata=_OMIT_IF_EMPTY
+    )
+
+    def to_dict(self, *args, **kwargs) -> dict:
+        data = super().to_dict(*args, **kwargs)
+        for name in _get_omitted_if_empty(type(self)):
+            if not data.get(name):
+                data.pop(name, None)
+        return data
+
+    def to_json_file(
+        self,
+        file: Union[str, Path],
+        shard: bool = False,
+        indent: Optional[int] = None,
+        sort_keys: bool = False,
+    ) -> None:
+        """Write the lockfile, optionally sharded.
+
+        A sharded lockfile is a manifest holding the snapshots and the path and
+        sha256 of one shard per distro and arch, written next to it. Shards
+        that did not change are not rewritten.
+
+        The output is the same as json.dump of `to_dict()`, but is written
+        straight from the dataclasses.
+        """
+        # the lockfile may be a symlink into the workspace, e.g. from runfiles
+        path = Path(file).resolve()
+        previous_shards = _get_shard_paths(path)
+        if not shard:
+            for shard_path in previous_shards:
+                shard_path.unlink(missing_ok=True)
+            with open(file, "w") as f:
+                f.writelines(_encode_json(self, indent, sort_keys))
+            return
+
+        shards: dict[str, dict[str, dict[str, str]]] = {}
+        for distro, archs in self.packages.items():
+            for arch, packages in archs.items():
+                shard_name = f"{path.stem}.{distro}.{arch}{path.suffix}"
+                shard_path = path.with_name(shard_name)
+                shard_data = {
+                    "packages": packages,
+                    "files": self.files.get(distro, {}).get(arch, []),
+                }
+                for name in _get_omitted_if_empty(type(self)):
+                    value = getattr(self, name).get(distro, {}).get(arch)
+                    if value:
+                        shard_data[name] = value
+                shard_content = "".join(
+                    _encode_json(shard_data, indent, sort_keys)
+                ).encode()
+                _write_if_changed(shard_path, shard_content)
+                previous_shards.discard(shard_path)
+                shards.setdefault(str(distro), {})[str(arch)] = {
+                    "path": shard_path.name,
+                    "sha256": hashlib.sha256(shard_content).hexdigest(),
+                }
+
+        for shard_path in previous_shards:
+            shard_path.unlink(missing_ok=True)
+
+        manifest = {"snapshots": self.snapshots, "shards": shards}
+        _write_if_changed(
+            path, "".join(_encode_json(manifest, indent, sort_keys)).encode()
+        )
+
+    @classmethod
+    def from_json_file(cls, file: Union[str, Path], **decoder_kwargs) -> "Lockfile":
+        """Read a lockfile, which may be sharded."""
+        # the shards are next to the lockfile, not next to a symlink to it
+        path = Path(file).resolve()
+        data = json.loads(path.read_text(), **decoder_kwargs)
+        if "shards" in data:
+            data = _join_shards(path, data)
+        return cls.from_dict(data)
+
+
+@functools.cache
+def _get_field_names(cls: type) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+@functools.cache
+def _get_omitted_if_empty(cls: type) -> frozenset[str]:
+    return frozenset(f.name for f in fields(cls) if f.metadata == _OMIT_IF_EMPTY)
+
+
+def _newlines(indent: Optional[int], level: int) -> tuple[str, str]:
+    """The line breaks before the items and before the end of a container."""
+    if indent is None:
+        return "", ""
+    return "\n" + " " * (indent * (level + 1)), "\n" + " " * (indent * level)
+
+
+def _encode_json(
+    value: object, indent: Optional[int] = None, sort_keys: bool = False
+) -> list[str]:
+    """Encode dataclasses, dicts, lists, enums and scalars to chunks of JSON.
+
+    Gives the same output as json.dumps of the dict of the dataclasses, without
+    building that dict first.
+    """
+    chunks: list[str] = []
+    append = chunks.append
+    encode_str = json.encoder.encode_basestring_ascii
+    item_separator = ", " if indent is None else ","
+
+    def encode(value: object, level: int) -> None:
+        if isinstance(value, str):
+            append(encode_str(value))
+            return
+        if isinstance(value, Enum):
+            encode(value.value, level)
+            return
+        if value is None or isinstance(value, (bool, int, float)):
+            append(json.dumps(value))
+            return
+
+        if isinstance(value, list):
+            if not value:
+                append("[]")
+                return
+            newline, closing = _newlines(indent, level)
+            separator = item_separator + newline
+            append("[" + newline)
+            if all(type(item) is str for item in value):
+                append(separator.join(map(encode_str, value)))
+            else:
+                for i, item in enumerate(value):
+                    if i:
+                        append(separator)
+                    encode(item, level + 1)
+            append(closing + "]")
+            return
+
+        if isinstance(value, dict):
+            items = [
+                (str(k.value) if isinstance(k, Enum) else str(k), v)
+                for k, v in value.items()
+            ]
+        elif hasattr(type(value), "__dataclass_fields__"):
+            omitted = _get_omitted_if_empty(type(value))
+            items = [
+                (n, getattr(value, n))
+                for n in _get_field_names(type(value))
+                if n not in omitted or getattr(value, n)
+            ]
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not supported")
+        if not items:
+            append("{}")
+            return
+        if sort_keys:
+            items.sort(key=lambda item: item[0])
+        newline, closing = _newlines(indent, level)
+        separator = item_separator + newline
+        append("{" + newline)
+        for i, (k, v) in enumerate(items):
+            if i:
+                append(separator)
+            append(encode_str(k) + ": ")
+            encode(v, level + 1)
+        append(closing + "}")
+
+    encode(value, 0)
+    return chunks
+
+
+def _write_if_changed(path: Path, content: bytes) -> None:
+    # keeps the modification time of unchanged files
+    if not path.exists() or path.read_bytes() != content:
+        path.write_bytes(content)
+
+
+def _get_shard_paths(path: Path) -> set[Path]:
+    """The paths of the shards of an existing sharded lockfile."""
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return set()
+    if not isinstance(data, dict):
+        return set()
+    return {
+        path.with_name(shard["path"])
+        for archs in data.get("shards", {}).values()
+        for shard in archs.values()
+    }
+
+
+def _join_shards(path: Path, manifest: dict) -> dict:
+    data: dict = {
+        "snapshots": manifest["snapshots"],
+        "packages": {},
+        "files": {},
+        "inputs": {},
+        "indexes": {},
+        "provenance": {},
+    }
+    for distro, archs in manifest["shards"].items():
+        for arch, shard in archs.items():
+            content = json.loads(path.with_name(shard["path"]).read_text())
+            for key in ("packages", "files", "inputs", "indexes", "provenance"):
+                if key in content:
+                    data[key].setdefault(distro, {})[arch] = content[key]
+    return data
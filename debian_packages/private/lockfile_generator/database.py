@@ -0,0 +1,366 @@
+import json
+import logging
+import sqlite3
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from debian_packages.private.lockfile_generator import timings
+from debian_packages.private.lockfile_generator.config import (
+    Arch,
+    Distro,
+    PackagesConfig,
+)
+from debian_packages.private.lockfile_generator.deb import (
+    PackageIndexGroup,
+    PackageNotFound,
+)
+from debian_packages.private.lockfile_generator.graph import NO_GROUP
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the schema changes, databases of other versions are recreated.
+_SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE groups (
+    id INTEGER PRIMARY KEY,
+    distro TEXT NOT NULL,
+    arch TEXT NOT NULL,
+    snapshots TEXT NOT NULL,
+    UNIQUE (distro, arch)
+);
+CREATE TABLE packages (
+    group_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT,
+    url TEXT,
+    sha256 TEXT,
+    PRIMARY KEY (group_id, id)
+);
+CREATE UNIQUE INDEX packages_name ON packages (group_id, name);
+CREATE TABLE edges (
+    group_id INTEGER NOT NULL,
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    alternatives TEXT
+);
+CREATE INDEX edges_source ON edges (group_id, source);
+CREATE INDEX edges_target ON edges (group_id, target);
+CREATE TABLE requested (
+    group_id INTEGER NOT NULL,
+    config INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    exclude_packages TEXT NOT NULL,
+    PRIMARY KEY (group_id, config, name)
+);
+"""
+
+
+class DatabaseError(Exception):
+    def __init__(self, path: Path, message: str):
+        self.path = path
+        super().__init__(f"{path}: {message}")
+
+
+class PackageDatabase:
+    """An SQLite database of the packages and dependencies of package indexes.
+
+    Holds one PackageIndexGroup per distro and arch: the packages chosen from
+    its indexes, the dependency edges within the closures of the requested
+    packages and the packages requested from it by every packages config.
+    Queries only touch the rows they need, so they neither download nor parse
+    any index file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != _SCHEMA_VERSION:
+            self._create()
+
+    def _create(self) -> None:
+        tables = [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        ]
+        with self._connection:
+            for table in tables:
+                self._connection.execute(f"DROP TABLE {table}")
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def add_group(
+        self, group: PackageIndexGroup, packages_config: PackagesConfig
+    ) -> None:
+        """Replace the rows of the distro and arch of a loaded group.
+
+        Requested packages are recorded per packages config, by its position.
+        """
+        graph = group.graph
+        packages = []
+        edges = []
+        with timings.span("write_database", group=str(group)) as args:
+            requested = []
+            roots = []
+            for config, pc in enumerate(packages_config):
+                if group.distro in pc.distros and group.arch in pc.archs:
+                    exclude_packages = json.dumps(pc.exclude_packages)
+                    # a package listed twice is requested once
+                    for package_name in dict.fromkeys(pc.packages):
+                        requested.append((config, package_name, exclude_packages))
+                        node = graph.get_id(package_name)
+                        if node is not None:
+                            roots.append(node)
+
+            # only the closures of the requested packages are expanded, which
+            # adds the nodes of their dependencies
+            closures: set[int] = set()
+            for root in roots:
+                if root not in closures:
+                    closures |= graph.reachable(root, exclude=closures)
+            for node in sorted(closures):
+                for target, alternatives in graph.edges(node):
+                    if alternatives != NO_GROUP:
+                        names = graph.get_group(alternatives)
+                        alternatives = " | ".join(graph.get_name(n) for n in names)
+                    else:
+                        alternatives = None
+                    edges.append((node, target, alternatives))
+
+            for node in range(len(graph)):
+                package = graph.get_value(node)
+                packages.append(
+                    (node, graph.get_name(node))
+                    + (
+                        (package.version, package.url, package.sha256)
+                        if package is not None
+                        else (None, None, None)
+                    )
+                )
+
+            snapshots = json.dumps(
+                {"main": group.snapshots.main, "security": group.snapshots.security}
+            )
+            with self._connection:
+                group_id = self._replace_group(
+                    str(group.distro), str(group.arch), snapshots
+                )
+                self._connection.executemany(
+                    "INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?)",
+                    ((group_id, *p) for p in packages),
+                )
+                self._connection.executemany(
+                    "INSERT INTO edges VALUES (?, ?, ?, ?)",
+                    ((group_id, *e) for e in edges),
+                )
+                self._connection.executemany(
+                    "INSERT INTO requested VALUES (?, ?, ?, ?)",
+                    ((group_id, *r) for r in requested),
+                )
+            args["packages"] = len(packages)
+            args["edges"] = len(edges)
+
+    def _replace_group(self, distro: str, arch: str, snapshots: str) -> int:
+        row = self._connection.execute(
+            "SELECT id FROM groups WHERE distro = ? AND arch = ?", (distro, arch)
+        ).fetchone()
+        if row is not None:
+            for table in ("packages", "edges", "requested"):
+                self._connection.execute(
+                    f"DELETE FROM {table} WHERE group_id = ?", (row[0],)
+                )
+            self._connection.execute(
+                "UPDATE groups SET snapshots = ? WHERE id = ?", (snapshots, row[0])
+            )
+            return row[0]
+        return self._connection.execute(
+            "INSERT INTO groups (distro, arch, snapshots) VALUES (?, ?, ?)",
+            (distro, arch, snapshots),
+        ).lastrowid
+
+    def groups(self) -> list[tuple[str, str]]:
+        return self._connection.execute(
+            "SELECT distro, arch FROM groups ORDER BY distro, arch"
+        ).fetchall()
+
+    def query(
+        self, distro: Optional[Distro] = None, arch: Optional[Arch] = None
+    ) -> "GroupQuery":
+        """Query the packages of a distro and arch.
+
+        Both can be left out if the database only holds a single one.
+        """
+        rows = [
+            (d, a)
+            for d, a in self.groups()
+            if (distro is None or d == str(distro)) and (arch is None or a == str(arch))
+        ]
+        if len(rows) != 1:
+            available = ", ".join(f"{d}/{a}" for d, a in self.groups())
+            raise DatabaseError(
+                self.path,
+                f"expected a single distro/arch to match distro={distro} "
+                f"arch={arch}, found {len(rows)} of: {available or 'none'}",
+            )
+        (group_id,) = self._connection.execute(
+            "SELECT id FROM groups WHERE distro = ? AND arch = ?", rows[0]
+        ).fetchone()
+        return GroupQuery(self._connection, group_id)
+
+
+class GroupQuery:
+    """Queries of the packages of a single distro and arch."""
+
+    def __init__(self, connection: sqlite3.Connection, group_id: int):
+        self._connection = connection
+        self._group_id = group_id
+
+    def _find_id(self, package_name: str) -> Optional[int]:
+        row = self._connection.execute(
+            "SELECT id FROM packages WHERE group_id = ? AND name = ?",
+            (self._group_id, package_name),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _get_id(self, package_name: str) -> int:
+        node = self._find_id(package_name)
+        if node is None:
+            raise PackageNotFound(package_name)
+        return node
+
+    def _get_name(self, node: int) -> str:
+        return self._connection.execute(
+            "SELECT name FROM packages WHERE group_id = ? AND id = ?",
+            (self._group_id, node),
+        ).fetchone()[0]
+
+    def _packages(self, nodes: Iterable[int]) -> list[tuple[str, Optional[str]]]:
+        """The name and version of nodes, sorted by name."""
+        return sorted(
+            self._connection.execute(
+                "SELECT name, version FROM packages WHERE group_id = ? AND id = ?",
+                (self._group_id, node),
+            ).fetchone()
+            for node in nodes
+        )
+
+    def _successors(self, node: int) -> list[int]:
+        return [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT target FROM edges WHERE group_id = ? AND source = ?",
+                (self._group_id, node),
+            )
+        ]
+
+    def _predecessors(self, node: int) -> list[int]:
+        return [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT source FROM edges WHERE group_id = ? AND target = ?",
+                (self._group_id, node),
+            )
+        ]
+
+    @staticmethod
+    def _reachable(
+        root: int,
+        neighbors: Callable[[int], list[int]],
+        exclude: Optional[set[int]] = None,
+    ) -> dict[int, Optional[int]]:
+        """Breadth-first search, returning the BFS-tree (node -> parent)."""
+        exclude = exclude or set()
+        parents: dict[int, Optional[int]] = {root: None}
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for neighbor in neighbors(node):
+                if neighbor not in parents and neighbor not in exclude:
+                    parents[neighbor] = node
+                    queue.append(neighbor)
+        return parents
+
+    def search(self, pattern: str) -> list[tuple[str, Optional[str]]]:
+        """Packages whose name matches a glob pattern, or contains it."""
+        if not any(c in pattern for c in "*?["):
+            pattern = f"*{pattern}*"
+        return self._connection.execute(
+            "SELECT name, version FROM packages WHERE group_id = ? AND name GLOB ? "
+            "ORDER BY name",
+            (self._group_id, pattern),
+        ).fetchall()
+
+    def depends(
+        self, package_name: str, closure: bool = False
+    ) -> list[tuple[str, Optional[str]]]:
+        """The dependencies of a package, following all alternatives."""
+        node = self._get_id(package_name)
+        if closure:
+            nodes = set(self._reachable(node, self._successors)) - {node}
+        else:
+            nodes = set(self._successors(node))
+        return self._packages(nodes)
+
+    def rdepends(
+        self, package_name: str, closure: bool = False
+    ) -> list[tuple[str, Optional[str]]]:
+        """The packages depending on a package."""
+        node = self._get_id(package_name)
+        if closure:
+            nodes = set(self._reachable(node, self._predecessors)) - {node}
+        else:
+            nodes = set(self._predecessors(node))
+        return self._packages(nodes)
+
+    def requested(self) -> list[tuple[int, str, list[str]]]:
+        """The packages config, name and excluded packages of requested packages.
+
+        A package requested by several packages configs is listed once for each.
+        """
+        return [
+            (config, name, json.loads(exclude_packages))
+            for config, name, exclude_packages in self._connection.execute(
+                "SELECT config, name, exclude_packages FROM requested "
+                "WHERE group_id = ? ORDER BY name, config",
+                (self._group_id,),
+            )
+        ]
+
+    def why(
+        self, package_name: str, roots: Optional[list[str]] = None
+    ) -> list[list[str]]:
+        """The shortest dependency path to a package from every root reaching it.
+
+        Roots default to the requested packages. The packages a packages config
+        excludes are not traversed from the packages it requests, a root
+        requested by several configs may have a path for each.
+        """
+        target = self._get_id(package_name)
+        requested: dict[str, list[list[str]]] = {}
+        for _, name, exclude_packages in self.requested():
+            requested.setdefault(name, []).append(exclude_packages)
+
+        paths = []
+        for root_name in roots or list(requested):
+            root = self._get_id(root_name)
+            # roots not requested by any config exclude nothing
+            for exclude_packages in requested.get(root_name, [[]]):
+                exclude = {self._find_id(name) for name in exclude_packages}
+                parents = self._reachable(root, self._successors, exclude)
+                if target not in parents:
+                    continue
+                path = [target]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                path = [self._get_name(node) for node in reversed(path)]
+                if path not in paths:
+                    paths.append(path)
+        return paths
@@ -1,18 +1,28 @@
 from __future__ import annotations
 import logging
 import lzma
+import re
+import sys
+import time
 from dataclasses import dataclass, field
-from typing import Optional, Union
+from typing import Iterable, Iterator, Optional, Union
 
-import requests
-import networkx
-from debian import deb822, debian_support
+from debian import debian_support
 
+from debian_packages.private.lockfile_generator import timings
 from debian_packages.private.lockfile_generator.config import (
     Arch,
     Distro,
     SnapshotsConfig,
 )
+from debian_packages.private.lockfile_generator.download import (
+    Downloader,
+    prefetch,
+)
+from debian_packages.private.lockfile_generator.graph import (
+    NO_GROUP,
+    DependencyGraph,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -75,60 +85,172 @@ class DependencyNotFound(PackageNotFound):
         )
 
 
-@dataclass
+# Mirrors the relation syntax accepted by debian.deb822.PkgRelation.
+_RELATION_RE = re.compile(
+    r"^\s*(?P<name>[a-zA-Z0-9][a-zA-Z0-9.+\-]*)"
+    r"(:(?P<archqual>([a-zA-Z0-9][a-zA-Z0-9-]*)))?"
+    r"(\s*\(\s*(?P<relop>[>=<]+)\s*"
+    r"(?P<version>[0-9a-zA-Z:\-+~.]+)\s*\))?"
+    r"(\s*\[(?P<archs>[\s!\w\-]+)\])?\s*"
+    r"((?P<restrictions><.+>))?\s*"
+    r"$"
+)
+_RELATION_COMMA_SEP_RE = re.compile(r"\s*,\s*")
+_RELATION_PIPE_SEP_RE = re.compile(r"\s*\|\s*")
+
+# Only the fields required to build a Package are extracted from an index.
+_STANZA_FIELDS_RE = re.compile(
+    rb"^(Package|Version|Filename|SHA256|Depends|Pre-Depends|Provides):"
+    rb"(.*(?:\n[ \t].*)*)",
+    re.MULTILINE,
+)
+
+
+def _parse_relation(raw: str) -> tuple[str, Optional[str]]:
+    match = _RELATION_RE.match(raw)
+    if not match:
+        logger.warning(f"cannot parse package relationship '{raw}', using it raw")
+        return raw, None
+    return match["name"], match["version"]
+
+
+def parse_relations(raw: str) -> list[list[tuple[str, Optional[str]]]]:
+    return [
+        [_parse_relation(r) for r in _RELATION_PIPE_SEP_RE.split(alternatives)]
+        for alternatives in _RELATION_COMMA_SEP_RE.split(raw.strip())
+    ]
+
+
+# Hundreds of thousands of packages are held in memory for large multi-arch
+# runs, so they use slots instead of a __dict__ each.
+@dataclass(slots=True)
 class Package:
     name: str
     version: str
     url: str
     sha256: str
-    dependencies: frozenset[Union[str, frozenset[str]]] = field(
-        default_factory=frozenset, repr=False
+    relations: Optional[str] = field(default=None, repr=False)
+    _dependencies: Optional[tuple[Union[str, tuple[str, ...]], ...]] = field(
+        init=False, default=None, repr=False, compare=False
     )
 
     def __str__(self) -> str:
         return f"<{self.__class__.__name__} name={self.name} version={self.version}>"
 
+    @property
+    def dependencies(self) -> tuple[Union[str, tuple[str, ...]], ...]:
+        if self._dependencies is None:
+            dependencies = []
+            for r in parse_relations(self.relations) if self.relations else ():
+                if len(r) == 1:
+                    dependencies.append(r[0][0])
+                else:
+                    dependencies.append(tuple(name for name, _ in r))
+            self._dependencies = tuple(dict.fromkeys(dependencies))
+        return self._dependencies
+
+    def intern(self) -> None:
+        """Share the strings this package has in common with other indexes.
+
+        Names, versions and relations are mostly the same for all archs, the
+        url and sha256 only for packages of Architecture: all.
+        """
+        self.name = sys.intern(self.name)
+        if self.version is not None:
+            self.version = sys.intern(self.version)
+        if self.relations is not None:
+            self.relations = sys.intern(self.relations)
+        if self.url.endswith("_all.deb"):
+            self.url = sys.intern(self.url)
+            self.sha256 = sys.intern(self.sha256)
+
     @staticmethod
-    def from_deb822(
-        pool_root_url: str, package: deb822.Package
-    ) -> Package | list[Package]:
-        virtual_packages = []
-        dependencies = []
-        relations = package.relations["depends"] + package.relations["pre-depends"]
-        for r in relations:
-            if len(r) == 1:
-                dependencies.append(r[0]["name"])
-            else:
-                dependencies.append(frozenset([d["name"] for d in r]))
-
-        _package = Package(
-            name=package["Package"],
-            version=package["Version"],
-            url=pool_root_url + package["Filename"],
-            sha256=package["SHA256"],
-            dependencies=frozenset(dependencies),
+    def from_stanza(pool_root_url: str, stanza: dict[bytes, bytes]) -> list[Package]:
+        relations = [
+            stanza[f].decode() for f in (b"Depends", b"Pre-Depends") if f in stanza
+        ]
+        package = Package(
+            name=stanza[b"Package"].decode(),
+            version=stanza[b"Version"].decode(),
+            url=pool_root_url + stanza[b"Filename"].decode(),
+            sha256=stanza[b"SHA256"].decode(),
+            relations=", ".join(relations) or None,
         )
-
-        provides = package.relations["provides"]
-        for p in provides:
-            version = p[0]["version"]
-            if version and len(version) == 2:
-                version = version[1]
-            elif version:
-                logger.warning(f"BUG dont know how to handle version '{version}'")
-
-            virtual_package = Package(
-                name=p[0]["name"],
-                version=version or None,
-                url=_package.url,
-                sha256=_package.sha256,
-            )
-            virtual_packages.append(virtual_package)
-
-        if virtual_packages:
-            return [_package] + virtual_packages
-
-        return _package
+        packages = [package]
+
+        if b"Provides" in stanza:
+            for p in parse_relations(stanza[b"Provides"].decode()):
+                name, version = p[0]
+                virtual_package = Package(
+                    name=name,
+                    version=version,
+                    url=package.url,
+                    sha256=package.sha256,
+                )
+                packages.append(virtual_package)
+
+        return packages
+
+
+def iter_stanzas(chunks: Iterable[bytes]) -> Iterator[dict[bytes, bytes]]:
+    remainder = b""
+    for chunk in chunks:
+        stanzas = (remainder + chunk).split(b"\n\n")
+        remainder = stanzas.pop()
+        yield from _parse_stanzas(stanzas)
+    yield from _parse_stanzas([remainder])
+
+
+def _parse_stanzas(stanzas: list[bytes]) -> Iterator[dict[bytes, bytes]]:
+    for stanza in stanzas:
+        fields = {k: v.strip() for k, v in _STANZA_FIELDS_RE.findall(stanza)}
+        if fields:
+            yield fields
+
+
+def _decompress_xz(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    for chunk in chunks:
+        while chunk:
+            if decompressor.eof:
+                # concatenated streams, like lzma.open supports them
+                decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+            start = time.perf_counter()
+            data = decompressor.decompress(chunk)
+            timings.count("xz_seconds", time.perf_counter() - start)
+            yield data
+            chunk = decompressor.unused_data
+    if not decompressor.eof:
+        raise EOFError("Compressed file ended before the end-of-stream marker")
+
+
+def _split(data: bytes, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        yield view[i : i + chunk_size]
+
+
+def parse_package_index(
+    pool_root_url: str,
+    data: Union[bytes, Iterable[bytes]],
+    compressed: bool = True,
+) -> list[Package]:
+    """Parse an xz compressed (or uncompressed) index file.
+
+    The index can be given as bytes or as an iterable of chunks, e.g. while it
+    is being downloaded. Only one chunk is decompressed at a time.
+    """
+    if isinstance(data, bytes):
+        data = _split(data)
+    if compressed:
+        data = _decompress_xz(data)
+    packages = []
+    stanzas = 0
+    for stanza in iter_stanzas(data):
+        packages.extend(Package.from_stanza(pool_root_url, stanza))
+        stanzas += 1
+    timings.count("stanzas_parsed", stanzas)
+    return packages
 
 
 @dataclass
@@ -138,30 +260,86 @@ class PackageIndex:
     arch: Arch
     distro: Distro
     pool_root_url: str
+    dist_path: str
     index_file_path: str
-    _packages: list[Package] = field(init=False, default_factory=list)
 
     @property
     def index_file_url(self) -> str:
-        return self.pool_root_url + self.index_file_path
+        return f"{self.pool_root_url}{self.dist_path}/{self.index_file_path}"
+
+    @property
+    def release_file_url(self) -> str:
+        return f"{self.pool_root_url}{self.dist_path}/Release"
+
+    @property
+    def uncompressed_index_file_path(self) -> str:
+        return self.index_file_path.removesuffix(".xz")
 
-    def __post_init__(self) -> None:
+    @property
+    def diff_index_url(self) -> str:
+        """The url of the pdiffs index of the (uncompressed) index file."""
+        path = f"{self.dist_path}/{self.uncompressed_index_file_path}.diff/Index"
+        return f"{self.pool_root_url}{path}"
+
+    @property
+    def unversioned_index_file_url(self) -> str:
+        """The url of the index file without the snapshot, i.e. the same for all
+        snapshots."""
+        return self.index_file_url.replace(f"/{self.snapshot}/", "/", 1)
+
+    def fetch(self, downloader: Downloader) -> Iterator[bytes]:
         logger.debug(f"{self}: fetching index file ...")
-        response = requests.get(url=self.index_file_url, stream=True)
+        yield from downloader.iter_content(self.index_file_url)
+        logger.debug(f"{self}: fetching index file ... done")
+
+    def fetch_release(self, downloader: Downloader) -> bytes:
+        logger.debug(f"{self}: fetching release file ...")
+        return downloader.fetch(self.release_file_url)
+
+    def get_release_sha256(
+        self, release: bytes, path: Optional[str] = None
+    ) -> Optional[str]:
+        """The sha256 of the index file, or of `path`, listed in the release file."""
+        # deb822 is slow to import and only needed here
+        from debian import deb822
+
+        path = path or self.index_file_path
+        for entry in deb822.Release(release).get("SHA256", []):
+            if entry["name"] == path:
+                return entry["sha256"]
+        return None
+
+    def load(self, downloader: Optional[Downloader] = None) -> list[Package]:
+        """Download and parse the index file."""
+        chunks = prefetch(self.fetch(downloader or Downloader()))
         logger.debug(f"{self}: loading index file ...")
-        with lzma.open(response.raw) as f:
-            for p in deb822.Packages.iter_paragraphs(f, use_apt_pkg=False):
-                package = Package.from_deb822(self.pool_root_url, p)
-                if isinstance(package, Package):
-                    self._packages.append(package)
-                else:
-                    self._packages.extend(package)
+        packages = parse_package_index(self.pool_root_url, chunks)
         logger.debug(f"{self}: loading index file ... done")
+        return packages
 
     def __str__(self) -> str:
         return f"<{self.__class__.__name__} name={self.name} distro={self.distro!s} arch={self.arch!s} snapshot={self.snapshot!s}>"
 
 
+@dataclass
+class SharedResolutions:
+    """The resolutions of a packages config in one group, to share with others.
+
+    A package resolves to the same dependencies in the group of another arch if
+    every package of its closure, before excluding any, is the same in both:
+    the edges, exclusions and alternatives within the closure are then the same
+    as well. That is the case for closures of Architecture: all packages only,
+    e.g. the one of tzdata.
+    """
+
+    group: Optional[PackageIndexGroup] = None
+    closures: dict[str, set[int]] = field(default_factory=dict)
+    resolved: dict[str, tuple[Package, tuple[Package, ...]]] = field(
+        default_factory=dict
+    )
+    provenance: dict[str, dict[str, list[str]]] = field(default_factory=dict)
+
+
 @dataclass
 class PackageIndexGroup:
     snapshots: SnapshotsConfig
@@ -171,49 +349,94 @@ class PackageIndexGroup:
     main: PackageIndex = field(init=False)
     updates: PackageIndex = field(init=False)
     security: PackageIndex = field(init=False)
-    _packages: networkx.DiGraph = field(init=False, default_factory=networkx.DiGraph)
+    _packages: Optional[DependencyGraph[Package]] = field(
+        init=False, default=None, repr=False
+    )
+    # the graph the indexes are merged into while they are loaded
+    _merging: Optional[DependencyGraph[Package]] = field(
+        init=False, default=None, repr=False
+    )
+    _merged: int = field(init=False, default=0, repr=False)
+    # indexes loaded before an earlier index, waiting to be merged
+    _pending: dict[int, list[Package]] = field(
+        init=False, default_factory=dict, repr=False
+    )
 
     def __post_init__(self):
         self.main = self._main_package_index()
         self.updates = self._updates_package_index()
         self.security = self._security_package_index()
-        self._initialize_graph()
-
-    def _initialize_graph(self) -> None:
-        packages = {}
-        for index in self.main, self.updates, self.security:
-            for package in index._packages:
-                if package.name in packages:
-                    previous_package = packages[package.name]
-                    if (
-                        debian_support.version_compare(
-                            previous_package.version, package.version
-                        )
-                        != -1
-                    ):
-                        # previous_package is at least as recenv as package
-                        continue
-                packages[package.name] = package
-
-        for package in packages.values():
-            self._packages.add_node(package.name, package=package)
-            for d in package.dependencies:
-                if isinstance(d, frozenset):
-                    for a in d:
-                        self._packages.add_edge(package.name, a, alternatives=d)
-                else:
-                    self._packages.add_edge(package.name, d)
+
+    @property
+    def indexes(self) -> tuple[PackageIndex, PackageIndex, PackageIndex]:
+        return self.main, self.updates, self.security
+
+    @property
+    def loaded(self) -> bool:
+        return self._packages is not None
+
+    def add_packages(self, index: PackageIndex, packages: Iterable[Package]) -> None:
+        """Merge the packages of one of the indexes into the graph.
+
+        Every index is merged as soon as it is loaded, keeping only the most
+        recent version of every package, so the packages shadowed by another
+        index are not held on to. Indexes are merged in order, one loaded
+        before an earlier index waits for it.
+        """
+        position = next(i for i, x in enumerate(self.indexes) if x is index)
+        self._pending[position] = packages
+        while self._merged in self._pending:
+            with timings.span("build_graph", index=str(self.indexes[self._merged])):
+                self._merge(self._pending.pop(self._merged))
+            self._merged += 1
+
+    def _merge(self, packages: Iterable[Package]) -> None:
+        if self._merging is None:
+            # Dependencies are only parsed and added as edges once a package is
+            # reached while resolving, most packages of an index never are.
+            self._merging = DependencyGraph(lambda package: package.dependencies)
+        graph = self._merging
+        for package in packages:
+            node = graph.get_id(package.name)
+            if node is not None:
+                previous_package = graph.get_value(node)
+                if previous_package.version == package.version or (
+                    debian_support.version_compare(
+                        previous_package.version, package.version
+                    )
+                    != -1
+                ):
+                    # previous_package is at least as recent as package
+                    continue
+            package.intern()
+            graph.add_node(package.name, package)
+
+    def load(self, downloader: Optional[Downloader] = None) -> None:
+        """Load the indexes not added yet and complete the graph."""
+        if self.loaded:
+            return
+        for position, index in enumerate(self.indexes):
+            if position >= self._merged and position not in self._pending:
+                self.add_packages(index, index.load(downloader))
+        self._packages, self._merging = self._merging, None
+
+    @property
+    def graph(self) -> DependencyGraph[Package]:
+        return self._packages
 
     def _get_package(self, package_name: str) -> Package:
-        try:
-            return self._packages.nodes[package_name]["package"]
-        except KeyError:
+        node = self._packages.get_id(package_name)
+        package = None if node is None else self._packages.get_value(node)
+        if package is None:
             raise PackageNotFound(package_name)
+        return package
 
     def _has_package(self, package_name: str) -> bool:
-        return (package_name in self._packages.nodes) and (
-            "package" in self._packages.nodes[package_name]
-        )
+        node = self._packages.get_id(package_name)
+        return node is not None and self._packages.get_value(node) is not None
+
+    def __str__(self) -> str:
+        return f"<{self.__class__.__name__} distro={self.distro!s} arch={self.arch!s}>"
 
     @property
     def debian_arch(self) -> str:
@@ -238,7 +461,8 @@ class PackageIndexGroup:
             arch=self.arch,
             distro=self.distro,
             pool_root_url=self._pool_root_url(snapshot),
-            index_file_path=f"dists/{self.debian_distro}/main/binary-{self.debian_arch}/Packages.xz",
+            dist_path=f"dists/{self.debian_distro}",
+            index_file_path=f"main/binary-{self.debian_arch}/Packages.xz",
         )
 
     def _updates_package_index(self) -> PackageIndex:
@@ -249,7 +473,8 @@ class PackageIndexGroup:
             arch=self.arch,
             distro=self.distro,
             pool_root_url=self._pool_root_url(snapshot),
-            index_file_path=f"dists/{self.debian_distro}-updates/main/binary-{self.debian_arch}/Packages.xz",
+            dist_path=f"dists/{self.debian_distro}-updates",
+            index_file_path=f"main/binary-{self.debian_arch}/Packages.xz",
         )
 
     def _security_package_index(self) -> PackageIndex:
@@ -260,20 +485,20 @@ class PackageIndexGroup:
 
     def _security_package_index_debian(self) -> PackageIndex:
         snapshot = self.snapshots.security
-        index_file_path = f"dists/{self.debian_distro}"
+        dist_path = f"dists/{self.debian_distro}"
         # NOTE the url changed after debian10
         if self.distro in (Distro.DEBIAN8, Distro.DEBIAN9, Distro.DEBIAN10):
-            index_file_path += "/updates"
+            dist_path += "/updates"
         else:
-            index_file_path += "-security"
-        index_file_path += f"/main/binary-{self.debian_arch}/Packages.xz"
+            dist_path += "-security"
         return PackageIndex(
             name="security",
             snapshot=snapshot,
             arch=self.arch,
             distro=self.distro,
             pool_root_url=f"{self.mirror}/archive/debian-security/{snapshot}/",
-            index_file_path=index_file_path,
+            dist_path=dist_path,
+            index_file_path=f"main/binary-{self.debian_arch}/Packages.xz",
         )
 
     def _security_package_index_ubuntu(self) -> PackageIndex:
@@ -284,7 +509,8 @@ class PackageIndexGroup:
             arch=self.arch,
             distro=self.distro,
             pool_root_url=self._pool_root_url(snapshot),
-            index_file_path=f"dists/{self.debian_distro}-security/main/binary-{self.debian_arch}/Packages.xz",
+            dist_path=f"dists/{self.debian_distro}-security",
+            index_file_path=f"main/binary-{self.debian_arch}/Packages.xz",
         )
 
     def resolve_package(
@@ -292,64 +518,181 @@ class PackageIndexGroup:
         package_name: str,
         exclude_packages: list[str],
         package_priorities: list[list[str]],
-    ) -> tuple[Package, tuple[Package]]:
-        def get_dependency_graph(package_name: str) -> networkx.DiGraph:
-            descendants = networkx.descendants(self._packages, package_name)
-            package_graph = self._packages.subgraph(descendants.union({package.name}))
-            return package_graph.copy()
-
-        def remove_excluded_packages(dependency_graph: networkx.DiGraph) -> None:
-            for p in exclude_packages:
-                if p in dependency_graph.nodes:
-                    logger.debug(f"excluding package: {p}")
-                    dependency_graph.remove_node(p)
-
-        def get_package_priority(package_name) -> Optional[list[str]]:
-            for p in package_priorities:
-                if package_name in p:
-                    return p
-
-        def resolve_package_priorities(dependency_graph: networkx.DiGraph) -> None:
-            scheduled_for_removal = []
-            for _, v, data in dependency_graph.edges(data=True):
-                alternatives = data.get("alternatives")
-                if not alternatives:
-                    continue
-                priorities = get_package_priority(v)
-                order = priorities if priorities else alternatives
-                best_match_found = False
-                for p in order:
-                    if best_match_found:
-                        logger.debug(f"scheduling removal: {p}")
-                        scheduled_for_removal.append(p)
-                    elif p in dependency_graph.nodes:
-                        best_match_found = True
-            for p in scheduled_for_removal:
-                if p in dependency_graph.nodes:
-                    dependency_graph.remove_node(p)
-
-        def generate_dependencies(dependency_graph: networkx.DiGraph) -> tuple[Package]:
+    ) -> tuple[Package, tuple[Package, ...]]:
+        return self.resolve_packages(
+            package_names=[package_name],
+            exclude_packages=exclude_packages,
+            package_priorities=package_priorities,
+        )[0]
+
+    def resolve_packages(
+        self,
+        package_names: list[str],
+        exclude_packages: list[str],
+        package_priorities: list[list[str]],
+        provenance: Optional[dict[str, dict[str, list[str]]]] = None,
+        shared: Optional[SharedResolutions] = None,
+    ) -> list[tuple[Package, tuple[Package, ...]]]:
+        """Resolve the dependencies of packages.
+
+        If `provenance` is given, it is filled with the dependency chain from
+        each package to each of its dependencies, taken from the breadth-first
+        traversal resolving it.
+
+        Resolutions are recorded in `shared`, if given and empty, or else taken
+        from it if they resolve the same here.
+        """
+        graph = self._packages
+        if shared is not None and shared.group is None:
+            shared.group = self
+
+        reused = {}
+        if shared is not None and shared.group is not self:
+            reused = self._get_shared_resolutions(package_names, shared)
+            if reused:
+                logger.info(
+                    f"{self}: {len(reused)} of {len(package_names)} packages "
+                    f"resolve the same as for {shared.group}"
+                )
+                timings.count("shared_resolutions", len(reused))
+                if provenance is not None:
+                    for package_name in reused:
+                        provenance[package_name] = shared.provenance[package_name]
+
+        priority_orders: dict[int, tuple[Optional[int], ...]] = {}
+        alternative_edges: dict[int, list[tuple[int, tuple]]] = {}
+
+        def get_alternative_edges(u: int) -> list[tuple[int, tuple]]:
+            if u not in alternative_edges:
+                alternative_edges[u] = [
+                    (v, priority_orders.get(v) or graph.get_group(group))
+                    for v, group in graph.edges(u)
+                    if group != NO_GROUP
+                ]
+            return alternative_edges[u]
+
+        def resolve_package_priorities(nodes: set[int]) -> set[int]:
+            scheduled_for_removal = set()
+            for u in nodes:
+                for v, order in get_alternative_edges(u):
+                    if v not in nodes:
+                        continue
+                    best_match_found = False
+                    for p in order:
+                        if best_match_found:
+                            if p is not None:
+                                scheduled_for_removal.add(p)
+                        elif p in nodes:
+                            best_match_found = True
+            return scheduled_for_removal
+
+        def generate_dependencies(
+            package_name: str, root: int, closure: set[int], removed: set[int]
+        ) -> tuple[Package, ...]:
+            debug = logger.getEffectiveLevel() == logging.DEBUG
+            chains_required = debug or provenance is not None
+            parents = {}
+            if removed or chains_required:
+                closure = graph.reachable(root, removed, parents)
+            # the chain of a node extends the chain of its BFS parent
+            chains = {root: [graph.get_name(root)]}
+
+            def get_chain(node: int) -> list[str]:
+                path = []
+                while node not in chains:
+                    path.append(node)
+                    node = parents[node]
+                for child in reversed(path):
+                    chains[child] = chains[node] + [graph.get_name(child)]
+                    node = child
+                return chains[node]
+
             dependencies = []
-            for descendant in networkx.descendants(dependency_graph, package_name):
-                if not self._has_package(descendant):
+            package_provenance = {}
+            for descendant in closure - {root}:
+                package = graph.get_value(descendant)
+                if package is None:
                     raise DependencyNotFound(
-                        package_name=descendant, dependency_of=package_name
-                    )
-                dependencies.append(self._get_package(descendant))
-                if logger.getEffectiveLevel() == logging.DEBUG:
-                    p = networkx.shortest_path(
-                        dependency_graph, package.name, descendant
+                        package_name=graph.get_name(descendant),
+                        dependency_of=package_name,
                     )
-                    logger.debug(" -> ".join(p))
+                dependencies.append(package)
+                if chains_required:
+                    chain = get_chain(descendant)
+                    package_provenance[chain[-1]] = chain
+                    if debug:
+                        logger.debug(" -> ".join(chain))
+            if provenance is not None:
+                provenance[package_name] = package_provenance
             return tuple(dependencies)
 
         logger.debug(
-            f"{self}: resolving {package_name=} ({exclude_packages=} {package_priorities=})"
+            f"{self}: resolving {package_names=} ({exclude_packages=} {package_priorities=})"
         )
 
-        package = self._get_package(package_name)
-        dependency_graph = get_dependency_graph(package_name)
-        remove_excluded_packages(dependency_graph)
-        resolve_package_priorities(dependency_graph)
-        dependencies = generate_dependencies(dependency_graph)
-        return package, dependencies
+        with timings.span(
+            "resolve", group=str(self), requested_packages=len(package_names)
+        ) as args:
+            edges = graph.num_edges
+            closures = graph.closures(
+                graph.get_id(p)
+                for p in package_names
+                if p not in reused and self._has_package(p)
+            )
+            exclude = {graph.get_id(p) for p in exclude_packages if p in graph}
+
+            # the first priority-list naming a package wins, only packages in
+            # the closures matter and those have all been added to the graph
+            for priorities in reversed(package_priorities):
+                order = tuple(graph.get_id(p) for p in priorities)
+                for p in order:
+                    if p is not None:
+                        priority_orders[p] = order
+
+            resolved = []
+            for package_name in package_names:
+                if package_name in reused:
+                    resolved.append(reused[package_name])
+                    continue
+                logger.debug(f"{self}: resolving {package_name=}")
+                package = self._get_package(package_name)
+                root = graph.get_id(package_name)
+                closure = closures[root]
+                excluded = exclude & closure
+                for p in excluded:
+                    logger.debug(f"excluding package: {graph.get_name(p)}")
+                nodes = closure - excluded
+                removed = (excluded | resolve_package_priorities(nodes)) & closure
+                dependencies = generate_dependencies(
+                    package_name, root, closure, removed
+                )
+                resolved.append((package, dependencies))
+                if shared is not None and shared.group is self:
+                    shared.closures[package_name] = closure
+                    shared.resolved[package_name] = (package, dependencies)
+                    if provenance is not None:
+                        shared.provenance[package_name] = provenance[package_name]
+            # edges are added to the graph while resolving
+            args["edges"] = graph.num_edges - edges
+        return resolved
+
+    def _get_shared_resolutions(
+        self, package_names: list[str], shared: SharedResolutions
+    ) -> dict[str, tuple[Package, tuple[Package, ...]]]:
+        """The shared resolutions of packages whose closure is the same here."""
+        graph = self._packages
+        other = shared.group.graph
+        # the closures overlap a lot, every node is only compared once
+        different = set()
+        for node in set().union(*shared.closures.values()):
+            own = graph.get_id(other.get_name(node))
+            package = None if own is None else graph.get_value(own)
+            if package != other.get_value(node):
+                different.add(node)
+
+        return {
+            package_name: shared.resolved[package_name]
+            for package_name in package_names
+            if package_name in shared.closures
+            and shared.closures[package_name].isdisjoint(different)
+        }
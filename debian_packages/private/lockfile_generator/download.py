@@ -0,0 +1,222 @@
+import functools
+import logging
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from debian_packages.private.lockfile_generator import timings
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# Responses worth retrying, everything else is final.
+_RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@functools.cache
+def _retry_exceptions() -> tuple[type[Exception], ...]:
+    # requests is slow to import, so it is only imported once a request is made
+    import requests
+
+    return (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+
+class DownloadError(Exception):
+    def __init__(self, url: str, message: str):
+        self.url = url
+        super().__init__(f"Downloading '{url}' failed: {message}")
+
+
+class RangeNotSatisfiable(DownloadError):
+    """The offset of a range request is at or past the end of the file."""
+
+    def __init__(self, url: str, offset: int):
+        self.offset = offset
+        super().__init__(url, f"HTTP 416 for range starting at byte {offset}")
+
+
+class Downloader:
+    """Downloads files over a pool of keep-alive connections.
+
+    Requests time out after `timeout` seconds without data and are retried up to
+    `retries` times with exponential backoff. Interrupted streaming downloads
+    resume where they stopped, using a range request if the server supports it.
+
+    The underlying session is not pickled, so a Downloader can be handed to
+    worker processes, which each open their own connections.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = 10,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session: Optional["requests.Session"] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_session"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if self._session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                )
+                self._session = requests.Session()
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def _retry(self, url: str, attempt: int, reason: object) -> None:
+        if attempt >= self.retries:
+            raise DownloadError(url, f"{reason} (after {attempt} retries)")
+        delay = self.backoff * 2**attempt
+        timings.count("download_retries")
+        logger.warning(f"{url}: {reason}, retrying in {delay:.1f}s ...")
+        time.sleep(delay)
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+            except _retry_exceptions() as e:
+                self._retry(url, attempt, e)
+            else:
+                if response.status_code not in _RETRY_STATUS_CODES:
+                    return response
+                response.close()
+                self._retry(url, attempt, f"HTTP {response.status_code}")
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def fetch(self, url: str) -> bytes:
+        response = self.get(url)
+        response.raise_for_status()
+        timings.count("bytes_downloaded", len(response.content))
+        return response.content
+
+    def iter_content(
+        self, url: str, chunk_size: int = DEFAULT_CHUNK_SIZE, offset: int = 0
+    ) -> Iterator[bytes]:
+        """Stream the content of url, resuming the download on errors.
+
+        With an `offset`, only the content after the first `offset` bytes is
+        streamed, e.g. to continue a partial download. An offset at or past the
+        end of the content raises RangeNotSatisfiable.
+        """
+        import requests
+
+        attempt = 0
+        while True:
+            # ranges refer to the encoded content, so avoid any encoding
+            headers = {"Accept-Encoding": "identity"}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+            try:
+                with self.session.get(
+                    url, headers=headers, stream=True, timeout=self.timeout
+                ) as response:
+                    status_code = response.status_code
+                    if status_code in _RETRY_STATUS_CODES:
+                        raise requests.ConnectionError(f"HTTP {status_code}")
+                    if offset and status_code == 416:
+                        raise RangeNotSatisfiable(url, offset)
+                    response.raise_for_status()
+                    skip = 0
+                    if offset and status_code != 206:
+                        logger.debug(f"{url}: no range support, skipping {offset}")
+                        skip = offset
+                    for chunk in response.iter_content(chunk_size):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        offset += len(chunk)
+                        attempt = 0
+                        timings.count("bytes_downloaded", len(chunk))
+                        yield chunk
+                    if skip:
+                        raise requests.ConnectionError("response ended early")
+                logger.debug(f"{url}: downloaded {offset} bytes")
+                return
+            except _retry_exceptions() as e:
+                self._retry(url, attempt, f"{e} (at byte {offset})" if offset else e)
+                attempt += 1
+
+
+def prefetch(chunks: Iterable[bytes], max_chunks: int = 16) -> Iterator[bytes]:
+    """Iterate `chunks` from a background thread, reading at most `max_chunks`
+    ahead of the consumer. This overlaps a download with its processing while
+    keeping the memory used for buffering bounded."""
+    buffer: queue.Queue = queue.Queue(maxsize=max_chunks)
+    stopped = threading.Event()
+
+    def put(item: tuple[Optional[bytes], Optional[BaseException]]) -> None:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                put((chunk, None))
+                if stopped.is_set():
+                    return
+            put((None, None))
+        except BaseException as e:
+            put((None, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk, error = buffer.get()
+            timings.count("prefetch_wait_seconds", time.perf_counter() - start)
+            if error is not None:
+                raise error
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        stopped.set()
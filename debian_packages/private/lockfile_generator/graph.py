@@ -0,0 +1,213 @@
+from __future__ import annotations
+from array import array
+from collections import deque
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+Dependencies = Iterable[Union[str, tuple[str, ...]]]
+
+# Marks nodes whose edges have not been added yet.
+_UNEXPANDED = -1
+
+# Group id of edges that are not part of an alternatives-group.
+NO_GROUP = -1
+
+
+class DependencyGraph(Generic[T]):
+    """A compact, array-backed dependency graph.
+
+    Node names are interned to integer ids. The out-edges of a node are stored
+    contiguously in flat arrays (like a CSR adjacency list), together with the
+    id of the alternatives-group the edge belongs to.
+
+    Edges are added lazily: the first time a node is reached by a traversal,
+    `get_dependencies` is called for its value and the resulting edges are
+    appended to the edge arrays.
+    """
+
+    def __init__(self, get_dependencies: Callable[[T], Dependencies]):
+        self._get_dependencies = get_dependencies
+        self._ids: dict[str, int] = {}
+        self._names: list[str] = []
+        self._values: list[Optional[T]] = []
+        self._edges_start = array("i")
+        self._edges_end = array("i")
+        self._edge_targets = array("i")
+        self._edge_groups = array("i")
+        self._group_ids: dict[tuple[int, ...], int] = {}
+        self._groups: list[tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    @property
+    def num_edges(self) -> int:
+        return len(self._edge_targets)
+
+    def intern(self, name: str) -> int:
+        node = self._ids.get(name)
+        if node is None:
+            node = len(self._names)
+            self._ids[name] = node
+            self._names.append(name)
+            self._values.append(None)
+            self._edges_start.append(_UNEXPANDED)
+            self._edges_end.append(_UNEXPANDED)
+        return node
+
+    def add_node(self, name: str, value: T) -> int:
+        node = self.intern(name)
+        self._values[node] = value
+        return node
+
+    def get_id(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+    def get_name(self, node: int) -> str:
+        return self._names[node]
+
+    def get_value(self, node: int) -> Optional[T]:
+        return self._values[node]
+
+    def get_group(self, group: int) -> tuple[int, ...]:
+        return self._groups[group]
+
+    def _intern_group(self, alternatives: tuple[str, ...]) -> int:
+        nodes = tuple(self.intern(a) for a in alternatives)
+        group = self._group_ids.get(nodes)
+        if group is None:
+            group = len(self._groups)
+            self._group_ids[nodes] = group
+            self._groups.append(nodes)
+        return group
+
+    def _expand(self, node: int) -> None:
+        value = self._values[node]
+        # one edge per target, an edge is part of the last group naming it
+        targets: dict[int, int] = {}
+        if value is not None:
+            for d in self._get_dependencies(value):
+                if isinstance(d, tuple):
+                    group = self._intern_group(d)
+                    for a in self._groups[group]:
+                        targets[a] = group
+                else:
+                    targets.setdefault(self.intern(d), NO_GROUP)
+        self._edges_start[node] = len(self._edge_targets)
+        self._edge_targets.extend(targets.keys())
+        self._edge_groups.extend(targets.values())
+        self._edges_end[node] = len(self._edge_targets)
+
+    def edges(self, node: int) -> Iterator[tuple[int, int]]:
+        """Yield (target, group) for all out-edges of node."""
+        if self._edges_start[node] == _UNEXPANDED:
+            self._expand(node)
+        start, end = self._edges_start[node], self._edges_end[node]
+        return zip(self._edge_targets[start:end], self._edge_groups[start:end])
+
+    def successors(self, node: int) -> array:
+        if self._edges_start[node] == _UNEXPANDED:
+            self._expand(node)
+        return self._edge_targets[self._edges_start[node] : self._edges_end[node]]
+
+    def reachable(
+        self,
+        root: int,
+        exclude: Optional[set[int]] = None,
+        parents: Optional[dict[int, int]] = None,
+    ) -> set[int]:
+        """Breadth-first search for all nodes reachable from root.
+
+        Nodes in `exclude` are neither visited nor traversed. If `parents` is
+        given, it is filled with the BFS-tree (node -> parent).
+        """
+        exclude = exclude or set()
+        if root in exclude:
+            return set()
+        visited = {root}
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for successor in self.successors(node):
+                if successor in visited or successor in exclude:
+                    continue
+                visited.add(successor)
+                if parents is not None:
+                    parents[successor] = node
+                queue.append(successor)
+        return visited
+
+    def closures(self, roots: Iterable[int]) -> dict[int, set[int]]:
+        """Return the nodes reachable from each root (including the root).
+
+        All roots are handled by a single depth-first traversal. Reachability is
+        memoized per strongly connected component as a bitset, so the closure of
+        a dependency shared by many roots is only computed once.
+        """
+        roots = list(roots)
+        index: dict[int, int] = {}
+        low: dict[int, int] = {}
+        nodes: list[int] = []
+        stack: list[int] = []
+        on_stack: set[int] = set()
+        closure: dict[int, int] = {}
+
+        def visit(node: int) -> None:
+            index[node] = low[node] = len(nodes)
+            nodes.append(node)
+            stack.append(node)
+            on_stack.add(node)
+
+        for root in roots:
+            if root in index:
+                continue
+            visit(root)
+            work = [(root, iter(self.successors(root)))]
+            while work:
+                node, successors = work[-1]
+                for successor in successors:
+                    if successor not in index:
+                        visit(successor)
+                        work.append((successor, iter(self.successors(successor))))
+                        break
+                    elif successor in on_stack:
+                        low[node] = min(low[node], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] != index[node]:
+                        continue
+                    # node is the root of a strongly connected component
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    bits = 0
+                    for member in component:
+                        bits |= 1 << index[member]
+                    for member in component:
+                        for successor in self.successors(member):
+                            # successors outside the component are complete
+                            bits |= closure.get(successor, 0)
+                    for member in component:
+                        closure[member] = bits
+
+        def members(bits: int) -> set[int]:
+            digits = bin(bits)[:1:-1]
+            result = set()
+            i = digits.find("1")
+            while i != -1:
+                result.add(nodes[i])
+                i = digits.find("1", i + 1)
+            return result
+
+        return {root: members(closure[root]) for root in roots}
@@ -0,0 +1,259 @@
+import logging
+import lzma
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from typing import Iterable, Optional
+
+from debian_packages.private.lockfile_generator import timings
+from debian_packages.private.lockfile_generator.cache import IndexCache
+from debian_packages.private.lockfile_generator.deb import (
+    Package,
+    PackageIndex,
+    PackageIndexGroup,
+    parse_package_index,
+)
+from debian_packages.private.lockfile_generator.download import (
+    DownloadError,
+    Downloader,
+    prefetch,
+)
+from debian_packages.private.lockfile_generator.pdiff import PdiffError, apply_pdiffs
+
+logger = logging.getLogger(__name__)
+
+
+def _get_release(
+    index: PackageIndex, cache: Optional[IndexCache], downloader: Downloader
+) -> bytes:
+    release = cache.get_release(index.release_file_url) if cache else None
+    if release is None:
+        release = index.fetch_release(downloader)
+        if cache is not None:
+            cache.put_release(index.release_file_url, release)
+    return release
+
+
+def _get_index_sha256(
+    index: PackageIndex, cache: IndexCache, downloader: Downloader
+) -> Optional[str]:
+    return index.get_release_sha256(_get_release(index, cache, downloader))
+
+
+def get_index_sha256s(
+    groups: Iterable[PackageIndexGroup],
+    jobs: int = 1,
+    cache: Optional[IndexCache] = None,
+    downloader: Optional[Downloader] = None,
+) -> list[tuple[Optional[str], ...]]:
+    """Return the sha256 of the index files of every group.
+
+    Only the release files are loaded, each once.
+    """
+    groups = list(groups)
+    downloader = downloader or Downloader()
+    indexes: dict[str, PackageIndex] = {}
+    for group in groups:
+        for index in group.indexes:
+            indexes.setdefault(index.release_file_url, index)
+
+    with timings.span("load_releases"), ThreadPoolExecutor(
+        max_workers=max(jobs, 1)
+    ) as pool:
+        releases = dict(
+            zip(
+                indexes,
+                pool.map(
+                    lambda index: _get_release(index, cache, downloader),
+                    indexes.values(),
+                ),
+            )
+        )
+    return [
+        tuple(
+            index.get_release_sha256(releases[index.release_file_url])
+            for index in group.indexes
+        )
+        for group in groups
+    ]
+
+
+def _get_cached_package_index(
+    index: PackageIndex,
+    cache: Optional[IndexCache],
+    downloader: Downloader,
+) -> tuple[Optional[str], Optional[list[Package]]]:
+    """Return the sha256 of the index file (if known) and its cached packages."""
+    if cache is None:
+        return None, None
+
+    sha256 = _get_index_sha256(index, cache, downloader)
+    if sha256 is None:
+        logger.warning(f"{index}: no checksum in release file, not caching")
+        return None, None
+
+    packages = cache.get_packages(sha256, index.pool_root_url)
+    if packages is not None:
+        logger.debug(f"{index}: using cached packages")
+    return sha256, packages
+
+
+def _patch_package_index(
+    index: PackageIndex, cache: IndexCache, downloader: Downloader
+) -> Optional[bytes]:
+    """Update the latest cached version of an index file using pdiffs.
+
+    Returns the uncompressed index file, or None if it cannot be patched.
+    """
+    import requests
+
+    latest_sha256 = cache.get_latest_index(index.unversioned_index_file_url)
+    latest = cache.get_index(latest_sha256) if latest_sha256 is not None else None
+    release = cache.get_release(index.release_file_url)
+    if latest is None or release is None:
+        return None
+    expected_sha256 = index.get_release_sha256(
+        release, index.uncompressed_index_file_path
+    )
+    if expected_sha256 is None:
+        return None
+
+    try:
+        data = apply_pdiffs(
+            lzma.decompress(latest), index.diff_index_url, expected_sha256, downloader
+        )
+    except (PdiffError, DownloadError, requests.HTTPError, lzma.LZMAError) as e:
+        logger.info(f"{index}: downloading the index file, no pdiffs: {e}")
+        return None
+
+    # the patched index file is not listed in any release file, but is the base
+    # for the pdiffs of newer snapshots
+    sha256 = cache.add_index(lzma.compress(data, preset=0))
+    cache.put_latest_index(index.unversioned_index_file_url, sha256)
+    return data
+
+
+def _download_package_index(
+    index: PackageIndex,
+    cache: Optional[IndexCache],
+    downloader: Downloader,
+    sha256: Optional[str],
+) -> list[Package]:
+    """Download and parse an index file.
+
+    The download runs in a background thread and is parsed while it progresses,
+    so only a bounded number of chunks is held in memory at any time. If an
+    older version of the index file is cached, it is updated using pdiffs
+    instead where possible.
+    """
+    with timings.span("load_index", index=str(index)) as args:
+        data = None
+        compressed = True
+        if cache is not None and sha256 is not None:
+            data = cache.get_index(sha256)
+            if data is not None:
+                logger.debug(f"{index}: using cached index file")
+            else:
+                data = _patch_package_index(index, cache, downloader)
+                compressed = data is None
+                if data is not None:
+                    logger.debug(f"{index}: updated cached index file using pdiffs")
+        if data is None:
+            data = index.fetch(downloader)
+            if cache is not None and sha256 is not None:
+                data = cache.put_index(index.index_file_url, sha256, data)
+            data = prefetch(data)
+
+        logger.debug(f"{index}: parsing index file ...")
+        packages = parse_package_index(index.pool_root_url, data, compressed)
+        logger.debug(f"{index}: parsing index file ... done")
+        args["packages"] = len(packages)
+
+    if cache is not None and sha256 is not None:
+        cache.put_packages(sha256, index.pool_root_url, packages)
+        if compressed:
+            cache.put_latest_index(index.unversioned_index_file_url, sha256)
+    return packages
+
+
+def _download_package_index_in_worker(
+    index: PackageIndex,
+    cache: Optional[IndexCache],
+    downloader: Downloader,
+    sha256: Optional[str],
+    record_timings: bool,
+) -> tuple[list[Package], Optional[tuple[list, dict]]]:
+    """Like _download_package_index, also returning the timings recorded."""
+    if not record_timings:
+        return _download_package_index(index, cache, downloader, sha256), None
+    recorder = timings.enable()
+    packages = _download_package_index(index, cache, downloader, sha256)
+    return packages, (recorder.events, dict(recorder.counters))
+
+
+def load_package_index_groups(
+    groups: Iterable[PackageIndexGroup],
+    jobs: int = 1,
+    cache: Optional[IndexCache] = None,
+    downloader: Optional[Downloader] = None,
+) -> None:
+    groups = list(groups)
+    indexes = [(group, index) for group in groups for index in group.indexes]
+    downloader = downloader or Downloader()
+
+    # release files and cached packages are cheap to load, do so concurrently
+    with timings.span("load_cached_indexes"), ThreadPoolExecutor(
+        max_workers=max(jobs, 1)
+    ) as pool:
+        cached = list(
+            pool.map(
+                lambda index: _get_cached_package_index(index, cache, downloader),
+                (index for _, index in indexes),
+            )
+        )
+    # packages are merged into their group right away, so that the packages
+    # shadowed by another index are dropped early
+    downloads: list[tuple[PackageIndexGroup, PackageIndex, Optional[str]]] = []
+    for (group, index), (sha256, packages) in zip(indexes, cached):
+        if packages is not None:
+            group.add_packages(index, packages)
+        else:
+            downloads.append((group, index, sha256))
+    del cached
+
+    if jobs <= 1 or len(downloads) <= 1:
+        for group, index, sha256 in downloads:
+            packages = _download_package_index(index, cache, downloader, sha256)
+            group.add_packages(index, packages)
+    else:
+        logger.debug(f"loading {len(downloads)} index files using {jobs} jobs ...")
+        # every worker downloads and parses one index file at a time
+        recorder = timings.get_recorder()
+        with ProcessPoolExecutor(max_workers=min(jobs, len(downloads))) as pool:
+            futures: dict[Future, tuple[PackageIndexGroup, PackageIndex]] = {
+                pool.submit(
+                    _download_package_index_in_worker,
+                    index,
+                    cache,
+                    downloader,
+                    sha256,
+                    recorder is not None,
+                ): (group, index)
+                for group, index, sha256 in downloads
+            }
+            for future in as_completed(futures):
+                packages, recorded = future.result()
+                if recorder is not None:
+                    recorder.merge(*recorded)
+                group, index = futures.pop(future)
+                group.add_packages(index, packages)
+        logger.debug(f"loading {len(downloads)} index files using {jobs} jobs ... done")
+
+    if cache is not None:
+        cache.evict()
+
+    for group in groups:
+        group.load()
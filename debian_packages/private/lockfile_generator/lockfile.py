@@ -1,8 +1,23 @@
+import functools
+import hashlib
+import json
 import logging
 from collections import defaultdict
+from dataclasses import replace
 from itertools import product
+from typing import Optional
 
-from debian_packages.private.lockfile_generator.deb import PackageIndexGroup
+from debian_packages.private.lockfile_generator.cache import IndexCache
+from debian_packages.private.lockfile_generator.database import PackageDatabase
+from debian_packages.private.lockfile_generator.deb import (
+    PackageIndexGroup,
+    SharedResolutions,
+)
+from debian_packages.private.lockfile_generator.download import Downloader
+from debian_packages.private.lockfile_generator.loader import (
+    get_index_sha256s,
+    load_package_index_groups,
+)
 from debian_packages.private.lockfile_generator.config import (
     Arch,
     Debfile,
@@ -17,59 +32,318 @@ logger = logging.getLogger(__name__)
 
 DistroArchTuple = tuple[Distro, Arch]
 
+# Files are de-duplicated by name, version and sha256.
+DebfileKey = tuple[str, str, str]
+
+# Package index groups are shared by mirror, snapshots, distro and arch.
+PackageIndexGroupKey = tuple[str, str, str, Distro, Arch]
 
+
+@functools.cache
 def _sanitize_name(name: str) -> str:
     return name.replace("-", "_").replace(".", "_").replace("+", "p")
 
 
+def _get_inputs_digest(pc: PackagesConfig, mirror: str) -> str:
+    """Digest of everything but the snapshots a package of `pc` is resolved with."""
+    data = json.dumps([mirror, pc.exclude_packages, pc.package_priorities])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _get_pool_url_rewrites(
+    previous: PackageIndexGroup, current: PackageIndexGroup
+) -> Optional[dict[str, str]]:
+    """Map the pool root urls of the previous indexes to the current ones.
+
+    Returns None if a previous pool root url maps to several current ones.
+    """
+    rewrites: dict[str, str] = {}
+    for old, new in zip(previous.indexes, current.indexes):
+        if rewrites.setdefault(old.pool_root_url, new.pool_root_url) != (
+            new.pool_root_url
+        ):
+            return None
+    return rewrites
+
+
+def _rewrite_url(url: str, rewrites: dict[str, str]) -> Optional[str]:
+    for old in sorted(rewrites, key=len, reverse=True):
+        if url.startswith(old):
+            return rewrites[old] + url[len(old) :]
+    return None
+
+
+def get_package_index_group(
+    snapshots_config: SnapshotsConfig,
+    distro: Distro,
+    arch: Arch,
+    mirror: str,
+    groups: Optional[dict[PackageIndexGroupKey, PackageIndexGroup]] = None,
+) -> PackageIndexGroup:
+    """Get a package index group from `groups`, adding it if missing."""
+    key = (mirror, snapshots_config.main, snapshots_config.security, distro, arch)
+    if groups is not None and key in groups:
+        return groups[key]
+    pig = PackageIndexGroup(
+        snapshots=snapshots_config,
+        distro=distro,
+        arch=arch,
+        mirror=mirror,
+    )
+    if groups is not None:
+        groups[key] = pig
+    return pig
+
+
+def load_shared_package_index_groups(
+    configs: list[tuple[SnapshotsConfig, PackagesConfig, str]],
+    groups: dict[PackageIndexGroupKey, PackageIndexGroup],
+    jobs: int = 1,
+    cache: Optional[IndexCache] = None,
+    downloader: Optional[Downloader] = None,
+) -> None:
+    """Load the package index groups of several lockfiles at once.
+
+    `configs` are the snapshots, packages and mirror of every lockfile. Every
+    group is only loaded once and all index files are loaded in parallel.
+    """
+    pigs = {}
+    for snapshots_config, packages_config, mirror in configs:
+        for pc in packages_config:
+            for distro, arch in product(pc.distros, pc.archs):
+                pig = get_package_index_group(
+                    snapshots_config, distro, arch, mirror, groups
+                )
+                if not pig.loaded:
+                    pigs[id(pig)] = pig
+    logger.info(f"Loading {len(pigs)} package index groups of {len(configs)} lockfiles")
+    load_package_index_groups(
+        pigs.values(), jobs=jobs, cache=cache, downloader=downloader
+    )
+
+
 def generate_lockfile(
     snapshots_config: SnapshotsConfig,
     packages_config: PackagesConfig,
     mirror: str,
+    jobs: int = 1,
+    cache: Optional[IndexCache] = None,
+    previous: Optional[Lockfile] = None,
+    incremental: bool = False,
+    downloader: Optional[Downloader] = None,
+    database: Optional[PackageDatabase] = None,
+    provenance: bool = False,
+    groups: Optional[dict[PackageIndexGroupKey, PackageIndexGroup]] = None,
+    share_resolutions: bool = True,
 ) -> Lockfile:
-    packages = defaultdict(lambda: defaultdict(list))
-    files = defaultdict(lambda: defaultdict(list))
-    pigs: dict[DistroArchTuple, PackageIndexGroup] = {}
+    """Generate a lockfile for the packages in `packages_config`.
+
+    If a `previous` lockfile is given, packages whose resolution inputs did not
+    change are copied from it and only the remaining packages are resolved.
+    This also holds across snapshots for the distros and archs whose index
+    files are the same in both, only the urls of their files are updated.
+    Package indexes are loaded only for the distros and archs that have
+    packages to resolve. The sha256s of the index files are only fetched and
+    recorded with a `previous` lockfile, or with `incremental` for later runs.
+
+    The loaded package indexes are written to the `database`, if given. With
+    `provenance`, the lockfile records the dependency chain from every
+    requested package to each of its dependencies.
+
+    Package index groups are taken from and added to `groups`, if given, to
+    share them between lockfiles. Groups in it are only loaded once.
+
+    With `share_resolutions`, a package is resolved once per distro if its
+    dependencies are the same for all archs, e.g. if they are all
+    Architecture: all packages.
+    """
+    sections: dict[DistroArchTuple, None] = {}
     for pc in packages_config:
-        logger.debug(f"{pc=}")
         for distro, arch in product(pc.distros, pc.archs):
-            logger.debug(f"{distro=} {arch=}")
-            if (distro, arch) not in pigs:
-                pigs[(distro, arch)] = PackageIndexGroup(
-                    snapshots=snapshots_config,
-                    distro=distro,
-                    arch=arch,
-                    mirror=mirror,
-                )
-            pig = pigs[(distro, arch)]
+            sections[(distro, arch)] = None
+    pigs: dict[DistroArchTuple, PackageIndexGroup] = {
+        (distro, arch): get_package_index_group(
+            snapshots_config, distro, arch, mirror, groups
+        )
+        for distro, arch in sections
+    }
+
+    # the index files are only known from the release files if they are not
+    # recorded for the same snapshots already
+    indexes: dict[DistroArchTuple, list[Optional[str]]] = {}
+    if previous is not None and previous.snapshots == snapshots_config:
+        for distro, arch in sections:
+            previous_indexes = previous.indexes.get(distro, {}).get(arch)
+            if previous_indexes:
+                indexes[(distro, arch)] = previous_indexes
+    if previous is not None or incremental:
+        missing = [section for section in sections if section not in indexes]
+        for section, sha256s in zip(
+            missing,
+            get_index_sha256s(
+                [pigs[section] for section in missing],
+                jobs=jobs,
+                cache=cache,
+                downloader=downloader,
+            ),
+        ):
+            indexes[section] = list(sha256s)
+
+    # the pool root urls to rewrite the urls of the previous files with, for
+    # every distro and arch whose resolution can be kept
+    rewrites: dict[DistroArchTuple, Optional[dict[str, str]]] = {}
+    for distro, arch in sections:
+        rewrites[(distro, arch)] = None
+        if previous is None:
+            continue
+        if previous.snapshots == snapshots_config:
+            rewrites[(distro, arch)] = {
+                index.pool_root_url: index.pool_root_url
+                for index in pigs[(distro, arch)].indexes
+            }
+            continue
+        previous_indexes = previous.indexes.get(distro, {}).get(arch)
+        if previous_indexes != indexes[(distro, arch)] or None in previous_indexes:
+            logger.info(f"{distro}/{arch}: index files changed, resolving again")
+            continue
+        logger.info(f"{distro}/{arch}: index files unchanged")
+        rewrites[(distro, arch)] = _get_pool_url_rewrites(
+            PackageIndexGroup(
+                snapshots=previous.snapshots,
+                distro=distro,
+                arch=arch,
+                mirror=mirror,
+            ),
+            pigs[(distro, arch)],
+        )
+
+    packages: dict[DistroArchTuple, list[Package]] = defaultdict(list)
+    files: dict[DistroArchTuple, dict[DebfileKey, Debfile]] = defaultdict(dict)
+    inputs = defaultdict(lambda: defaultdict(dict))
+    chains: dict[DistroArchTuple, dict[str, dict[str, list[str]]]] = defaultdict(dict)
+    unresolved: list[tuple[PackagesConfig, Distro, Arch, list[str]]] = []
+    for pc in packages_config:
+        digest = _get_inputs_digest(pc, mirror)
+        for distro, arch in product(pc.distros, pc.archs):
+            section_rewrites = rewrites[(distro, arch)]
+            previous_inputs = {}
+            previous_packages = {}
+            previous_files = {}
+            previous_chains = {}
+            if previous is not None and section_rewrites is not None:
+                previous_inputs = previous.inputs.get(distro, {}).get(arch, {})
+                previous_chains = previous.provenance.get(distro, {}).get(arch, {})
+                previous_packages = {
+                    p.name: p for p in previous.packages.get(distro, {}).get(arch, [])
+                }
+                for f in previous.files.get(distro, {}).get(arch, []):
+                    url = _rewrite_url(f.url, section_rewrites)
+                    if url is not None:
+                        previous_files[f.name] = replace(f, url=url)
+
+            package_names = []
             for package_name in pc.packages:
-                logger.debug(f"resolving {package_name=!s} ...")
-                package, dependencies = pig.resolve_package(
-                    package_name=package_name,
-                    exclude_packages=pc.exclude_packages,
-                    package_priorities=pc.package_priorities,
-                )
-                _package = Package(
-                    name=_sanitize_name(package.name),
-                    dependencies=sorted([_sanitize_name(d.name) for d in dependencies]),
-                )
-                packages[distro][arch].append(_package)
+                inputs[distro][arch][package_name] = digest
+                _package = previous_packages.get(_sanitize_name(package_name))
+                if (
+                    _package is None
+                    or previous_inputs.get(package_name) != digest
+                    or _package.name not in previous_files
+                    or not all(d in previous_files for d in _package.dependencies)
+                    or (provenance and package_name not in previous_chains)
+                ):
+                    package_names.append(package_name)
+                    continue
+                logger.debug(f"{distro=} {arch=}: {package_name} is unchanged")
+                packages[(distro, arch)].append(_package)
+                if provenance:
+                    chains[(distro, arch)][package_name] = previous_chains[package_name]
+                for name in _package.name, *_package.dependencies:
+                    _file = previous_files[name]
+                    files[(distro, arch)][(name, _file.version, _file.sha256)] = _file
+            if package_names:
+                unresolved.append((pc, distro, arch, package_names))
 
-                for d in package, *dependencies:
-                    _file = Debfile(
-                        name=_sanitize_name(d.name),
+    pigs = {(distro, arch): pigs[(distro, arch)] for _, distro, arch, _ in unresolved}
+    if previous is not None:
+        logger.info(
+            f"Resolving {sum(len(u[3]) for u in unresolved)} changed packages "
+            f"for {len(pigs)} of {len(sections)} distros/archs"
+        )
+    load_package_index_groups(
+        [pig for pig in pigs.values() if not pig.loaded],
+        jobs=jobs,
+        cache=cache,
+        downloader=downloader,
+    )
+    if database is not None:
+        for pig in pigs.values():
+            database.add_group(pig, packages_config)
+
+    # the resolutions of the first arch of a packages config and distro
+    shared: dict[tuple[int, Distro], SharedResolutions] = {}
+    for pc, distro, arch, package_names in unresolved:
+        logger.debug(f"{pc=}")
+        logger.debug(f"{distro=} {arch=}")
+        pig = pigs[(distro, arch)]
+        section_files = files[(distro, arch)]
+        resolved = pig.resolve_packages(
+            package_names=package_names,
+            exclude_packages=pc.exclude_packages,
+            package_priorities=pc.package_priorities,
+            provenance=chains[(distro, arch)] if provenance else None,
+            shared=(
+                shared.setdefault((id(pc), distro), SharedResolutions())
+                if share_resolutions
+                else None
+            ),
+        )
+        for package, dependencies in resolved:
+            _package = Package(
+                name=_sanitize_name(package.name),
+                dependencies=sorted([_sanitize_name(d.name) for d in dependencies]),
+            )
+            packages[(distro, arch)].append(_package)
+
+            for d in package, *dependencies:
+                key = (_sanitize_name(d.name), d.version, d.sha256)
+                if key not in section_files:
+                    section_files[key] = Debfile(
+                        name=key[0],
                         version=d.version,
                         url=d.url,
                         sha256=d.sha256,
                     )
-                    if not _file in files[distro][arch]:
-                        files[distro][arch].append(_file)
-    for distro, arch in pigs.keys():
-        packages[distro][arch].sort(key=lambda x: x.name)
-        files[distro][arch].sort(key=lambda x: x.name)
+
+    lockfile_packages = defaultdict(dict)
+    lockfile_files = defaultdict(dict)
+    for distro, arch in sections:
+        lockfile_packages[distro][arch] = sorted(
+            packages[(distro, arch)], key=lambda x: x.name
+        )
+        lockfile_files[distro][arch] = [
+            files[(distro, arch)][key] for key in sorted(files[(distro, arch)])
+        ]
 
     return Lockfile(
         snapshots=snapshots_config,
-        packages=packages,
-        files=files,
+        packages=lockfile_packages,
+        files=lockfile_files,
+        inputs=inputs,
+        indexes=(
+            {
+                distro: {arch: indexes[(distro, arch)] for arch in archs}
+                for distro, archs in lockfile_packages.items()
+            }
+            if indexes
+            else {}
+        ),
+        provenance=(
+            {
+                distro: {arch: chains[(distro, arch)] for arch in archs}
+                for distro, archs in lockfile_packages.items()
+            }
+            if provenance
+            else {}
+        ),
     )
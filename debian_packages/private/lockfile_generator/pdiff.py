@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import logging
+import re
+from typing import Optional
+
+from debian_packages.private.lockfile_generator import timings
+from debian_packages.private.lockfile_generator.download import Downloader
+
+logger = logging.getLogger(__name__)
+
+_COMMAND = re.compile(rb"(\d+)?(?:,(\d+))?([acd])")
+
+
+class PdiffError(Exception):
+    def __init__(self, url: str, message: str):
+        self.url = url
+        super().__init__(f"Applying pdiffs from '{url}' failed: {message}")
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _parse_ed_script(url: str, patch: bytes) -> list[tuple[int, int, list[bytes]]]:
+    """Parse an ed script as written by `diff --ed` into a list of edits.
+
+    An edit (start, end, lines) replaces the lines [start, end) (0-based).
+    """
+    edits: list[tuple[int, int, list[bytes]]] = []
+    patch_lines = patch.splitlines(keepends=True)
+    i = 0
+    while i < len(patch_lines):
+        command = patch_lines[i].rstrip(b"\n")
+        i += 1
+        if command == b"s/.//":
+            # the last line added was a single "." escaped as ".."
+            if not edits or not edits[-1][2]:
+                raise PdiffError(url, "s/.// without a line to apply it to")
+            edits[-1][2][-1] = edits[-1][2][-1][1:]
+            continue
+        if command in (b"w", b"q"):
+            continue
+        match = _COMMAND.fullmatch(command)
+        if match is None:
+            raise PdiffError(url, f"unsupported command {command!r}")
+
+        text = []
+        if match[3] in (b"a", b"c"):
+            while i < len(patch_lines) and patch_lines[i] != b".\n":
+                text.append(patch_lines[i])
+                i += 1
+            i += 1
+
+        if match[1] is None:
+            # continues the previous edit after an escaped "."
+            if not edits or match[3] != b"a":
+                raise PdiffError(url, f"unsupported command {command!r}")
+            edits[-1][2].extend(text)
+            continue
+
+        first = int(match[1])
+        last = int(match[2] or match[1])
+        if match[3] == b"a":
+            edits.append((first, first, text))
+        else:
+            edits.append((first - 1, last, text))
+    return edits
+
+
+def apply_ed_script(url: str, lines: list[bytes], patch: bytes) -> list[bytes]:
+    """Apply an ed script, whose commands go from the end to the start."""
+    result: list[bytes] = []
+    position = 0
+    for start, end, text in reversed(_parse_ed_script(url, patch)):
+        if start < position or end > len(lines):
+            raise PdiffError(url, "commands are not in descending order")
+        result.extend(lines[position:start])
+        result.extend(text)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
+def _get_patches(
+    url: str, diff_index: bytes, sha256: str
+) -> Optional[list[tuple[str, str, str]]]:
+    """The patches to bring the file with the given sha256 up to date.
+
+    Returns the name, sha256 and download sha256 of every patch to apply in
+    order, or None if the file is unknown.
+    """
+    # deb822 is slow to import and only needed here
+    from debian import deb822
+
+    index = deb822.PdiffIndex(diff_index)
+    if index["SHA256-Current"]["SHA256"] == sha256:
+        return []
+    history = index.get("SHA256-History", [])
+    patches = {e["date"]: e["SHA256"] for e in index.get("SHA256-Patches", [])}
+    downloads = {e["filename"]: e["SHA256"] for e in index.get("SHA256-Download", [])}
+
+    for i, entry in enumerate(history):
+        if entry["SHA256"] == sha256:
+            break
+    else:
+        return None
+    if index.get("X-Patch-Precedence") == "merged":
+        # merged patches go from any version straight to the current one
+        names = [entry["date"]]
+    else:
+        names = [e["date"] for e in history[i:]]
+
+    result = []
+    for name in names:
+        if name not in patches or f"{name}.gz" not in downloads:
+            raise PdiffError(url, f"patch {name} is not listed")
+        result.append((name, patches[name], downloads[f"{name}.gz"]))
+    return result
+
+
+def apply_pdiffs(
+    data: bytes,
+    diff_index_url: str,
+    expected_sha256: str,
+    downloader: Downloader,
+) -> bytes:
+    """Bring an (uncompressed) index file up to date using its pdiffs.
+
+    `diff_index_url` is the url of the `Packages.diff/Index` listing the
+    patches and `expected_sha256` the sha256 of the up-to-date index file.
+    Raises PdiffError if the file is unknown to the diff index or the patched
+    file does not match.
+    """
+    with timings.span("apply_pdiffs", url=diff_index_url) as args:
+        patches = _get_patches(
+            diff_index_url, downloader.fetch(diff_index_url), _sha256(data)
+        )
+        if patches is None:
+            raise PdiffError(diff_index_url, "no patches from this version")
+        args["patches"] = len(patches)
+
+        base_url = diff_index_url.rsplit("/", 1)[0]
+        lines = data.splitlines(keepends=True)
+        for name, sha256, download_sha256 in patches:
+            logger.debug(f"{diff_index_url}: applying {name} ...")
+            download = downloader.fetch(f"{base_url}/{name}.gz")
+            if _sha256(download) != download_sha256:
+                raise PdiffError(diff_index_url, f"checksum mismatch of {name}.gz")
+            patch = gzip.decompress(download)
+            if _sha256(patch) != sha256:
+                raise PdiffError(diff_index_url, f"checksum mismatch of {name}")
+            lines = apply_ed_script(diff_index_url, lines, patch)
+
+        data = b"".join(lines)
+        if _sha256(data) != expected_sha256:
+            raise PdiffError(diff_index_url, "checksum mismatch of the patched file")
+        timings.count("pdiffs_applied", len(patches))
+        return data
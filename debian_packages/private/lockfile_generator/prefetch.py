@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from debian_packages.private.lockfile_generator import timings
+from debian_packages.private.lockfile_generator.config import Debfile, Lockfile
+from debian_packages.private.lockfile_generator.download import (
+    DownloadError,
+    Downloader,
+    RangeNotSatisfiable,
+)
+
+logger = logging.getLogger(__name__)
+
+_PART_SUFFIX = ".part"
+
+
+class FileChecksumMismatch(Exception):
+    def __init__(self, url: str, expected: str, actual: str):
+        self.url = url
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            f"Checksum mismatch for '{url}' (expected {expected}, got {actual})"
+        )
+
+
+@dataclass
+class PrefetchSummary:
+    files: int = 0
+    cached: int = 0
+    downloaded: int = 0
+    bytes_downloaded: int = 0
+    seconds: float = 0.0
+    failed: dict[str, str] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        mib = self.bytes_downloaded / (1024 * 1024)
+        throughput = mib / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.files} files: {self.cached} already cached, "
+            f"{self.downloaded} downloaded ({mib:.1f} MiB in {self.seconds:.1f}s, "
+            f"{throughput:.1f} MiB/s), {len(self.failed)} failed"
+        )
+
+
+def repository_cache_path(repository_cache: Path, sha256: str) -> Path:
+    """The path of a file in Bazel's content-addressed repository cache."""
+    return repository_cache / "content_addressable" / "sha256" / sha256 / "file"
+
+
+def get_lockfile_files(
+    lockfile: Lockfile,
+    distros: Optional[list[str]] = None,
+    archs: Optional[list[str]] = None,
+) -> list[Debfile]:
+    """The files of a lockfile, de-duplicated by sha256."""
+    files: dict[str, Debfile] = {}
+    for distro, distro_files in lockfile.files.items():
+        if distros and str(distro) not in distros:
+            continue
+        for arch, arch_files in distro_files.items():
+            if archs and str(arch) not in archs:
+                continue
+            for f in arch_files:
+                files.setdefault(f.sha256, f)
+    return list(files.values())
+
+
+def prefetch_file(
+    debfile: Debfile, repository_cache: Path, downloader: Downloader
+) -> Optional[int]:
+    """Download a file into the repository cache, verifying its sha256.
+
+    A partial download left behind by an interrupted run is continued, or
+    discarded and downloaded again if it turns out to be stale. Returns the
+    number of bytes downloaded, or None if the file is already cached.
+    """
+    path = repository_cache_path(repository_cache, debfile.sha256)
+    if path.exists():
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(path.name + _PART_SUFFIX)
+
+    # a stale partial download is discarded and the file downloaded again
+    for resume in [True, False] if part.exists() else [False]:
+        sha256 = hashlib.sha256()
+        offset = 0
+        if resume:
+            with part.open("rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    sha256.update(chunk)
+                    offset += len(chunk)
+            if sha256.hexdigest() == debfile.sha256:
+                # interrupted after the download completed, but before the rename
+                part.replace(path)
+                return 0
+            logger.debug(f"{debfile.url}: continuing at byte {offset}")
+
+        size = 0
+        try:
+            with timings.span("prefetch_file", url=debfile.url), part.open("ab") as f:
+                for chunk in downloader.iter_content(debfile.url, offset=offset):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+        except RangeNotSatisfiable as e:
+            # the partial download is at least as long as the file
+            if not resume:
+                raise
+            logger.info(f"{debfile.url}: discarding stale partial download: {e}")
+            part.unlink()
+            continue
+
+        if sha256.hexdigest() != debfile.sha256:
+            part.unlink()
+            if resume:
+                logger.info(f"{debfile.url}: discarding stale partial download")
+                continue
+            raise FileChecksumMismatch(debfile.url, debfile.sha256, sha256.hexdigest())
+        part.replace(path)
+        return size
+    raise AssertionError("the last attempt returns or raises")
+
+
+def prefetch_files(
+    files: list[Debfile],
+    repository_cache: Path,
+    jobs: int = 1,
+    downloader: Optional[Downloader] = None,
+) -> PrefetchSummary:
+    """Download files concurrently into Bazel's repository cache.
+
+    Files that fail to download are recorded in the summary, the others are
+    still downloaded.
+    """
+    downloader = downloader or Downloader()
+    summary = PrefetchSummary(files=len(files))
+    start = time.perf_counter()
+    with timings.span("prefetch"), ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {
+            pool.submit(prefetch_file, f, repository_cache, downloader): f
+            for f in files
+        }
+        for future in as_completed(futures):
+            debfile = futures[future]
+            # the exceptions of requests are OSErrors as well
+            try:
+                size = future.result()
+            except (DownloadError, FileChecksumMismatch, OSError) as e:
+                logger.error(f"{debfile.name}: {e}")
+                summary.failed[debfile.url] = str(e)
+                continue
+            if size is None:
+                summary.cached += 1
+            else:
+                summary.downloaded += 1
+                summary.bytes_downloaded += size
+    summary.seconds = time.perf_counter() - start
+    return summary
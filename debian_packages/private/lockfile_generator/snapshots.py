@@ -1,33 +1,53 @@
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-
-import requests
+from typing import Optional
 
 from debian_packages.private.lockfile_generator.config import SnapshotsConfig
+from debian_packages.private.lockfile_generator.download import Downloader
 
 logger = logging.getLogger(__name__)
 
 
-def _get_latest_ubuntu_snapshot(release_name: str, mirror: str, arch: str) -> str:
+def _url_exists(url: str, downloader: Downloader) -> bool:
+    # Only probe for existence, avoid downloading the (large) index files.
+    response = downloader.request("HEAD", url, allow_redirects=True)
+    if response.status_code in (405, 501):
+        with downloader.get(url, stream=True) as response:
+            return response.ok
+    return response.ok
+
+
+def _get_latest_ubuntu_snapshot(
+    release_name: str, mirror: str, arch: str, downloader: Downloader
+) -> str:
     logger.debug(f"Retrieving latest snapshot for '{release_name}' from '{mirror}' ...")
+    testtimestamps = [
+        "{0:%Y}{0:%m}{0:%d}T000000Z".format(date.today() - timedelta(days=x))
+        for x in range(0, 10)
+    ]
+    urls = [
+        f"{mirror}/ubuntu/{testtimestamp}/dists/{release_name}/main/binary-{arch}/Packages.xz"
+        for testtimestamp in testtimestamps
+    ]
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        exists = list(pool.map(lambda url: _url_exists(url, downloader), urls))
     latest_snapshot = ""
-    for x in range(0, 10):
-        testdate = date.today() - timedelta(days=x)
-        testtimestamp = "{0:%Y}{0:%m}{0:%d}T000000Z".format(testdate)
-        url = f"{mirror}/ubuntu/{testtimestamp}/dists/{release_name}/main/binary-{arch}/Packages.xz"
-        response = requests.get(url=url)
-        if response.ok:
+    for testtimestamp, snapshot_exists in zip(testtimestamps, exists):
+        if snapshot_exists:
             latest_snapshot = testtimestamp
             break
     logger.debug(f"Latest snapshot for '{release_name}': {latest_snapshot}")
     return latest_snapshot
 
 
-def _get_latest_debian_snapshot(mirror: str, release_name: str) -> str:
+def _get_latest_debian_snapshot(
+    mirror: str, release_name: str, downloader: Downloader
+) -> str:
     logger.debug(f"Retrieving latest snapshot for '{release_name}' from '{mirror}' ...")
-    response = requests.get(
-        url=f"{mirror}/archive/{release_name}/",
+    response = downloader.get(
+        f"{mirror}/archive/{release_name}/",
         params={
             "year": date.today().year,
             "month": date.today().month,
@@ -39,20 +59,33 @@ def _get_latest_debian_snapshot(mirror: str, release_name: str) -> str:
     return latest_snapshot
 
 
-def get_latest_snapshots(mirror: str, release="", arch="") -> SnapshotsConfig:
+def get_latest_snapshots(
+    mirror: str, release="", arch="", downloader: Optional[Downloader] = None
+) -> SnapshotsConfig:
+    downloader = downloader or Downloader()
     if "ubuntu" in mirror:
+        # main and security are served from the same snapshot
         main = _get_latest_ubuntu_snapshot(
-            release_name=release, mirror=mirror, arch=arch
-        )
-        security = _get_latest_ubuntu_snapshot(
-            release_name=release, mirror=mirror, arch=arch
+            release_name=release, mirror=mirror, arch=arch, downloader=downloader
         )
+        security = main
     else:
         release = "debian"
-        main = _get_latest_debian_snapshot(release_name=release, mirror=mirror)
-        security = _get_latest_debian_snapshot(
-            release_name=release + "-security", mirror=mirror
-        )
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            main = pool.submit(
+                _get_latest_debian_snapshot,
+                release_name=release,
+                mirror=mirror,
+                downloader=downloader,
+            )
+            security = pool.submit(
+                _get_latest_debian_snapshot,
+                release_name=release + "-security",
+                mirror=mirror,
+                downloader=downloader,
+            )
+            main = main.result()
+            security = security.result()
     return SnapshotsConfig(
         main=main,
         security=security,
@@ -0,0 +1,163 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+
+def get_peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Recorder:
+    """Records the wall time of phases (spans) and counters.
+
+    Recording is disabled by default and the module level `span` and `count`
+    are no-ops until `enable` is called. A span also records the counters that
+    changed while it was open and the peak RSS when it was closed.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events: list[dict[str, Any]] = []
+        self.counters: dict[str, float] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            counters = dict(self.counters)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            args["peak_rss"] = get_peak_rss()
+            with self._lock:
+                for key, value in self.counters.items():
+                    if value != counters.get(key, 0):
+                        args[key] = value - counters.get(key, 0)
+                self.events.append(
+                    {
+                        "name": name,
+                        "start": start,
+                        "end": end,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": args,
+                    }
+                )
+
+    def merge(self, events: list[dict[str, Any]], counters: dict[str, float]):
+        """Add the events and counters recorded by a worker process."""
+        with self._lock:
+            self.events.extend(events)
+            for key, value in counters.items():
+                self.counters[key] += value
+
+    def _aggregate(self, key: Callable[[dict], Optional[str]]) -> dict[str, dict]:
+        result: dict[str, dict[str, Any]] = defaultdict(dict)
+        for e in self.events:
+            name = key(e)
+            if name is None:
+                continue
+            entry = result[name]
+            for k, v in e["args"].items():
+                if k == "peak_rss":
+                    entry[k] = max(v or 0, entry.get(k, 0))
+                elif isinstance(v, (int, float)):
+                    entry[k] = entry.get(k, 0) + v
+            entry[f"{e['name']}_seconds"] = (
+                entry.get(f"{e['name']}_seconds", 0) + e["end"] - e["start"]
+            )
+            entry[f"{e['name']}_count"] = entry.get(f"{e['name']}_count", 0) + 1
+        return dict(result)
+
+    def report(self) -> dict[str, Any]:
+        phases = self._aggregate(lambda e: e["name"])
+        for name, phase in phases.items():
+            phase["seconds"] = phase.pop(f"{name}_seconds")
+            phase["count"] = phase.pop(f"{name}_count")
+        return {
+            "total_seconds": time.perf_counter() - self.start,
+            "peak_rss": get_peak_rss(),
+            "phases": phases,
+            "counters": dict(self.counters),
+            # e.g. all spans of a single PackageIndexGroup
+            "package_index_groups": self._aggregate(lambda e: e["args"].get("group")),
+            "package_indexes": self._aggregate(lambda e: e["args"].get("index")),
+        }
+
+    def trace(self) -> dict[str, Any]:
+        """The recorded spans in the Chrome trace-event format."""
+        return {
+            "traceEvents": [
+                {
+                    "name": e["name"],
+                    "ph": "X",
+                    "ts": (e["start"] - self.start) * 1e6,
+                    "dur": (e["end"] - e["start"]) * 1e6,
+                    "pid": e["pid"],
+                    "tid": e["tid"],
+                    "args": e["args"],
+                }
+                for e in sorted(self.events, key=lambda e: e["start"])
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_report(self, path: Path) -> None:
+        path.write_text(json.dumps(self.report(), indent=2, sort_keys=True))
+
+    def write_trace(self, path: Path) -> None:
+        path.write_text(json.dumps(self.trace()))
+
+
+_recorder: Optional[Recorder] = None
+
+
+def enable() -> Recorder:
+    """Start recording, discarding anything recorded before."""
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def get_recorder() -> Optional[Recorder]:
+    return _recorder
+
+
+def count(name: str, value: float = 1) -> None:
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+@contextlib.contextmanager
+def span(name: str, **args) -> Iterator[dict[str, Any]]:
+    """Record the wall time of a phase.
+
+    Yields the span's arguments, which can be extended while the span is open.
+    """
+    if _recorder is None:
+        yield args
+        return
+    with _recorder.span(name, **args) as args:
+        yield args
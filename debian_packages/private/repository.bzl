@@ -19,6 +19,23 @@ load("@my_debian_packages//:packages.bzl", "install_deps")
 install_deps()
 ```
 
+With bzlmod, use the `debian_packages` module extension in `MODULE.bazel`
+instead, which does not need `install_deps`:
+
+```starlark
+debian_packages = use_extension("@rules_debian_packages//debian_packages:extensions.bzl", "debian_packages")
+debian_packages.install(
+    name = "my_debian_packages",
+    default_arch = "amd64",
+    default_distro = "debian12",
+    lock_file = "//path/to:debian_packages.lock",
+)
+use_repo(debian_packages, "my_debian_packages")
+```
+
+Every .deb file is downloaded into a repository of its own, which is only
+fetched once a target refers to it.
+
 
 Packages can be used for `rules_docker` based container images like this:
 
@@ -48,16 +65,54 @@ oci_image(
     ],
 )
 ```
-"""
 
-def _impl(rctx):
-    lock_file_path = rctx.path(rctx.attr.lock_file)
-    lock_file_content = json.decode(rctx.read(lock_file_path))
-    lock_file_files = lock_file_content.get("files")
-    lock_file_packages = lock_file_content.get("packages")
+`debian_package_layer` provides one layer per package. To add a package and
+its dependencies as a single layer instead, use `debian_package_merged_layer`.
+
+Layers are built by a Python tool. With bzlmod, `rules_python` and a Python
+toolchain come along with this module, in a `WORKSPACE` register a toolchain
+with `python_register_toolchains` of `rules_python`.
+"""
 
+def read_lock_file(ctx, lock_file, distros = [], archs = []):
+    """Reads the packages and files of the given distros and archs (all if empty).
+
+    Of a sharded lockfile only the shards of these distros and archs are read.
+    Their checksums are part of the lockfile, so it changes with every shard.
+    """
+    lock_file_path = ctx.path(lock_file)
+    lock_file_content = json.decode(ctx.read(lock_file_path))
+    shards = lock_file_content.get("shards")
+
+    packages = {}
+    files = {}
+    for distro, distro_archs in (shards or lock_file_content.get("packages")).items():
+        if distros and distro not in distros:
+            continue
+        for arch in distro_archs.keys():
+            if archs and arch not in archs:
+                continue
+            if shards:
+                shard_path = lock_file_path.dirname.get_child(shards[distro][arch]["path"])
+                shard_content = json.decode(ctx.read(shard_path))
+                arch_packages = shard_content.get("packages")
+                arch_files = shard_content.get("files")
+            else:
+                arch_packages = lock_file_content["packages"][distro][arch]
+                arch_files = lock_file_content["files"].get(distro, {}).get(arch, [])
+            packages.setdefault(distro, {})[arch] = arch_packages
+            files.setdefault(distro, {})[arch] = arch_files
+
+    return {
+        "files": files,
+        "packages": packages,
+        "snapshots": lock_file_content.get("snapshots"),
+    }
+
+def get_lock_file_files(lock_file_content):
+    """Returns (name, distro, arch, url, sha256, filename) of all files in a lockfile."""
     files = []
-    for distro, archs in lock_file_files.items():
+    for distro, archs in lock_file_content.get("files").items():
         for arch, arch_files in archs.items():
             for file in arch_files:
                 files.append(
@@ -70,6 +125,19 @@ def _impl(rctx):
                         file["url"].split("/")[-1],
                     ),
                 )
+    return files
+
+def _impl(rctx):
+    lock_file_content = read_lock_file(
+        rctx,
+        rctx.attr.lock_file,
+        distros = rctx.attr.distros,
+        archs = rctx.attr.archs,
+    )
+    lock_file_packages = lock_file_content.get("packages")
+    repository_name = rctx.attr.repository_name or rctx.attr.name
+
+    files = get_lock_file_files(lock_file_content)
 
     packages = []
     for distro, archs in lock_file_packages.items():
@@ -88,7 +156,9 @@ def _impl(rctx):
         "BUILD.bazel",
         Label("@rules_debian_packages//debian_packages/private:repository.build.tmpl"),
         substitutions = {
-            "{REPOSITORY}": rctx.attr.name,
+            "{REPOSITORY}": repository_name,
+            "{LAYER_COMPRESSION}": rctx.attr.layer_compression,
+            "{DEBFILES}": str(tuple([file[:3] for file in files])),
             "{PACKAGES}": str(tuple(packages)),
         },
     )
@@ -97,9 +167,10 @@ def _impl(rctx):
         "packages.bzl",
         Label("@rules_debian_packages//debian_packages/private:repository.packages.tmpl"),
         substitutions = {
-            "{REPOSITORY}": rctx.attr.name,
+            "{REPOSITORY}": repository_name,
             "{DEFAULT_DISTRO}": rctx.attr.default_distro,
             "{DEFAULT_ARCH}": rctx.attr.default_arch,
+            "{LAYER_COMPRESSION}": rctx.attr.layer_compression,
             "{FILES}": str(tuple(files)),
         },
     )
@@ -118,6 +189,21 @@ _attrs = {
         doc = "The architecture to assume as default.",
         mandatory = True,
     ),
+    "distros": attr.string_list(
+        doc = "The debian-distros to provide packages for. Defaults to all in the lockfile.",
+    ),
+    "archs": attr.string_list(
+        doc = "The architectures to provide packages for. Defaults to all in the lockfile.",
+    ),
+    "layer_compression": attr.string(
+        doc = "The compression of package layers, `gzip` or `zstd`.",
+        default = "gzip",
+        values = ["gzip", "zstd"],
+    ),
+    "repository_name": attr.string(
+        doc = "The name this repository is visible as, if it differs from `name`. " +
+              "Set by the `debian_packages` module extension.",
+    ),
 }
 
 debian_packages_repository = repository_rule(
@@ -7,10 +7,16 @@ def debfile_name(name, distro, arch):
     return package_name(name, distro, arch) + "_debfile"
 
 def debfile_target(repo, name, distro, arch):
-    return "@" + repo + "_" + debfile_name(name, distro, arch) + "//file"
+    return "@" + repo + "//:" + debfile_name(name, distro, arch)
+
+def debfile_layer_name(name, distro, arch):
+    return debfile_name(name, distro, arch) + "_layer"
 
 def debfile_layer_target(repo, name, distro, arch):
-    return "@" + repo + "_" + package_name(name, distro, arch) + "//:layer"
+    return "@" + repo + "//:" + debfile_layer_name(name, distro, arch)
+
+def debfile_repository_name(repo, name, distro, arch):
+    return repo + "_" + debfile_name(name, distro, arch)
 
 def package_name(name, distro, arch):
     return sanitize_name(name) + "_" + distro + "_" + arch
@@ -24,44 +30,91 @@ def package_layer_name(name, distro, arch):
 def package_layer_target(repo, name, distro, arch):
     return "@" + repo + "//:" + package_layer_name(name, distro, arch)
 
-def debfile_layer_rule(name = "layer", srcs = ["data.tar.xz"]):
-    # Some .deb archives can have non-standard data archive compression, e.g.
-    # you will occasionally see `data.tar.zst`.
-    #
-    # This genrule handles both, so long as the input is a filegroup with a
-    # single archive.
+def package_merged_layer_name(name, distro, arch):
+    return package_name(name, distro, arch) + "_merged_layer"
+
+def package_merged_layer_target(repo, name, distro, arch):
+    return "@" + repo + "//:" + package_merged_layer_name(name, distro, arch)
+
+_LAYER_EXTENSIONS = {
+    "gzip": ".tar.gz",
+    "zstd": ".tar.zst",
+}
+
+def _layer_rule(name, srcs, compression, merge):
+    layer_tool = Label("//debian_packages/private/layer_tool:binary")
+    layer = name + _LAYER_EXTENSIONS[compression]
     native.genrule(
-        name = name,
+        name = name + "_archive",
         srcs = srcs,
-        outs = ["data.tar"],
-        cmd = """
-        for x in $(SRCS); do
-            if [[ "$$x" = *.xz ]]; then
-              xz -d --stdout "$$x" >$@
-              break;
-            elif [[ "$$x" = *.zst ]]; then
-              zstd -f -d --stdout "$$x" >$@
-              break;
-            fi
-        done
-        """,
+        outs = [layer, name + ".digest", name + ".diff_id"],
+        cmd = " ".join([
+            "$(execpath {})".format(layer_tool),
+            "--merge $(SRCS)" if merge else "$<",
+            "--output $(execpath {})".format(layer),
+            "--compression " + compression,
+            "--digest $(execpath {}.digest)".format(name),
+            "--diff-id $(execpath {}.diff_id)".format(name),
+        ]),
+        tools = [layer_tool],
+    )
+    native.filegroup(
+        name = name,
+        srcs = [layer],
         visibility = ["//visibility:public"],
     )
+    native.filegroup(
+        name = name + "_digest",
+        srcs = [name + ".digest"],
+        visibility = ["//visibility:public"],
+    )
+    native.filegroup(
+        name = name + "_diff_id",
+        srcs = [name + ".diff_id"],
+        visibility = ["//visibility:public"],
+    )
+
+def debfile_layer_rule(name = "layer", deb = "//file", compression = "gzip"):
+    """Converts the data archive of a .deb file into a layer.
+
+    Produces `[name]`, the normalized and compressed data archive, and
+    `[name]_digest` and `[name]_diff_id` with its sha256 compressed and
+    uncompressed.
+    """
+    _layer_rule(name, [deb], compression, merge = False)
+
+def debfile_rule(repo, name, distro, arch):
+    # The repository holding the .deb file is only fetched once one of these
+    # aliases is built.
+    debfile_repository = "@" + debfile_repository_name(repo, name, distro, arch)
+    native.alias(
+        name = debfile_name(name, distro, arch),
+        actual = debfile_repository + "//file",
+    )
+    native.alias(
+        name = debfile_layer_name(name, distro, arch),
+        actual = debfile_repository + "//:layer",
+    )
 
 def package_rule(repo, name, distro, arch, deps):
     srcs = []
-    srcs.extend([debfile_target(repo, dep, distro, arch) for dep in deps])
-    srcs.append(debfile_target(repo, name, distro, arch))
+    srcs.extend([":" + debfile_name(dep, distro, arch) for dep in deps])
+    srcs.append(":" + debfile_name(name, distro, arch))
     native.filegroup(
         name = package_name(name, distro, arch),
         srcs = srcs,
     )
 
-def package_layer_rule(repo, name, distro, arch, deps):
+def package_layer_rule(repo, name, distro, arch, deps, compression = "gzip"):
     srcs = []
-    srcs.extend([debfile_layer_target(repo, dep, distro, arch) for dep in deps])
-    srcs.append(debfile_layer_target(repo, name, distro, arch))
+    srcs.extend([":" + debfile_layer_name(dep, distro, arch) for dep in deps])
+    srcs.append(":" + debfile_layer_name(name, distro, arch))
     native.filegroup(
         name = package_layer_name(name, distro, arch),
         srcs = srcs,
     )
+
+    # A single layer of the package and its dependencies, merged from the
+    # layers of the individual packages. Paths in multiple layers are only added
+    # once.
+    _layer_rule(package_merged_layer_name(name, distro, arch), srcs, compression, merge = True)
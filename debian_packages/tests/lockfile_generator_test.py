@@ -0,0 +1,1131 @@
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from debian_packages.private.lockfile_generator import config
+from debian_packages.private.lockfile_generator.config import (
+    Arch,
+    Debfile,
+    Distro,
+    Lockfile,
+    PackagesConfig,
+    SnapshotsConfig,
+)
+from debian_packages.private.lockfile_generator.database import PackageDatabase
+from debian_packages.private.lockfile_generator.deb import (
+    DependencyNotFound,
+    Package,
+    PackageIndexGroup,
+    PackageNotFound,
+)
+from debian_packages.private.lockfile_generator.cache import IndexCache
+from debian_packages.private.lockfile_generator.download import (
+    DownloadError,
+    Downloader,
+    RangeNotSatisfiable,
+)
+from debian_packages.private.lockfile_generator.graph import (
+    NO_GROUP,
+    DependencyGraph,
+)
+from debian_packages.private.lockfile_generator.loader import _download_package_index
+from debian_packages.private.lockfile_generator.lockfile import (
+    _get_pool_url_rewrites,
+    _rewrite_url,
+    generate_lockfile,
+)
+from debian_packages.private.lockfile_generator.pdiff import (
+    PdiffError,
+    _get_patches,
+    apply_ed_script,
+    apply_pdiffs,
+)
+from debian_packages.private.lockfile_generator.prefetch import (
+    FileChecksumMismatch,
+    prefetch_file,
+    repository_cache_path,
+)
+
+SNAPSHOT = "20240101T000000Z"
+NEXT_SNAPSHOT = "20240102T000000Z"
+
+
+def _package(name: str, relations: Optional[str] = None) -> Package:
+    return Package(
+        name=name,
+        version="1.0-1",
+        url=f"https://example.com/pool/{name}_1.0-1_amd64.deb",
+        sha256=name,
+        relations=relations,
+    )
+
+
+def _providing(name: str, provides: str) -> list[Package]:
+    """A package and the virtual packages it provides, as parsed from an index."""
+    return Package.from_stanza(
+        "https://example.com/",
+        {
+            b"Package": name.encode(),
+            b"Version": b"1.0-1",
+            b"Filename": f"pool/{name}_1.0-1_amd64.deb".encode(),
+            b"SHA256": name.encode(),
+            b"Provides": provides.encode(),
+        },
+    )
+
+
+def _load_group(packages: list[Package]) -> PackageIndexGroup:
+    group = PackageIndexGroup(
+        snapshots=SnapshotsConfig(main=SNAPSHOT, security=SNAPSHOT),
+        distro=Distro.DEBIAN12,
+        arch=Arch.AMD64,
+        mirror="https://example.com",
+    )
+    for index in group.indexes:
+        group.add_packages(index, packages if index is group.main else [])
+    group.load()
+    return group
+
+
+def _names(
+    resolved: Iterable[tuple[Package, Iterable[Package]]],
+) -> list[tuple[str, list[str]]]:
+    return [
+        (p.name, sorted(d.name for d in dependencies)) for p, dependencies in resolved
+    ]
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _index_file(*names: str) -> bytes:
+    return b"".join(
+        f"Package: {name}\nVersion: 1.0-1\nFilename: pool/{name}.deb\nSHA256: {name}\n\n".encode()
+        for name in names
+    )
+
+
+class _FakeDownloader(Downloader):
+    """Serves `files` by url, keeping track of the urls fetched."""
+
+    def __init__(self, files: dict[str, bytes]):
+        super().__init__()
+        self.files = files
+        self.fetched: list[str] = []
+
+    def fetch(self, url: str) -> bytes:
+        self.fetched.append(url)
+        if url not in self.files:
+            raise DownloadError(url, "HTTP 404")
+        return self.files[url]
+
+    def iter_content(
+        self, url: str, chunk_size: int = 4, offset: int = 0
+    ) -> Iterator[bytes]:
+        data = self.fetch(url)
+        if offset and offset >= len(data):
+            raise RangeNotSatisfiable(url, offset)
+        for i in range(offset, len(data), chunk_size):
+            yield data[i : i + chunk_size]
+
+
+def _lockfile(archs: list[Arch]) -> Lockfile:
+    return Lockfile(
+        snapshots=SnapshotsConfig(main=SNAPSHOT, security=SNAPSHOT),
+        packages={
+            Distro.DEBIAN12: {
+                arch: [config.Package(name="app", dependencies=["libc6", "zlib"])]
+                for arch in archs
+            }
+        },
+        files={
+            Distro.DEBIAN12: {
+                arch: [
+                    Debfile(
+                        name=name,
+                        version="1:2.0~rc1",
+                        url=f"https://example.com/{name}_{arch}.deb",
+                        sha256=name * 4,
+                    )
+                    for name in ("app", "libc6", "zlib")
+                ]
+                for arch in archs
+            }
+        },
+        inputs={Distro.DEBIAN12: {arch: {"app": "0" * 64} for arch in archs}},
+        indexes={Distro.DEBIAN12: {arch: ["1" * 64, None] for arch in archs}},
+        provenance={
+            Distro.DEBIAN12: {
+                arch: {"app": {"zlib": ["app", "zlib"], "libc6": ["app", "libc6"]}}
+                for arch in archs
+            }
+        },
+    )
+
+
+class DependencyGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.expanded = []
+
+        def get_dependencies(name: str) -> list[Union[str, tuple[str, ...]]]:
+            self.expanded.append(name)
+            return {"a": ["b", "c"], "b": [("d", "c")], "e": ["a"]}.get(name, [])
+
+        self.graph = DependencyGraph(get_dependencies)
+        self.ids = {name: self.graph.add_node(name, name) for name in "abcde"}
+
+    def names(self, nodes: Iterable[int]) -> list[str]:
+        return sorted(self.graph.get_name(node) for node in nodes)
+
+    def test_edges_are_added_lazily(self):
+        self.assertEqual(self.graph.num_edges, 0)
+        self.assertEqual(
+            self.names(self.graph.reachable(self.ids["b"])), ["b", "c", "d"]
+        )
+        self.assertEqual(sorted(self.expanded), ["b", "c", "d"])
+        self.assertEqual(self.graph.num_edges, 2)
+        self.graph.reachable(self.ids["b"])
+        self.assertEqual(len(self.expanded), 3)
+
+    def test_alternatives(self):
+        edges = list(self.graph.edges(self.ids["a"]))
+        self.assertEqual(edges, [(self.ids["b"], NO_GROUP), (self.ids["c"], NO_GROUP)])
+        [(d, group), (c, _)] = self.graph.edges(self.ids["b"])
+        self.assertEqual((d, c), (self.ids["d"], self.ids["c"]))
+        self.assertEqual(self.graph.get_group(group), (d, c))
+
+    def test_reachable(self):
+        parents = {}
+        reachable = self.graph.reachable(self.ids["e"], {self.ids["c"]}, parents)
+        self.assertEqual(self.names(reachable), ["a", "b", "d", "e"])
+        self.assertEqual(parents[self.ids["d"]], self.ids["b"])
+        self.assertEqual(self.graph.reachable(self.ids["e"], {self.ids["e"]}), set())
+
+    def test_closures(self):
+        # a, b and c are a cycle, f depends on itself
+        dependencies = {"a": ["b"], "b": ["c"], "c": ["a", "d"], "e": ["c"], "f": ["f"]}
+        graph = DependencyGraph(lambda name: dependencies.get(name, []))
+        ids = {name: graph.add_node(name, name) for name in "abcdef"}
+        roots = [ids[name] for name in "eadf"]
+        closures = graph.closures(roots)
+        self.assertEqual(list(closures), roots)
+        for root in roots:
+            self.assertEqual(closures[root], graph.reachable(root))
+        self.assertEqual(len(closures[ids["e"]]), 5)
+        self.assertEqual(closures[ids["f"]], {ids["f"]})
+
+
+class ResolvePackageTest(unittest.TestCase):
+    def resolve(
+        self,
+        packages: list[Package],
+        package_name: str,
+        exclude_packages: Optional[list[str]] = None,
+        package_priorities: Optional[list[list[str]]] = None,
+    ) -> list[str]:
+        package, dependencies = _load_group(packages).resolve_package(
+            package_name=package_name,
+            exclude_packages=exclude_packages or [],
+            package_priorities=package_priorities or [],
+        )
+        self.assertEqual(package.name, package_name)
+        return sorted(d.name for d in dependencies)
+
+    def test_dependencies(self):
+        packages = [_package("app", "a, b (>= 1.0)"), _package("a", "c")]
+        packages += [_package("b"), _package("c"), _package("unused")]
+        self.assertEqual(self.resolve(packages, "app"), ["a", "b", "c"])
+
+    def test_first_alternative(self):
+        packages = [_package("app", "a | b"), _package("a"), _package("b")]
+        self.assertEqual(self.resolve(packages, "app"), ["a"])
+
+    def test_excluded_alternative_falls_back(self):
+        packages = [_package("app", "a | b | c"), _package("a"), _package("b")]
+        packages.append(_package("c"))
+        self.assertEqual(self.resolve(packages, "app", ["a"]), ["b"])
+        self.assertEqual(self.resolve(packages, "app", ["a", "b"]), ["c"])
+
+    def test_package_priorities(self):
+        packages = [_package("app", "a | b"), _package("a"), _package("b")]
+        self.assertEqual(
+            self.resolve(packages, "app", package_priorities=[["b", "a"]]), ["b"]
+        )
+
+    def test_exclude_packages(self):
+        packages = [_package("app", "a, b"), _package("a", "c"), _package("b", "c")]
+        packages.append(_package("c"))
+        self.assertEqual(self.resolve(packages, "app", ["a"]), ["b", "c"])
+        self.assertEqual(self.resolve(packages, "app", ["a", "b"]), [])
+        self.assertEqual(self.resolve(packages, "app", ["app"]), [])
+
+    def test_dependency_cycle(self):
+        packages = [_package("app", "a"), _package("a", "b"), _package("b", "a, c")]
+        packages.append(_package("c", "app"))
+        self.assertEqual(self.resolve(packages, "app"), ["a", "b", "c"])
+        self.assertEqual(self.resolve(packages, "b"), ["a", "app", "c"])
+
+    def test_virtual_package(self):
+        packages = [_package("app", "mail-transport-agent")]
+        packages += _providing("exim4", "mail-transport-agent")
+        [dependency] = _load_group(packages).resolve_package(
+            package_name="app", exclude_packages=[], package_priorities=[]
+        )[1]
+        self.assertEqual(dependency.name, "mail-transport-agent")
+        self.assertEqual(
+            dependency.url, "https://example.com/pool/exim4_1.0-1_amd64.deb"
+        )
+
+    def test_package_not_found(self):
+        with self.assertRaises(PackageNotFound):
+            self.resolve([_package("app")], "missing")
+
+    def test_dependency_not_found(self):
+        with self.assertRaises(DependencyNotFound) as e:
+            self.resolve([_package("app", "a"), _package("a", "missing")], "app")
+        self.assertEqual(e.exception.package_name, "missing")
+        self.assertEqual(e.exception.dependency_of, "app")
+
+
+class ResolvePackagesTest(unittest.TestCase):
+    def test_several_packages(self):
+        packages = [_package("app", "a, b | c"), _package("tool", "b, d")]
+        packages += [_package(name) for name in "abcd"]
+        group = _load_group(packages)
+        for exclude_packages in [], ["b"], ["a", "d"]:
+            resolved = group.resolve_packages(
+                package_names=["app", "tool"],
+                exclude_packages=exclude_packages,
+                package_priorities=[],
+            )
+            self.assertEqual(
+                _names(resolved),
+                _names(
+                    _load_group(packages).resolve_package(
+                        package_name=package_name,
+                        exclude_packages=exclude_packages,
+                        package_priorities=[],
+                    )
+                    for package_name in ["app", "tool"]
+                ),
+            )
+
+    def test_priorities_on_a_fresh_group(self):
+        # "missing" is in no index, it is only added to the graph once the
+        # dependencies of "app" are
+        group = _load_group([_package("app", "missing | a"), _package("a")])
+        [(package, dependencies)] = group.resolve_packages(
+            package_names=["app"],
+            exclude_packages=[],
+            package_priorities=[["a", "missing"]],
+        )
+        self.assertEqual(package.name, "app")
+        self.assertEqual([d.name for d in dependencies], ["a"])
+
+    def test_provenance(self):
+        packages = [_package("app", "a, b | c"), _package("tool", "b")]
+        packages += [_package("a", "d"), _package("b", "d"), _package("c")]
+        packages += [_package("d", "a")]
+        provenance = {}
+        _load_group(packages).resolve_packages(
+            package_names=["app", "tool"],
+            exclude_packages=[],
+            package_priorities=[],
+            provenance=provenance,
+        )
+        self.assertEqual(
+            provenance,
+            {
+                "app": {"a": ["app", "a"], "b": ["app", "b"], "d": ["app", "a", "d"]},
+                "tool": {
+                    "b": ["tool", "b"],
+                    "d": ["tool", "b", "d"],
+                    "a": ["tool", "b", "d", "a"],
+                },
+            },
+        )
+
+    def test_package_not_found(self):
+        with self.assertRaises(PackageNotFound):
+            _load_group([_package("app")]).resolve_packages(
+                package_names=["app", "missing"],
+                exclude_packages=[],
+                package_priorities=[],
+            )
+
+
+class EncodeJsonTest(unittest.TestCase):
+    def assertEncodesLikeJson(self, value: object, data: object):
+        for indent in None, 2:
+            for sort_keys in False, True:
+                with self.subTest(indent=indent, sort_keys=sort_keys):
+                    self.assertEqual(
+                        "".join(config._encode_json(value, indent, sort_keys)),
+                        json.dumps(data, indent=indent, sort_keys=sort_keys),
+                    )
+
+    def test_values(self):
+        value = {
+            "b": [1, 2.5, True, None, '\u00e9"\n'],
+            "a": {"nested": [[], {}, ["x", "y"]], "empty": ""},
+            "c": [],
+        }
+        self.assertEncodesLikeJson(value, value)
+
+    def test_lockfile(self):
+        lockfile = _lockfile([Arch.AMD64, Arch.ARM64])
+        self.assertEncodesLikeJson(lockfile, lockfile.to_dict())
+
+    def test_empty_optional_fields_are_omitted(self):
+        lockfile = _lockfile([Arch.AMD64])
+        lockfile.inputs = {}
+        lockfile.indexes = {}
+        lockfile.provenance = {}
+        data = lockfile.to_dict()
+        self.assertEqual(sorted(data), ["files", "packages", "snapshots"])
+        self.assertEncodesLikeJson(lockfile, data)
+
+
+class ShardedLockfileTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "packages.lock"
+
+    def shards(self) -> set[str]:
+        return {p.name for p in self.path.parent.iterdir()} - {self.path.name}
+
+    def test_round_trip(self):
+        lockfile = _lockfile([Arch.AMD64, Arch.ARM64])
+        lockfile.to_json_file(self.path, shard=True, indent=2)
+        self.assertEqual(
+            self.shards(),
+            {"packages.debian12.amd64.lock", "packages.debian12.arm64.lock"},
+        )
+        self.assertEqual(Lockfile.from_json_file(self.path), lockfile)
+
+    def test_round_trip_without_optional_fields(self):
+        lockfile = _lockfile([Arch.AMD64, Arch.ARM64])
+        lockfile.inputs = {}
+        lockfile.indexes = {}
+        lockfile.provenance = {}
+        lockfile.to_json_file(self.path, shard=True)
+        shard = json.loads(
+            self.path.with_name("packages.debian12.amd64.lock").read_text()
+        )
+        self.assertEqual(sorted(shard), ["files", "packages"])
+        self.assertEqual(Lockfile.from_json_file(self.path), lockfile)
+
+    def test_removed_shards_are_deleted(self):
+        _lockfile([Arch.AMD64, Arch.ARM64]).to_json_file(self.path, shard=True)
+        lockfile = _lockfile([Arch.AMD64])
+        lockfile.to_json_file(self.path, shard=True)
+        self.assertEqual(self.shards(), {"packages.debian12.amd64.lock"})
+        self.assertEqual(Lockfile.from_json_file(self.path), lockfile)
+
+    def test_unsharding_deletes_shards(self):
+        lockfile = _lockfile([Arch.AMD64, Arch.ARM64])
+        lockfile.to_json_file(self.path, shard=True)
+        lockfile.to_json_file(self.path)
+        self.assertEqual(self.shards(), set())
+        self.assertEqual(Lockfile.from_json_file(self.path), lockfile)
+
+    def test_unchanged_shards_are_not_rewritten(self):
+        _lockfile([Arch.AMD64, Arch.ARM64]).to_json_file(self.path, shard=True)
+        shard = self.path.with_name("packages.debian12.amd64.lock")
+        mtime = shard.stat().st_mtime_ns - 10**9
+        os.utime(shard, ns=(mtime, mtime))
+        _lockfile([Arch.AMD64, Arch.ARM64]).to_json_file(self.path, shard=True)
+        self.assertEqual(shard.stat().st_mtime_ns, mtime)
+
+
+class IndexCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = IndexCache(Path(tmp.name))
+
+    def test_packages_round_trip(self):
+        packages = [_package("app", "a"), _package("a")]
+        self.cache.put_packages("1" * 64, "https://example.com", packages)
+        self.assertEqual(
+            self.cache.get_packages("1" * 64, "https://example.com"), packages
+        )
+
+    def test_packages_of_another_index_are_discarded(self):
+        self.cache.put_packages("1" * 64, "https://example.com", [_package("a")])
+        path = self.cache._packages_path("1" * 64, "https://example.com")
+        other = self.cache._packages_path("2" * 64, "https://example.com")
+        path.rename(other)
+        self.assertIsNone(self.cache.get_packages("2" * 64, "https://example.com"))
+        self.assertFalse(other.exists())
+
+    def test_corrupt_packages_are_discarded(self):
+        self.cache.put_packages("1" * 64, "https://example.com", [_package("a")])
+        path = self.cache._packages_path("1" * 64, "https://example.com")
+        path.write_bytes(path.read_bytes()[:-8])
+        self.assertIsNone(self.cache.get_packages("1" * 64, "https://example.com"))
+        self.assertFalse(path.exists())
+
+
+def _packages_config(
+    packages: list[str], exclude_packages: Optional[list[str]] = None
+) -> PackagesConfig:
+    return PackagesConfig(
+        archs=[Arch.AMD64],
+        distros=[Distro.DEBIAN12],
+        packages=packages,
+        exclude_packages=exclude_packages or [],
+    )
+
+
+class PackageDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.database = PackageDatabase(Path(tmp.name) / "packages.db")
+        self.addCleanup(self.database.close)
+        self.group = _load_group(
+            [
+                _package("app", "libc6, zlib"),
+                _package("zlib", "libc6"),
+                _package("libc6"),
+                _package("other"),
+            ]
+        )
+
+    def add_group(self, *packages_config: PackagesConfig):
+        self.database.add_group(self.group, list(packages_config))
+        return self.database.query()
+
+    def test_depends(self):
+        query = self.add_group(_packages_config(["app"]))
+        self.assertEqual(query.depends("app"), [("libc6", "1.0-1"), ("zlib", "1.0-1")])
+        self.assertEqual(query.rdepends("libc6"), [("app", "1.0-1"), ("zlib", "1.0-1")])
+        self.assertEqual(query.why("libc6"), [["app", "libc6"]])
+
+    def test_duplicate_requested_package(self):
+        query = self.add_group(
+            _packages_config(["app", "other", "app"]),
+            _packages_config(["app"], exclude_packages=["zlib"]),
+        )
+        self.assertEqual(
+            query.requested(), [(0, "app", []), (1, "app", ["zlib"]), (0, "other", [])]
+        )
+        self.assertEqual(query.why("zlib"), [["app", "zlib"]])
+
+    def test_replace_group(self):
+        self.add_group(_packages_config(["app"]))
+        query = self.add_group(_packages_config(["other"]))
+        self.assertEqual(query.requested(), [(0, "other", [])])
+        self.assertEqual(self.database.groups(), [("debian12", "amd64")])
+
+
+class GenerateLockfileTest(unittest.TestCase):
+    """Regenerates lockfiles from preloaded groups, without network access."""
+
+    mirror = "https://example.com"
+
+    def setUp(self):
+        # the Depends of the packages of the main index
+        self.index = {"app": "libc6, zlib", "zlib": "libc6", "libc6": None}
+        self.downloader = _FakeDownloader({})
+        self.release(SNAPSHOT)
+
+    def release(self, snapshot: str, sha256s: tuple[str, ...] = ("1", "2", "3")):
+        """Serve the release files of a snapshot, listing `sha256s`."""
+        for index, sha256 in zip(self.group(snapshot, loaded=False).indexes, sha256s):
+            self.downloader.files[index.release_file_url] = (
+                f"SHA256:\n {sha256 * 64} 0 {index.index_file_path}\n".encode()
+            )
+
+    def group(self, snapshot: str, loaded: bool = True) -> PackageIndexGroup:
+        group = PackageIndexGroup(
+            snapshots=SnapshotsConfig(main=snapshot, security=snapshot),
+            distro=Distro.DEBIAN12,
+            arch=Arch.AMD64,
+            mirror=self.mirror,
+        )
+        if loaded:
+            for index in group.indexes:
+                packages = []
+                for name, depends in self.index.items() if index is group.main else []:
+                    stanza = {
+                        b"Package": name.encode(),
+                        b"Version": b"1.0-1",
+                        b"Filename": f"pool/main/{name}_1.0-1_amd64.deb".encode(),
+                        b"SHA256": name.encode(),
+                    }
+                    if depends:
+                        stanza[b"Depends"] = depends.encode()
+                    packages.extend(Package.from_stanza(index.pool_root_url, stanza))
+                group.add_packages(index, packages)
+            group.load()
+        return group
+
+    def generate(
+        self,
+        group: PackageIndexGroup,
+        packages: list[str],
+        exclude_packages: Optional[list[str]] = None,
+        **kwargs,
+    ) -> Lockfile:
+        snapshots = group.snapshots
+        key = (
+            self.mirror,
+            snapshots.main,
+            snapshots.security,
+            group.distro,
+            group.arch,
+        )
+        return generate_lockfile(
+            snapshots,
+            [_packages_config(packages, exclude_packages)],
+            self.mirror,
+            downloader=self.downloader,
+            groups={key: group},
+            **kwargs,
+        )
+
+    def dependencies(self, lockfile: Lockfile) -> dict[str, list[str]]:
+        return {
+            p.name: p.dependencies
+            for p in lockfile.packages[Distro.DEBIAN12][Arch.AMD64]
+        }
+
+    def test_unchanged_packages_are_kept(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        self.assertEqual(self.dependencies(previous), {"app": ["libc6", "zlib"]})
+        # the indexes of the group would be downloaded if anything was resolved
+        group = self.group(SNAPSHOT, loaded=False)
+        lockfile = self.generate(group, ["app"], previous=previous)
+        self.assertFalse(group.loaded)
+        self.assertEqual(lockfile, previous)
+
+    def test_added_package_is_resolved(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        lockfile = self.generate(
+            self.group(SNAPSHOT), ["app", "zlib"], previous=previous
+        )
+        self.assertEqual(
+            self.dependencies(lockfile), {"app": ["libc6", "zlib"], "zlib": ["libc6"]}
+        )
+        self.assertEqual(
+            lockfile.files[Distro.DEBIAN12][Arch.AMD64],
+            previous.files[Distro.DEBIAN12][Arch.AMD64],
+        )
+
+    def test_changed_inputs_are_resolved_again(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        lockfile = self.generate(
+            self.group(SNAPSHOT), ["app"], exclude_packages=["zlib"], previous=previous
+        )
+        self.assertEqual(self.dependencies(lockfile), {"app": ["libc6"]})
+        self.assertEqual(
+            [f.name for f in lockfile.files[Distro.DEBIAN12][Arch.AMD64]],
+            ["app", "libc6"],
+        )
+        self.assertNotEqual(lockfile.inputs, previous.inputs)
+
+    def test_provenance_is_kept(self):
+        previous = self.generate(
+            self.group(SNAPSHOT), ["app"], incremental=True, provenance=True
+        )
+        self.assertEqual(
+            previous.provenance[Distro.DEBIAN12][Arch.AMD64],
+            {"app": {"libc6": ["app", "libc6"], "zlib": ["app", "zlib"]}},
+        )
+        group = self.group(SNAPSHOT, loaded=False)
+        lockfile = self.generate(group, ["app"], previous=previous, provenance=True)
+        self.assertFalse(group.loaded)
+        self.assertEqual(lockfile, previous)
+
+    def test_missing_provenance_is_resolved(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        lockfile = self.generate(
+            self.group(SNAPSHOT), ["app"], previous=previous, provenance=True
+        )
+        self.assertEqual(
+            lockfile.provenance[Distro.DEBIAN12][Arch.AMD64]["app"]["zlib"],
+            ["app", "zlib"],
+        )
+
+    def test_unchanged_indexes_keep_resolutions_across_snapshots(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        self.release(NEXT_SNAPSHOT)
+        group = self.group(NEXT_SNAPSHOT, loaded=False)
+        lockfile = self.generate(group, ["app"], previous=previous)
+        self.assertFalse(group.loaded)
+        self.assertEqual(lockfile.packages, previous.packages)
+        self.assertEqual(lockfile.indexes, previous.indexes)
+        self.assertEqual(
+            [f.url for f in lockfile.files[Distro.DEBIAN12][Arch.AMD64]],
+            [
+                f.url.replace(SNAPSHOT, NEXT_SNAPSHOT)
+                for f in previous.files[Distro.DEBIAN12][Arch.AMD64]
+            ],
+        )
+
+    def test_changed_indexes_are_resolved_again(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        self.release(NEXT_SNAPSHOT, ("4", "2", "3"))
+        self.index["app"] = "libc6"
+        lockfile = self.generate(self.group(NEXT_SNAPSHOT), ["app"], previous=previous)
+        self.assertEqual(self.dependencies(lockfile), {"app": ["libc6"]})
+        self.assertEqual(
+            lockfile.indexes[Distro.DEBIAN12][Arch.AMD64],
+            ["4" * 64, "2" * 64, "3" * 64],
+        )
+
+    def test_unknown_indexes_are_resolved_again(self):
+        previous = self.generate(self.group(SNAPSHOT), ["app"], incremental=True)
+        previous.indexes[Distro.DEBIAN12][Arch.AMD64][1] = None
+        self.release(NEXT_SNAPSHOT)
+        self.index["app"] = "libc6"
+        lockfile = self.generate(self.group(NEXT_SNAPSHOT), ["app"], previous=previous)
+        self.assertEqual(self.dependencies(lockfile), {"app": ["libc6"]})
+
+    def test_get_pool_url_rewrites(self):
+        rewrites = _get_pool_url_rewrites(
+            self.group(SNAPSHOT, loaded=False), self.group(NEXT_SNAPSHOT, loaded=False)
+        )
+        self.assertEqual(
+            rewrites,
+            {
+                f"{self.mirror}/archive/debian/{SNAPSHOT}/": (
+                    f"{self.mirror}/archive/debian/{NEXT_SNAPSHOT}/"
+                ),
+                f"{self.mirror}/archive/debian-security/{SNAPSHOT}/": (
+                    f"{self.mirror}/archive/debian-security/{NEXT_SNAPSHOT}/"
+                ),
+            },
+        )
+
+    def test_ambiguous_pool_url_rewrites(self):
+        previous = self.group(SNAPSHOT, loaded=False)
+        current = self.group(NEXT_SNAPSHOT, loaded=False)
+        # the pool shared by the main and updates indexes is split up
+        current.indexes[1].pool_root_url = (
+            f"{self.mirror}/archive/debian-updates/{NEXT_SNAPSHOT}/"
+        )
+        self.assertIsNone(_get_pool_url_rewrites(previous, current))
+
+    def test_rewrite_url(self):
+        rewrites = {
+            "https://a.example/": "https://b.example/",
+            "https://a.example/security/": "https://c.example/",
+        }
+        self.assertEqual(
+            _rewrite_url("https://a.example/pool/x.deb", rewrites),
+            "https://b.example/pool/x.deb",
+        )
+        self.assertEqual(
+            _rewrite_url("https://a.example/security/pool/x.deb", rewrites),
+            "https://c.example/pool/x.deb",
+        )
+        self.assertIsNone(_rewrite_url("https://d.example/pool/x.deb", rewrites))
+
+
+class ShareResolutionsTest(unittest.TestCase):
+    mirror = "https://example.com"
+
+    # the Architecture and Depends of the packages of the main indexes
+    index = {
+        "app": ("any", "libc6, data"),
+        "libc6": ("any", None),
+        "data": ("all", "tzdata"),
+        "tzdata": ("all", None),
+        # an Architecture: all package depending on an arch-specific one
+        "tool": ("all", "helper"),
+        "helper": ("any", None),
+    }
+
+    def group(self, arch: Arch) -> PackageIndexGroup:
+        group = PackageIndexGroup(
+            snapshots=SnapshotsConfig(main=SNAPSHOT, security=SNAPSHOT),
+            distro=Distro.DEBIAN12,
+            arch=arch,
+            mirror=self.mirror,
+        )
+        packages = []
+        for name, (architecture, depends) in self.index.items():
+            architecture = arch if architecture == "any" else architecture
+            stanza = {
+                b"Package": name.encode(),
+                b"Version": b"1.0-1",
+                b"Filename": f"pool/main/{name}_1.0-1_{architecture}.deb".encode(),
+                b"SHA256": f"{name}_{architecture}".encode(),
+            }
+            if depends:
+                stanza[b"Depends"] = depends.encode()
+            packages.extend(Package.from_stanza(group.main.pool_root_url, stanza))
+        for index in group.indexes:
+            group.add_packages(index, packages if index is group.main else [])
+        group.load()
+        return group
+
+    def generate(self, share_resolutions: bool) -> Lockfile:
+        snapshots = SnapshotsConfig(main=SNAPSHOT, security=SNAPSHOT)
+        archs = [Arch.AMD64, Arch.ARM64]
+        groups = {
+            (self.mirror, SNAPSHOT, SNAPSHOT, Distro.DEBIAN12, arch): self.group(arch)
+            for arch in archs
+        }
+        return generate_lockfile(
+            snapshots,
+            [
+                PackagesConfig(
+                    archs=archs,
+                    distros=[Distro.DEBIAN12],
+                    packages=["app", "tool", "data", "tzdata"],
+                )
+            ],
+            self.mirror,
+            groups=groups,
+            provenance=True,
+            share_resolutions=share_resolutions,
+        )
+
+    def test_same_as_unshared(self):
+        with self.assertLogs(
+            "debian_packages.private.lockfile_generator.deb", "INFO"
+        ) as logs:
+            lockfile = self.generate(share_resolutions=True)
+        self.assertIn("2 of 4 packages resolve the same", "\n".join(logs.output))
+        self.assertEqual(lockfile, self.generate(share_resolutions=False))
+
+        packages = {
+            arch: {p.name: p.dependencies for p in arch_packages}
+            for arch, arch_packages in lockfile.packages[Distro.DEBIAN12].items()
+        }
+        self.assertEqual(packages[Arch.ARM64]["app"], ["data", "libc6", "tzdata"])
+        self.assertEqual(packages[Arch.ARM64]["tool"], ["helper"])
+        files = {
+            f.url.rsplit("/", 1)[1] for f in lockfile.files[Distro.DEBIAN12][Arch.ARM64]
+        }
+        self.assertIn("helper_1.0-1_arm64.deb", files)
+        self.assertIn("data_1.0-1_all.deb", files)
+
+
+@unittest.skipUnless(shutil.which("diff"), "needs diff")
+class ApplyEdScriptTest(unittest.TestCase):
+    def assertRoundTrip(self, old: list[bytes], new: list[bytes]):
+        with tempfile.TemporaryDirectory() as tmp:
+            old_path = Path(tmp) / "old"
+            new_path = Path(tmp) / "new"
+            old_path.write_bytes(b"".join(old))
+            new_path.write_bytes(b"".join(new))
+            patch = subprocess.run(
+                ["diff", "--ed", old_path, new_path], stdout=subprocess.PIPE
+            ).stdout
+        self.assertEqual(apply_ed_script("patch", old, patch), new)
+
+    def test_changes(self):
+        old = [b"Package: %d\n" % i for i in range(20)]
+        new = old[:2] + [b"Package: x\n", b"Package: y\n"] + old[5:12] + old[13:]
+        new.append(b"Package: z\n")
+        self.assertRoundTrip(old, new)
+
+    def test_insert_at_start(self):
+        old = [b"a\n", b"b\n"]
+        self.assertRoundTrip(old, [b"x\n"] + old)
+
+    def test_delete_all(self):
+        self.assertRoundTrip([b"a\n", b"b\n"], [])
+
+    def test_escaped_dots(self):
+        old = [b"a\n", b"b\n", b"c\n"]
+        new = [b"a\n", b".\n", b"x\n", b".\n", b"c\n"]
+        self.assertRoundTrip(old, new)
+
+    def test_unsupported_command(self):
+        with self.assertRaises(PdiffError):
+            apply_ed_script("patch", [b"a\n"], b"1m2\n")
+
+    def test_commands_out_of_order(self):
+        with self.assertRaises(PdiffError):
+            apply_ed_script("patch", [b"a\n", b"b\n"], b"1d\n2d\n")
+
+
+class _PdiffsFixture:
+    """Three versions of an index file, updated by the pdiffs T-1 and T-2."""
+
+    url = "https://example.com/dists/bookworm/main/binary-amd64/Packages.diff/Index"
+
+    def setUp(self):
+        self.versions = [
+            _index_file("a", "b"),
+            _index_file("a", "b", "c"),
+            _index_file("b", "c"),
+        ]
+        # ed scripts, each stanza is five lines
+        append_c = b"10a\n" + _index_file("c") + b".\n"
+        self.patches = {"T-1": append_c, "T-2": b"1,5d\n"}
+        self.merged_patches = {"T-1": append_c + b"1,5d\n", "T-2": b"1,5d\n"}
+
+    def diff_index(self, patches: dict[str, bytes], merged: bool = False) -> bytes:
+        current = self.versions[-1]
+        lines = [f"SHA256-Current: {_sha256(current)} {len(current)}"]
+        lines.append("SHA256-History:")
+        for version, name in zip(self.versions, patches):
+            lines.append(f" {_sha256(version)} {len(version)} {name}")
+        lines.append("SHA256-Patches:")
+        for name, patch in patches.items():
+            lines.append(f" {_sha256(patch)} {len(patch)} {name}")
+        lines.append("SHA256-Download:")
+        for name, patch in patches.items():
+            download = gzip.compress(patch, mtime=0)
+            lines.append(f" {_sha256(download)} {len(download)} {name}.gz")
+        if merged:
+            lines.append("X-Patch-Precedence: merged")
+        return "\n".join(lines).encode() + b"\n"
+
+    def downloader(
+        self, patches: dict[str, bytes], merged: bool = False
+    ) -> _FakeDownloader:
+        base_url = self.url.rsplit("/", 1)[0]
+        files = {self.url: self.diff_index(patches, merged)}
+        for name, patch in patches.items():
+            files[f"{base_url}/{name}.gz"] = gzip.compress(patch, mtime=0)
+        return _FakeDownloader(files)
+
+
+class PdiffsTest(_PdiffsFixture, unittest.TestCase):
+    def get_patches(self, version: bytes, merged: bool = False) -> Optional[list[str]]:
+        patches = _get_patches(
+            self.url,
+            self.diff_index(self.merged_patches if merged else self.patches, merged),
+            _sha256(version),
+        )
+        return None if patches is None else [name for name, _, _ in patches]
+
+    def test_get_patches(self):
+        self.assertEqual(self.get_patches(self.versions[0]), ["T-1", "T-2"])
+        self.assertEqual(self.get_patches(self.versions[1]), ["T-2"])
+        self.assertEqual(self.get_patches(self.versions[2]), [])
+        self.assertIsNone(self.get_patches(_index_file("x")))
+
+    def test_get_merged_patches(self):
+        self.assertEqual(self.get_patches(self.versions[0], merged=True), ["T-1"])
+        self.assertEqual(self.get_patches(self.versions[1], merged=True), ["T-2"])
+        self.assertEqual(self.get_patches(self.versions[2], merged=True), [])
+
+    def test_get_unlisted_patch(self):
+        diff_index = self.diff_index(self.patches).replace(b"T-2.gz", b"T-3.gz")
+        with self.assertRaises(PdiffError):
+            _get_patches(self.url, diff_index, _sha256(self.versions[0]))
+
+    def test_apply_pdiffs(self):
+        expected_sha256 = _sha256(self.versions[2])
+        for patches, merged in (self.patches, False), (self.merged_patches, True):
+            for version in self.versions:
+                downloader = self.downloader(patches, merged)
+                self.assertEqual(
+                    apply_pdiffs(version, self.url, expected_sha256, downloader),
+                    self.versions[2],
+                )
+
+    def test_patched_file_mismatch(self):
+        with self.assertRaises(PdiffError):
+            apply_pdiffs(
+                self.versions[0],
+                self.url,
+                _sha256(self.versions[1]),
+                self.downloader(self.patches),
+            )
+
+    def test_patch_download_mismatch(self):
+        downloader = self.downloader(self.patches)
+        downloader.files[self.url.replace("Index", "T-2.gz")] = gzip.compress(b"1d\n")
+        with self.assertRaises(PdiffError):
+            apply_pdiffs(
+                self.versions[0], self.url, _sha256(self.versions[2]), downloader
+            )
+
+    def test_unknown_version(self):
+        with self.assertRaises(PdiffError):
+            apply_pdiffs(
+                _index_file("x"),
+                self.url,
+                _sha256(self.versions[2]),
+                self.downloader(self.patches),
+            )
+
+
+class PatchPackageIndexTest(_PdiffsFixture, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = IndexCache(Path(tmp.name))
+        self.index = PackageIndexGroup(
+            snapshots=SnapshotsConfig(main=SNAPSHOT, security=SNAPSHOT),
+            distro=Distro.DEBIAN12,
+            arch=Arch.AMD64,
+            mirror="https://example.com",
+        ).main
+        self.url = self.index.diff_index_url
+        # the first version is cached, the release file lists the last one
+        latest_sha256 = self.cache.add_index(lzma.compress(self.versions[0]))
+        self.cache.put_latest_index(
+            self.index.unversioned_index_file_url, latest_sha256
+        )
+        self.compressed = lzma.compress(self.versions[2])
+
+    def load(self, uncompressed_sha256: str) -> tuple[list[str], _FakeDownloader]:
+        index = self.index
+        release = (
+            "SHA256:\n"
+            f" {_sha256(self.compressed)} 0 {index.index_file_path}\n"
+            f" {uncompressed_sha256} 0 {index.uncompressed_index_file_path}\n"
+        )
+        self.cache.put_release(index.release_file_url, release.encode())
+        downloader = self.downloader(self.patches)
+        downloader.files[index.index_file_url] = self.compressed
+        packages = _download_package_index(
+            index, self.cache, downloader, _sha256(self.compressed)
+        )
+        return [p.name for p in packages], downloader
+
+    def test_patched(self):
+        names, downloader = self.load(_sha256(self.versions[2]))
+        self.assertEqual(names, ["b", "c"])
+        self.assertNotIn(self.index.index_file_url, downloader.fetched)
+        patched_sha256 = self.cache.get_latest_index(
+            self.index.unversioned_index_file_url
+        )
+        self.assertEqual(
+            lzma.decompress(self.cache.get_index(patched_sha256)), self.versions[2]
+        )
+
+    def test_mismatch_downloads_index_file(self):
+        names, downloader = self.load(_sha256(self.versions[1]))
+        self.assertEqual(names, ["b", "c"])
+        self.assertIn(self.index.index_file_url, downloader.fetched)
+        self.assertEqual(
+            self.cache.get_latest_index(self.index.unversioned_index_file_url),
+            _sha256(self.compressed),
+        )
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b""):
+        self.status_code = status_code
+        self.content = content
+
+    def __enter__(self) -> "_FakeResponse":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise AssertionError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        yield self.content
+
+
+class _FakeSession:
+    def __init__(self, response: _FakeResponse):
+        self.response = response
+        self.headers: list[dict[str, str]] = []
+
+    def get(self, url: str, headers: dict[str, str], **kwargs) -> _FakeResponse:
+        self.headers.append(headers)
+        return self.response
+
+
+class DownloaderTest(unittest.TestCase):
+    def iter_content(self, response: _FakeResponse, offset: int) -> bytes:
+        downloader = Downloader()
+        downloader._session = _FakeSession(response)
+        return b"".join(downloader.iter_content("https://example.com/a", offset=offset))
+
+    def test_range(self):
+        self.assertEqual(self.iter_content(_FakeResponse(206, b"cd"), 2), b"cd")
+
+    def test_range_ignored(self):
+        self.assertEqual(self.iter_content(_FakeResponse(200, b"abcd"), 2), b"cd")
+
+    def test_range_not_satisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable) as e:
+            self.iter_content(_FakeResponse(416), 4)
+        self.assertEqual(e.exception.offset, 4)
+
+
+class PrefetchFileTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.repository_cache = Path(tmp.name)
+        self.data = b"0123456789"
+        self.debfile = Debfile(
+            name="a",
+            version="1.0-1",
+            url="https://example.com/pool/a_1.0-1_amd64.deb",
+            sha256=_sha256(self.data),
+        )
+        self.downloader = _FakeDownloader({self.debfile.url: self.data})
+        self.path = repository_cache_path(self.repository_cache, self.debfile.sha256)
+        self.part = self.path.with_name(self.path.name + ".part")
+
+    def write_part(self, data: bytes) -> None:
+        self.part.parent.mkdir(parents=True)
+        self.part.write_bytes(data)
+
+    def prefetch(self) -> Optional[int]:
+        return prefetch_file(self.debfile, self.repository_cache, self.downloader)
+
+    def assertPrefetched(self):
+        self.assertEqual(self.path.read_bytes(), self.data)
+        self.assertFalse(self.part.exists())
+
+    def test_download(self):
+        self.assertEqual(self.prefetch(), 10)
+        self.assertPrefetched()
+        self.assertIsNone(self.prefetch())
+        self.assertEqual(len(self.downloader.fetched), 1)
+
+    def test_continue_partial(self):
+        self.write_part(self.data[:4])
+        self.assertEqual(self.prefetch(), 6)
+        self.assertPrefetched()
+
+    def test_complete_partial(self):
+        self.write_part(self.data)
+        self.assertEqual(self.prefetch(), 0)
+        self.assertPrefetched()
+        self.assertEqual(self.downloader.fetched, [])
+
+    def test_corrupt_partial(self):
+        self.write_part(b"x" * len(self.data))
+        self.assertEqual(self.prefetch(), 10)
+        self.assertPrefetched()
+
+    def test_corrupt_shorter_partial(self):
+        self.write_part(b"xxxx")
+        self.assertEqual(self.prefetch(), 10)
+        self.assertPrefetched()
+        self.assertEqual(len(self.downloader.fetched), 2)
+
+    def test_checksum_mismatch(self):
+        self.downloader.files[self.debfile.url] = b"x" * len(self.data)
+        with self.assertRaises(FileChecksumMismatch):
+            self.prefetch()
+        self.assertFalse(self.path.exists())
+        self.assertFalse(self.part.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()